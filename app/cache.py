@@ -0,0 +1,272 @@
+"""
+In-process read cache for hot lookups.
+
+Entries live in a bounded LRU with a time to live and carry tags naming the
+data they were built from. Write handlers invalidate tags instead of keys, so
+every cached read depending on a changed culture or note is dropped:
+
+    culture:<id>            the culture itself and every genealogy containing it
+    lineage:<id>            every cached culture descending from it (re-parenting)
+    culture-notes:<id>      the notes list of the culture
+
+Invalidations are also published through a broker so that other worker
+processes drop their entries: `LocalBroker` (single process, the default) or
+`MongoBroker`, which shares them through a capped collection tailed by every
+process (a stand-in for a pub/sub server, selected with
+CULTIVARE_CACHE_BROKER=mongo).
+
+Cached values are shared between requests and must not be modified.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from app.config import settings
+from app.database import db
+
+MISSING = object()
+
+
+# ---- Local cache ----
+
+
+class TTLCache:
+    """LRU cache with a time to live per entry and tag based invalidation."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires, value, tags)
+        self._keys_by_tag: Dict[str, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable):
+        """Returns the cached value of a key, MISSING if it is not cached or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()):
+        """Caches a value, evicting the least recently used entries beyond max_entries."""
+        if self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        tags = frozenset(tags)
+        self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """Drops the entries carrying any of the tags and returns how many were dropped."""
+        keys = set()
+        for tag in tags:
+            keys |= self._keys_by_tag.get(tag, set())
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+# ---- Invalidation brokers ----
+
+
+class InvalidationBroker:
+    """Shares invalidated tags between the processes serving the API."""
+
+    async def start(self, on_invalidate: Callable[[Optional[Iterable[str]]], None]):
+        """
+        Starts receiving the invalidations of other processes.
+
+        Args:
+            on_invalidate: Called with the invalidated tags, or None when
+                           invalidations may have been missed (drop everything).
+        """
+
+    async def publish(self, tags: Set[str]):
+        """Sends invalidated tags to the other processes."""
+
+    async def stop(self):
+        pass
+
+
+class LocalBroker(InvalidationBroker):
+    """Broker of a single process, nothing to share."""
+
+
+class MongoBroker(InvalidationBroker):
+    """Shares invalidations through a capped collection tailed by every process."""
+
+    def __init__(self, collection_name: str = "cache_invalidations", size: int = 1024 * 1024):
+        self.collection_name = collection_name
+        self.size = size
+        self.collection = db.db[collection_name]
+        self.origin = uuid.uuid4().hex  # messages of this process are skipped
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, on_invalidate):
+        try:
+            await db.db.create_collection(self.collection_name, capped=True, size=self.size)
+        except CollectionInvalid:  # already exists
+            pass
+        # a tailable cursor on an empty collection dies immediately
+        await self.collection.insert_one({"origin": self.origin, "tags": []})
+        last = await self.collection.find_one({}, sort=[("$natural", -1)])
+        self._task = asyncio.create_task(self._tail(last["_id"], on_invalidate))
+
+    async def _tail(self, last_id, on_invalidate):
+        while True:
+            try:
+                cursor = self.collection.find(
+                    {"_id": {"$gt": last_id}}, cursor_type=CursorType.TAILABLE_AWAIT
+                )
+                while cursor.alive:
+                    async for message in cursor:
+                        last_id = message["_id"]
+                        if message.get("origin") != self.origin and message.get("tags"):
+                            on_invalidate(message["tags"])
+            except PyMongoError as e:
+                print(f"Error reading cache invalidations: {e}")
+                on_invalidate(None)
+            await asyncio.sleep(1)
+
+    async def publish(self, tags):
+        try:
+            await self.collection.insert_one({"origin": self.origin, "tags": sorted(tags)})
+        except PyMongoError as e:
+            print(f"Error publishing cache invalidations: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+BROKERS = {"local": LocalBroker, "mongo": MongoBroker}
+
+
+# ---- Read cache ----
+
+
+class ReadCache:
+    """TTL/LRU cache of read results, invalidated by tags across processes."""
+
+    def __init__(self, cache: TTLCache, broker: InvalidationBroker):
+        self.cache = cache
+        self.broker = broker
+        self._version = 0  # incremented by every invalidation
+
+    async def get_or_load(
+        self, key: Hashable, load: Callable[[], Awaitable[Any]], tags: Callable[[Any], Iterable[str]]
+    ):
+        """
+        Returns the cached value of a key, loading and caching it on a miss.
+
+        Args:
+            key: The cache key.
+            load: Reads the value from the database.
+            tags: Returns the tags of a loaded value. None values are not cached.
+        """
+        value = self.cache.get(key)
+        if value is not MISSING:
+            return value
+
+        version = self._version
+        value = await load()
+        # skip values read while a write invalidated the cache, they may be stale
+        if value is not None and version == self._version:
+            self.cache.set(key, value, tags(value))
+        return value
+
+    async def invalidate(self, tags: Iterable[str]):
+        """Drops the entries carrying any of the tags, in this and the other processes."""
+        tags = set(tags)
+        if not tags:
+            return
+        self._drop(tags)
+        await self.broker.publish(tags)
+
+    def _drop(self, tags: Optional[Iterable[str]]):
+        self._version += 1
+        if tags is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(tags)
+
+    async def start(self):
+        await self.broker.start(self._drop)
+
+    async def stop(self):
+        await self.broker.stop()
+
+
+read_cache = ReadCache(
+    TTLCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL),
+    BROKERS[settings.CACHE_BROKER](),
+)
+
+
+# ---- Tags ----
+
+
+def culture_tags(culture: dict) -> Set[str]:
+    """Tags of a cached culture: the culture and its ancestors (their re-parenting moves it)."""
+    return {f"culture:{culture['id']}"} | {
+        f"lineage:{ancestor_id}" for ancestor_id in culture.get("ancestor_ids") or []
+    }
+
+
+def culture_change_tags(before: Optional[dict] = None, after: Optional[dict] = None) -> Set[str]:
+    """Tags to invalidate after a culture was created, updated or deleted."""
+    tags = set()
+    for culture in (before, after):
+        if culture is None:
+            continue
+        tags.add(f"culture:{culture['id']}")
+        # genealogies of the parents include their children
+        tags.update(f"culture:{parent_id}" for parent_id in culture.get("parent_ids") or [])
+    # re-parenting or deleting a culture changes the lineage of its descendants
+    if before is not None and (after is None or before.get("ancestor_ids") != after.get("ancestor_ids")):
+        tags.add(f"lineage:{before['id']}")
+    return tags
+
+
+def note_change_tags(before: Optional[dict] = None, after: Optional[dict] = None) -> Set[str]:
+    """Tags to invalidate after a note was created, updated or deleted."""
+    return {
+        f"culture-notes:{note['culture_id']}"
+        for note in (before, after)
+        if note is not None and note.get("culture_id")
+    }
@@ -0,0 +1,117 @@
+"""
+Conditional GET for culture and note resources.
+
+Single documents are validated by their `updated_at` (weak ETag and
+Last-Modified); lists and genealogies by an aggregate version made of the
+number of documents and their latest `updated_at`. Fields the server maintains
+without touching `updated_at` (lineage, image derivatives) are folded into the
+ETags as a checksum. When the client's copy is still current the handler
+answers 304 Not Modified before anything is serialized.
+"""
+
+import datetime
+import zlib
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response, status
+
+# output fields changed by background writes that do not bump updated_at
+DERIVED_FIELDS = ("ancestor_ids", "generation", "image_derivatives")
+CACHE_CONTROL = "private, no-cache"  # always revalidate, the validators make it cheap
+
+
+# ---- Validators ----
+
+
+def _utc(value) -> Optional[datetime.datetime]:
+    """Returns a date as aware UTC datetime (naive dates are UTC as stored by MongoDB)."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def _millis(value: Optional[datetime.datetime]) -> int:
+    return int(value.timestamp() * 1000) if value else 0
+
+
+def _derived_checksum(document: dict, checksum: int = 0) -> int:
+    values = [document.get(field) for field in DERIVED_FIELDS if field in document]
+    return zlib.crc32(repr((document.get("id"), values)).encode(), checksum)
+
+
+def _headers(etag: str, last_modified: Optional[datetime.datetime]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(microsecond=0), usegmt=True)
+    return headers
+
+
+def document_validators(document: dict) -> dict:
+    """Returns the ETag, Last-Modified and Cache-Control headers of a culture or note."""
+    updated_at = _utc(document.get("updated_at"))
+    etag = f'W/"{_millis(updated_at):x}-{_derived_checksum(document):08x}"'
+    return _headers(etag, updated_at)
+
+
+def collection_validators(documents: Iterable[dict]) -> dict:
+    """Returns the ETag, Last-Modified and Cache-Control headers of a list of cultures or notes."""
+    count = 0
+    latest = None
+    checksum = 0
+    for document in documents:
+        count += 1
+        updated_at = _utc(document.get("updated_at"))
+        if updated_at and (latest is None or updated_at > latest):
+            latest = updated_at
+        checksum = _derived_checksum(document, checksum)
+    etag = f'W/"{count}-{_millis(latest):x}-{checksum:08x}"'
+    return _headers(etag, latest)
+
+
+# ---- Preconditions ----
+
+
+def is_not_modified(request: Request, validators: dict, use_last_modified: bool = True) -> bool:
+    """
+    Evaluates If-None-Match (weak comparison) and If-Modified-Since.
+
+    If-Modified-Since is only used without If-None-Match, and never for lists
+    (`use_last_modified=False`): removing a document does not change their
+    latest modification date.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etag = validators["ETag"].removeprefix("W/")
+        return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = validators.get("Last-Modified")
+    if not (use_last_modified and if_modified_since and last_modified):
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def conditional_response(
+    request: Request, response: Response, validators: dict, use_last_modified: bool = True
+) -> Optional[Response]:
+    """
+    Sets the validators on the response of a GET handler.
+
+    Returns:
+        A 304 Not Modified response when the client's copy is current (the handler
+        returns it instead of the body), otherwise None.
+    """
+    response.headers.update(validators)
+    if is_not_modified(request, validators, use_last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validators)
+    return None
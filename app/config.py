@@ -13,11 +13,23 @@ class Settings:
     FRONTEND_URL = os.getenv("CULTIVARE_FRONTEND_URL")
     MEDIA_DIR = "uploads" or os.getenv("CULTIVARE_MEDIA_DIR")
     ALLOWED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp"} # for note's attachment
+    MAX_UPLOAD_SIZE = int(os.getenv("CULTIVARE_MAX_UPLOAD_SIZE", 20 * 1024 * 1024)) # bytes, for note's attachment
+    IMAGE_WORKERS = int(os.getenv("CULTIVARE_IMAGE_WORKERS", 2)) # processes rendering attachment thumbnails
+    CACHE_TTL = float(os.getenv("CULTIVARE_CACHE_TTL", 60)) # seconds a cached culture, notes list or genealogy is served
+    CACHE_MAX_ENTRIES = int(os.getenv("CULTIVARE_CACHE_MAX_ENTRIES", 2048)) # cached reads per worker process, 0 disables the cache
+    CACHE_BROKER = os.getenv("CULTIVARE_CACHE_BROKER", "local") # 'local' or 'mongo' (share invalidations between worker processes)
+    STATS_RECONCILE_INTERVAL = int(os.getenv("CULTIVARE_STATS_RECONCILE_INTERVAL", 3600)) # seconds between full stats recomputes
+    LOOP_MONITOR = os.getenv("CULTIVARE_LOOP_MONITOR", "false").lower() == "true" # record event loop stalls, mount /api/admin (stalls, profile)
+    LOOP_STALL_THRESHOLD = float(os.getenv("CULTIVARE_LOOP_STALL_THRESHOLD", 0.1)) # seconds a callback may hold the event loop
 
     # Printer settings:
-    PRINTER_BACKEND = os.getenv("CULTIVARE_PRINTER_BACKEND")
+    PRINTER_BACKEND = os.getenv("CULTIVARE_PRINTER_BACKEND") # 'pyusb', 'linux_kernel', 'network' or 'fake' (records the raster data instead of printing)
     PRINTER_MODEL = os.getenv("CULTIVARE_PRINTER_MODEL")
     PRINTER_ADDRESS = os.getenv("CULTIVARE_PRINTER_ADDRESS") # ip address like tcp://192.168.0.10 or usb values from the Windows usb driver filter.  Linux/Raspberry Pi uses '/dev/usb/lp0'.
     PRINTER_LABEL_SIZE = os.getenv("CULTIVARE_PRINTER_LABEL_SIZE")
+    PRINT_MAX_ATTEMPTS = int(os.getenv("CULTIVARE_PRINT_MAX_ATTEMPTS", 3)) # attempts before a print job fails
+    PRINT_RETRY_DELAY = float(os.getenv("CULTIVARE_PRINT_RETRY_DELAY", 5)) # seconds, multiplied by the attempt number
+    PRINT_LEASE = float(os.getenv("CULTIVARE_PRINT_LEASE", 60)) # seconds a printing job stays claimed by its worker without a heartbeat
+    LABEL_CACHE_BYTES = int(os.getenv("CULTIVARE_LABEL_CACHE_BYTES", 8 * 1024 * 1024)) # bytes of rendered label PNGs kept in memory for reprints and previews
 
 settings = Settings()
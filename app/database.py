@@ -1,13 +1,16 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.config import settings
+from app.metrics import command_listener
 
 
 class MongoDB:
     def __init__(self):
-        self.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        # the listener attributes every command to the request issuing it (see app.metrics)
+        self.client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[command_listener])
         self.db = self.client[settings.DATABASE_NAME]
         self.cultures_collection = self.db[settings.CULTURES_COLLECTION_NAME]
         self.notes_collection = self.db[settings.NOTES_COLLECTION_NAME]
+        self.media_collection = self.db["media"]  # content-addressed attachment files
 
 
 db = MongoDB()
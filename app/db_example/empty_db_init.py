@@ -6,6 +6,9 @@ import glob
 from datetime import datetime
 from bson import ObjectId, Timestamp
 from app.config import settings
+from app.service.lineage import backfill_lineage
+from app.service.name_search import backfill_name_tokens
+from app.service.attachments import migrate_attachments
 
 
 class CustomJSONEncoder(json.JSONEncoder):
@@ -20,6 +23,17 @@ class CustomJSONEncoder(json.JSONEncoder):
             return super().default(o)
 
 
+DATE_FIELDS = ["origin_date", "completion_date", "updated_at", "created_at"]
+
+
+def parse_dates(document):
+    """Converts ISO date strings of an exported document back to datetimes."""
+    for field in DATE_FIELDS:
+        if isinstance(document.get(field), str):
+            document[field] = datetime.fromisoformat(document[field])
+    return document
+
+
 def copy_example_images():
     """
     Copies all .webp files from the example folder to the uploads folder.
@@ -69,7 +83,7 @@ async def import_collection_data():
         filename = f"app/db_example/{collection_name}.json"
         try:
             with open(filename, "r") as f:
-                data = json.load(f)
+                data = [parse_dates(document) for document in json.load(f)]
             if data:
                 await collection.drop()
                 await collection.insert_many(data)
@@ -92,6 +106,9 @@ async def init_db():
         print("Database is empty. Initializing with example data...")
         copy_example_images()
         await import_collection_data()
+        await backfill_lineage()
+        await backfill_name_tokens()
+        await migrate_attachments()
     else:
         print("Database already contains data. Skipping initialization.")
 
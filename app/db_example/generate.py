@@ -0,0 +1,418 @@
+"""
+Synthetic lab dataset generator.
+
+Builds a dataset of production size from the example fixtures (cultures.json
+and notes.json are used as templates for species, strains, media, note texts
+and colors):
+
+- cultures with branching genealogies of configurable depth and fan-out,
+  multi-parent crosses included; the derived fields (slug, name_tokens,
+  ancestor_ids, generation) are filled in as the API would
+- notes spread over the cultures with a power law (a few cultures collect most
+  notes), some with placeholder images stored in the content-addressed media
+  store
+- tags drawn from a Zipf distribution over a large vocabulary
+
+The dates span the `days` before `end` (DEFAULT_END unless given), so the same
+config and seed always give the same documents.
+
+The dataset is either streamed to NDJSON files (MongoDB extended JSON, one file
+per collection, loadable with mongoimport) or loaded straight into MongoDB with
+bulk inserts, after which the statistics and the tag dictionary are rebuilt and
+the derivatives of the placeholder images are rendered. The NDJSON media
+records have no derivatives, render them after the import with
+`python -m app.service.images`.
+
+    python -m app.db_example.generate --cultures 20000 --notes 100000 --load --drop
+    python -m app.db_example.generate --cultures 20000 --notes 100000 --output dataset/
+"""
+
+import argparse
+import asyncio
+import bisect
+import datetime
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from bson import json_util
+from PIL import Image, ImageDraw
+from pymongo import UpdateOne
+
+from app.config import settings
+from app.database import db
+from app.db_example.empty_db_init import parse_dates
+from app.service import images
+from app.service.attachments import attachment_fields, blob_filename
+from app.service.lineage import compute_lineage
+from app.service.media import remove_file
+from app.service.name_search import name_tokens, search_key
+from app.service.tag_dictionary import tags_collection
+
+FIXTURES_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_FIELDS = (
+    "species",
+    "strain",
+    "media_type",
+    "media_composition",
+    "temperature",
+    "humidity",
+    "light_conditions",
+    "growth_rate",
+    "morphology_notes",
+)
+TAG_WORDS = ["agar", "lc", "grain", "spawn", "bulk", "clone", "spore", "tissue", "g1", "g2", "g3",
+             "fast", "slow", "rhizo", "tomentose", "contam", "keeper", "fruiting", "pinning", "test"]
+PARENT_WINDOW = 50  # new cultures descend from recent ones, which builds deep lineages
+MAX_CULTURE_TAGS = 5
+MAX_NOTE_TAGS = 3
+BULK_CHUNK_SIZE = 1000
+DEFAULT_END = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)  # last date of a dataset
+
+
+class DatasetConfig(NamedTuple):
+    """Size and shape of a generated dataset."""
+
+    cultures: int = 2_000
+    max_depth: int = 8  # generations below the roots
+    fanout: int = 4  # maximum children of a culture
+    root_rate: float = 0.02  # share of cultures without parents
+    cross_rate: float = 0.05  # share of cultures with a second parent
+    notes: int = 20_000
+    note_exponent: float = 1.2  # power law of the number of notes per culture
+    tags: int = 1_000  # tag vocabulary
+    tag_exponent: float = 1.1  # Zipf exponent of the tag uses
+    image_rate: float = 0.2  # share of notes with an image
+    placeholder_images: int = 32  # distinct image files
+    days: int = 730  # time span of the dataset
+
+
+class Dataset(NamedTuple):
+    cultures: List[dict]
+    notes: Iterator[dict]  # generated lazily
+    media: Dict[str, dict]  # complete once the notes are consumed
+
+
+# ---- Samplers ----
+
+
+class ZipfSampler:
+    """Draws items with probability proportional to 1 / rank^exponent."""
+
+    def __init__(self, items: List, exponent: float, rng: random.Random):
+        self.items = items
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(1 / rank**exponent for rank in range(1, len(items) + 1)))
+
+    def sample(self, k: int) -> List:
+        """Draws up to k distinct items."""
+        total = self.cum_weights[-1]
+        chosen = {}
+        for _ in range(k):
+            index = bisect.bisect(self.cum_weights, self.rng.random() * total)
+            chosen[min(index, len(self.items) - 1)] = True
+        return [self.items[index] for index in chosen]
+
+
+def tag_vocabulary(size: int, templates: Iterable[dict]) -> List[str]:
+    """Returns `size` tags, the tags of the fixtures first (the most used ones)."""
+    tags = list(dict.fromkeys(tag for template in templates for tag in template.get("tags") or []))
+    for number in itertools.count(1):
+        if len(tags) >= size:
+            break
+        tags += [f"{word}-{number}" for word in TAG_WORDS]
+    return tags[:size]
+
+
+def load_templates():
+    """Returns the example cultures and notes."""
+    templates = []
+    for name in ("cultures", "notes"):
+        with open(os.path.join(FIXTURES_DIR, f"{name}.json")) as f:
+            templates.append([parse_dates(document) for document in json.load(f)])
+    return templates
+
+
+def _unique_id(rng: random.Random, used: set) -> str:
+    while True:
+        id = f"{rng.getrandbits(48):012x}"
+        if id not in used:
+            used.add(id)
+            return id
+
+
+# ---- Generators ----
+
+
+def generate_cultures(
+    config: DatasetConfig, rng: random.Random, templates: List[dict], tags: ZipfSampler, start: datetime.datetime
+) -> List[dict]:
+    """Generates cultures in creation order, parents always before their children."""
+    end = start + datetime.timedelta(days=config.days)
+    step = (end - start) / max(config.cultures, 1)
+    used_ids = set()
+    cultures = []
+    lineages = {}
+    open_parents = []  # cultures that may still get children
+    children = {}
+
+    for i in range(config.cultures):
+        template = rng.choice(templates)
+        id = _unique_id(rng, used_ids)
+
+        parent_ids = []
+        if open_parents and rng.random() >= config.root_rate:
+            index = len(open_parents) - 1 - rng.randrange(min(PARENT_WINDOW, len(open_parents)))
+            parent = open_parents[index]
+            parent_ids.append(parent["id"])
+            children[parent["id"]] = children.get(parent["id"], 0) + 1
+            if children[parent["id"]] >= config.fanout:
+                open_parents[index] = open_parents[-1]
+                open_parents.pop()
+            if rng.random() < config.cross_rate:  # crossed with any culture that may have children
+                partner = rng.choice(cultures)
+                if partner["id"] != parent["id"] and partner["generation"] < config.max_depth:
+                    parent_ids.append(partner["id"])
+
+        lineage = compute_lineage(id, parent_ids, lineages)
+        lineages[id] = lineage
+        created_at = start + step * i + datetime.timedelta(seconds=rng.uniform(0, step.total_seconds()))
+        name = f"{template['name']} G{lineage['generation']} #{i + 1}"
+        culture = {
+            "id": id,
+            "name": name,
+            "slug": search_key(name),
+            "name_tokens": name_tokens(name),
+            "favorite": rng.random() < 0.05,
+            "parent_ids": parent_ids,
+            **lineage,
+            "tags": tags.sample(rng.randint(0, MAX_CULTURE_TAGS)),
+            "source_id": None,
+            "origin_date": created_at,
+            "completion_date": None,
+            **{field: template.get(field) for field in TEMPLATE_FIELDS},
+            "experiment_id": None,
+            "created_at": created_at,
+            "updated_at": min(created_at + datetime.timedelta(hours=rng.expovariate(1 / 48)), end),
+        }
+        cultures.append(culture)
+        if lineage["generation"] < config.max_depth:
+            open_parents.append(culture)
+
+    return cultures
+
+
+def placeholder_images(count: int, rng: random.Random, media_dir: str) -> List[dict]:
+    """Writes placeholder webp images into the content-addressed store and returns their media records."""
+    media = []
+    for number in range(count):
+        color = tuple(rng.randrange(40, 220) for _ in range(3))
+        image = Image.new("RGB", (640, 480), color)
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):  # colonies
+            x, y, r = rng.randrange(640), rng.randrange(480), rng.randrange(10, 80)
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(255 - c for c in color))
+        draw.text((16, 16), f"placeholder {number + 1}", fill=(255, 255, 255))
+
+        buffer = io.BytesIO()
+        image.save(buffer, "WEBP", quality=60)
+        content = buffer.getvalue()
+        sha256 = hashlib.sha256(content).hexdigest()
+        filename = blob_filename(sha256, ".webp")
+        path = os.path.join(media_dir, filename)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+        media.append({"_id": sha256, "filename": filename, "size": len(content), "refcount": 0, "derivatives": None})
+    return media
+
+
+def generate_notes(
+    config: DatasetConfig,
+    rng: random.Random,
+    cultures: List[dict],
+    templates: List[dict],
+    tags: ZipfSampler,
+    images: List[dict],
+    end: datetime.datetime,
+) -> Iterator[dict]:
+    """Generates notes, the number of notes per culture following a power law."""
+    if not cultures:
+        return
+    ranks = list(range(1, len(cultures) + 1))
+    rng.shuffle(ranks)
+    cum_weights = list(itertools.accumulate(1 / rank**config.note_exponent for rank in ranks))
+    used_ids = set()
+
+    for culture in rng.choices(cultures, cum_weights=cum_weights, k=config.notes):
+        template = rng.choice(templates)
+        span = max((end - culture["created_at"]).total_seconds(), 1)
+        created_at = culture["created_at"] + datetime.timedelta(seconds=rng.uniform(0, span))
+        note = {
+            "id": _unique_id(rng, used_ids),
+            "culture_id": culture["id"],
+            "favorite": rng.random() < 0.03,
+            "tags": tags.sample(rng.randint(0, MAX_NOTE_TAGS)),
+            "text": template.get("text"),
+            "color": template.get("color"),
+            "image_filename": None,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+        if images and rng.random() < config.image_rate:
+            media = rng.choice(images)
+            media["refcount"] += 1
+            note.update(attachment_fields(media))
+        yield note
+
+
+def generate_dataset(
+    config: DatasetConfig,
+    seed: int = 1,
+    media_dir: str = settings.MEDIA_DIR,
+    end: datetime.datetime = DEFAULT_END,
+) -> Dataset:
+    """Generates a dataset ending at `end`; the same config, seed and end always give the same documents."""
+    rng = random.Random(seed)
+    culture_templates, note_templates = load_templates()
+    tags = ZipfSampler(tag_vocabulary(config.tags, culture_templates + note_templates), config.tag_exponent, rng)
+    start = end - datetime.timedelta(days=config.days)
+
+    cultures = generate_cultures(config, rng, culture_templates, tags, start)
+    images = placeholder_images(config.placeholder_images, rng, media_dir) if config.image_rate > 0 else []
+    notes = generate_notes(config, rng, cultures, note_templates, tags, images, end)
+    return Dataset(cultures, notes, {media["_id"]: media for media in images})
+
+
+# ---- Output ----
+
+
+def _chunks(documents: Iterable[dict], size: int = BULK_CHUNK_SIZE) -> Iterator[List[dict]]:
+    iterator = iter(documents)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def write_ndjson(dataset: Dataset, directory: str) -> Dict[str, int]:
+    """Streams the dataset to `<collection>.ndjson` files (extended JSON, for mongoimport)."""
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    collections = (
+        (settings.CULTURES_COLLECTION_NAME, dataset.cultures),
+        (settings.NOTES_COLLECTION_NAME, dataset.notes),
+        ("media", lambda: [media for media in dataset.media.values() if media["refcount"]]),
+    )
+    for name, documents in collections:
+        if callable(documents):  # media reference counts are known once the notes are written
+            documents = documents()
+        counts[name] = 0
+        with open(os.path.join(directory, f"{name}.ndjson"), "w") as f:
+            for document in documents:
+                f.write(json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS) + "\n")
+                counts[name] += 1
+    return counts
+
+
+async def load_dataset(dataset: Dataset, drop: bool = False, derivatives: bool = True) -> Dict[str, int]:
+    """
+    Bulk loads the dataset into MongoDB, then rebuilds the statistics and the tag dictionary.
+
+    Args:
+        dataset: The generated dataset.
+        drop: Delete the cultures, notes, media and tags first, with the stored
+            files of the media that are not part of the dataset and all derivatives.
+        derivatives: Render the derivatives of the placeholder images (otherwise
+            their records have none, like attachments still being rendered).
+
+    Returns:
+        The number of documents loaded per collection.
+    """
+    from app.service.statistics import reconcile_stats
+
+    if drop:
+        old_media = await db.media_collection.find({}, {"filename": 1, "derivatives": 1}).to_list(length=None)
+        for collection in (db.cultures_collection, db.notes_collection, db.media_collection, tags_collection):
+            await collection.delete_many({})
+        kept = {media["filename"] for media in dataset.media.values()}
+        for media in old_media:
+            if media["filename"] not in kept:
+                await remove_file(os.path.join(settings.MEDIA_DIR, media["filename"]))
+            await images.remove_derivatives(media.get("derivatives"))
+
+    counts = {settings.CULTURES_COLLECTION_NAME: 0, settings.NOTES_COLLECTION_NAME: 0, "media": 0}
+    for collection, documents in ((db.cultures_collection, dataset.cultures), (db.notes_collection, dataset.notes)):
+        for chunk in _chunks(documents):
+            await collection.insert_many(chunk, ordered=False)
+            counts[collection.name] += len(chunk)
+
+    operations = [
+        UpdateOne(
+            {"_id": media["_id"]},
+            {
+                "$inc": {"refcount": media["refcount"]},
+                "$setOnInsert": {key: media[key] for key in ("filename", "size", "derivatives")},
+            },
+            upsert=True,
+        )
+        for media in dataset.media.values()
+        if media["refcount"]
+    ]
+    if operations:
+        await db.media_collection.bulk_write(operations, ordered=False)
+        counts["media"] = len(operations)
+
+    await reconcile_stats()
+    if derivatives and operations:
+        await images.backfill_derivatives()
+    return counts
+
+
+# ---- CLI ----
+
+
+async def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    defaults = DatasetConfig()
+    for field in DatasetConfig._fields:
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(getattr(defaults, field)), default=getattr(defaults, field))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--end",
+        type=datetime.datetime.fromisoformat,
+        default=DEFAULT_END,
+        help=f"last date of the dataset, ISO format (default: {DEFAULT_END.date()})",
+    )
+    parser.add_argument("--media-dir", default=settings.MEDIA_DIR, help="where the placeholder images are stored")
+    parser.add_argument("--output", help="directory of the NDJSON files")
+    parser.add_argument("--load", action="store_true", help="load into the configured MongoDB database")
+    parser.add_argument(
+        "--drop", action="store_true", help="delete the cultures, notes, media and tags (and media files) before loading"
+    )
+    parser.add_argument("--no-derivatives", action="store_true", help="do not render the derivatives of the images")
+    options = parser.parse_args(args)
+    if not options.output and not options.load:
+        parser.error("use --output and/or --load")
+
+    config = DatasetConfig(**{field: getattr(options, field) for field in DatasetConfig._fields})
+    end = options.end if options.end.tzinfo else options.end.replace(tzinfo=datetime.timezone.utc)
+    dataset = generate_dataset(config, options.seed, options.media_dir, end)
+    if options.output:
+        counts = write_ndjson(dataset, options.output)
+        print(f"Written to {options.output}: {counts}")
+    if options.load:
+        if options.output:  # the notes were consumed by the files, generate the same ones again
+            dataset = generate_dataset(config, options.seed, options.media_dir, end)
+        try:
+            counts = await load_dataset(dataset, options.drop, derivatives=not options.no_derivatives)
+            print(f"Loaded into {settings.DATABASE_NAME}: {counts}")
+        finally:
+            db.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
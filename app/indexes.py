@@ -0,0 +1,330 @@
+"""
+Index registry.
+
+Every index the routers and services rely on is declared here, next to the
+queries it serves. `ensure_indexes` reconciles the database with the registry
+at startup: missing indexes are created, indexes that are not declared (or
+declared with different options) are only reported, never dropped, so an
+operator decides when to remove them.
+
+`EXPLAINED_QUERIES` lists the query shapes of the routers. Check that none of
+them scans a whole collection with:
+
+    python -m app.indexes             # create the missing indexes, report extra ones
+    python -m app.indexes explain     # explain the router queries, exits 1 on COLLSCAN
+
+The list can drift from the routers, so tests/test_indexes.py also records the
+commands the routers actually send (app.metrics.record_commands) and explains
+them with `explain_commands`.
+"""
+
+import asyncio
+import datetime
+import re
+import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+from app.config import settings
+from app.database import db
+from app.pagination import PAGE_SORT
+from app.service.print_queue import JOB_RETENTION
+from app.service.tag_dictionary import TAG_COLLATION
+
+CULTURES = settings.CULTURES_COLLECTION_NAME
+NOTES = settings.NOTES_COLLECTION_NAME
+
+# options compared with the existing indexes of the same name
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds")
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    CULTURES: [
+        IndexModel("id", unique=True),
+        IndexModel("slug", unique=True),  # name search tiers, sorted by slug
+        IndexModel("name_tokens"),  # name search infix tier
+        IndexModel("parent_ids"),  # genealogy $graphLookup of the children
+        IndexModel([("ancestor_ids", ASCENDING), ("generation", ASCENDING)]),  # descendants, lineage cascade
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),  # pages, daily created counts
+        IndexModel([("favorite", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),  # favorite pages and count
+        IndexModel([("generation", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),  # generation pages
+        IndexModel("updated_at"),  # daily updated counts
+        IndexModel([("tags", TEXT), ("name", TEXT)]),  # full text search
+    ],
+    NOTES: [
+        IndexModel("id", unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),  # pages, daily created counts
+        IndexModel([("culture_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),  # notes of a culture
+        IndexModel([("favorite", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),  # favorite pages and count
+        IndexModel("updated_at"),  # daily updated counts
+        IndexModel("image_sha256"),  # notes referencing an attachment
+        IndexModel([("tags", TEXT), ("text", TEXT)]),  # full text search
+    ],
+    "tags": [
+        IndexModel("name", collation=TAG_COLLATION),  # case-insensitive autocomplete
+        IndexModel([("total", DESCENDING), ("name", ASCENDING)]),  # most used first
+    ],
+    "print_jobs": [
+        IndexModel("id", unique=True),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),  # jobs to resume
+        IndexModel("finished_at", expireAfterSeconds=JOB_RETENTION),  # finished jobs expire
+    ],
+}
+
+
+# ---- Reconciliation ----
+
+
+def _differences(declared: dict, existing: dict) -> List[str]:
+    differences = []
+    is_text = TEXT in declared["key"].values()  # stored as _fts/_ftsx keys
+    if not is_text and list(declared["key"].items()) != list(existing["key"].items()):
+        differences.append(f"key {dict(existing['key'])} instead of {dict(declared['key'])}")
+    for option in COMPARED_OPTIONS:
+        if declared.get(option) != existing.get(option):
+            differences.append(f"{option}={existing.get(option)} instead of {declared.get(option)}")
+    return differences
+
+
+async def ensure_indexes(indexes: Dict[str, List[IndexModel]] = INDEXES) -> dict:
+    """
+    Creates the declared indexes missing from the database and reports the others.
+
+    Returns:
+        The names of the "created" indexes, the "extra" indexes that are not
+        declared and the "conflicting" ones declared with other options,
+        each as "<collection>.<index>".
+    """
+    report = {"created": [], "extra": [], "conflicting": []}
+    for collection_name, models in indexes.items():
+        collection = db.db[collection_name]
+        existing = {index["name"]: index async for index in collection.list_indexes()}
+
+        missing = []
+        for model in models:
+            declared = model.document
+            name = declared["name"]
+            if name not in existing:
+                missing.append(model)
+            elif _differences(declared, existing[name]):
+                report["conflicting"].append(
+                    f"{collection_name}.{name} ({', '.join(_differences(declared, existing[name]))})"
+                )
+        if missing:
+            await collection.create_indexes(missing)
+            report["created"] += [f"{collection_name}.{model.document['name']}" for model in missing]
+
+        declared_names = {model.document["name"] for model in models} | {"_id_"}
+        report["extra"] += [
+            f"{collection_name}.{name}" for name in existing if name not in declared_names
+        ]
+
+    if report["created"]:
+        print(f"Indexes created: {', '.join(report['created'])}")
+    if report["extra"]:
+        print(f"Indexes not declared in app.indexes (not dropped): {', '.join(report['extra'])}")
+    if report["conflicting"]:
+        print(f"Indexes with other options than declared: {', '.join(report['conflicting'])}")
+    return report
+
+
+# ---- Query plans ----
+
+
+class ExplainedQuery(NamedTuple):
+    """A query shape of the routers, explained by `explain_queries`."""
+
+    name: str
+    collection: str
+    filter: dict
+    sort: Optional[dict] = None
+    collation: Optional[dict] = None
+
+
+PAGE = dict(PAGE_SORT)
+SAMPLE_ID = "000000000000"
+SINCE = datetime.datetime(2000, 1, 1)
+
+EXPLAINED_QUERIES = [
+    ExplainedQuery("culture by id", CULTURES, {"id": SAMPLE_ID}),
+    ExplainedQuery("cultures by ids", CULTURES, {"id": {"$in": [SAMPLE_ID]}}),
+    ExplainedQuery("cultures page", CULTURES, {}, PAGE),
+    ExplainedQuery("favorite cultures page", CULTURES, {"favorite": True}, PAGE),
+    ExplainedQuery("cultures of a generation page", CULTURES, {"generation": 1}, PAGE),
+    ExplainedQuery("favorite cultures count", CULTURES, {"favorite": True}),
+    ExplainedQuery("children of a culture", CULTURES, {"parent_ids": SAMPLE_ID}),
+    ExplainedQuery("descendants", CULTURES, {"ancestor_ids": SAMPLE_ID}, {"generation": 1}),
+    ExplainedQuery(
+        "descendants of a generation", CULTURES, {"ancestor_ids": SAMPLE_ID, "generation": 2}, {"generation": 1}
+    ),
+    ExplainedQuery("name search exact", CULTURES, {"slug": "oyster"}, {"slug": 1}),
+    ExplainedQuery("name search prefix", CULTURES, {"slug": {"$regex": re.compile("^oyster"), "$ne": "oyster"}}, {"slug": 1}),
+    ExplainedQuery("name search infix", CULTURES, {"name_tokens": re.compile("^oyster")}, {"slug": 1}),
+    ExplainedQuery("cultures text search", CULTURES, {"$text": {"$search": "oyster"}}),
+    ExplainedQuery("cultures created since", CULTURES, {"created_at": {"$gte": SINCE}}),
+    ExplainedQuery("cultures updated since", CULTURES, {"updated_at": {"$gte": SINCE}}),
+    ExplainedQuery("note by id", NOTES, {"id": SAMPLE_ID}),
+    ExplainedQuery("notes page", NOTES, {}, PAGE),
+    ExplainedQuery("favorite notes page", NOTES, {"favorite": True}, PAGE),
+    ExplainedQuery("notes of a culture page", NOTES, {"culture_id": SAMPLE_ID}, PAGE),
+    ExplainedQuery("notes of an attachment", NOTES, {"image_sha256": "0" * 64}),
+    ExplainedQuery("notes text search", NOTES, {"$text": {"$search": "oyster"}}),
+    ExplainedQuery("notes created since", NOTES, {"created_at": {"$gte": SINCE}}),
+    ExplainedQuery("notes updated since", NOTES, {"updated_at": {"$gte": SINCE}}),
+    ExplainedQuery("tags by use", "tags", {}, {"total": -1, "name": 1}),
+    ExplainedQuery(
+        "tag autocomplete", "tags", {"name": {"$gte": "oy", "$lt": "oy\uffff"}}, {"total": -1, "name": 1},
+        TAG_COLLATION.document,
+    ),
+    ExplainedQuery("print job by id", "print_jobs", {"id": SAMPLE_ID}),
+    ExplainedQuery("queued print jobs", "print_jobs", {"status": "queued"}, {"created_at": 1}),
+    ExplainedQuery(
+        "expired print jobs", "print_jobs",
+        {"status": "printing", "$or": [{"lease_expires_at": {"$lt": SINCE}}, {"lease_expires_at": None}]},
+        {"created_at": 1},
+    ),
+]
+
+
+def plan_stages(plan) -> List[str]:
+    """Returns the names of all stages of an explained query plan."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages += plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages += plan_stages(value)
+    return stages
+
+
+def winning_plan_stages(explanation) -> List[str]:
+    """Returns the stages of the winning plans of an explain result (find, aggregate or write)."""
+    stages = []
+    if isinstance(explanation, dict):
+        for key, value in explanation.items():
+            stages += plan_stages(value) if key == "winningPlan" else winning_plan_stages(value)
+    elif isinstance(explanation, list):
+        for value in explanation:
+            stages += winning_plan_stages(value)
+    return stages
+
+
+async def explain(command: dict) -> List[str]:
+    """Explains a command (without running it) and returns the stages of its winning plans."""
+    explanation = await db.db.command({"explain": command, "verbosity": "queryPlanner"})
+    return winning_plan_stages(explanation)
+
+
+async def explain_queries(queries: List[ExplainedQuery] = EXPLAINED_QUERIES) -> List[str]:
+    """
+    Explains the router queries and returns the names of those scanning a whole collection.
+
+    Each query is explained as a `find` with its sort (some are aggregation
+    `$match` stages or counts in the routers, which are planned the same way).
+    """
+    collection_scans = []
+    for query in queries:
+        command = {"find": query.collection, "filter": query.filter, "limit": 20}
+        if query.sort:
+            command["sort"] = query.sort
+        if query.collation:
+            command["collation"] = query.collation
+        stages = await explain(command)
+        scan = "COLLSCAN" in stages
+        if scan:
+            collection_scans.append(query.name)
+        print(f"{'COLLSCAN' if scan else 'ok':<9} {query.name:<32} {' <- '.join(stages)}")
+    return collection_scans
+
+
+# ---- Recorded commands ----
+
+
+# commands with a query, by the field holding their statements
+EXPLAINABLE_COMMANDS = {
+    "find": None,
+    "aggregate": None,
+    "count": None,
+    "distinct": None,
+    "findAndModify": None,
+    "update": "updates",
+    "delete": "deletes",
+}
+
+
+def _query(name: str, command: dict):
+    if name == "find":
+        return command.get("filter")
+    if name == "aggregate":
+        pipeline = command.get("pipeline") or [{}]
+        return pipeline[0].get("$match", {}) if "$match" in pipeline[0] else {}
+    return command.get("query") or command.get("q")
+
+
+def explainable_commands(command: dict) -> List[dict]:
+    """
+    Returns the commands to explain for a command sent by the app (one per write statement).
+
+    Queries over a whole collection by design (an empty filter without sort, like
+    the unpaginated lists or the statistics recomputation) are left out.
+    """
+    name = next(iter(command), None)
+    if name not in EXPLAINABLE_COMMANDS or command.get("$db") != settings.DATABASE_NAME:
+        return []
+    command = {
+        key: value for key, value in command.items() if not key.startswith("$") and key not in ("lsid", "txnNumber")
+    }
+
+    statements_field = EXPLAINABLE_COMMANDS[name]
+    commands = (
+        [{**command, statements_field: [statement]} for statement in command[statements_field]]
+        if statements_field
+        else [command]
+    )
+    return [
+        command
+        for command in commands
+        if _query(name, command[statements_field][0] if statements_field else command) or command.get("sort")
+    ]
+
+
+async def explain_commands(commands: Iterable[dict]) -> List[str]:
+    """
+    Explains recorded commands (see app.metrics.record_commands) and returns those scanning a whole collection.
+
+    Returns:
+        A description (command, collection and query) of each distinct scanning command.
+    """
+    collection_scans = {}
+    for sent in commands:
+        for command in explainable_commands(sent):
+            name = next(iter(command))
+            statements_field = EXPLAINABLE_COMMANDS[name]
+            query = _query(name, command[statements_field][0] if statements_field else command)
+            description = f"{name} {command[name]} {query}"
+            if description in collection_scans:
+                continue
+            stages = await explain(command)
+            if "COLLSCAN" in stages:
+                collection_scans[description] = stages
+    return list(collection_scans)
+
+
+async def main(command: str = "ensure"):
+    try:
+        await ensure_indexes()
+        if command == "explain":
+            collection_scans = await explain_queries()
+            if collection_scans:
+                print(f"Collection scans: {', '.join(collection_scans)}")
+                return 1
+        return 0
+    finally:
+        db.client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(*sys.argv[1:2])))
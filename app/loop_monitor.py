@@ -0,0 +1,189 @@
+"""
+Event loop stall detection and sampling profiler.
+
+Blocking work on the event loop (rendering, file IO, CPU heavy loops) delays
+every concurrent request. When enabled (CULTIVARE_LOOP_MONITOR=true), a
+heartbeat task on the loop and a watchdog thread detect any callback holding
+the loop longer than CULTIVARE_LOOP_STALL_THRESHOLD: the watchdog captures the
+stack of the loop thread while it is still blocked, together with the route
+of the request running at that moment (tracked by `LoopMonitorMiddleware`).
+The last stalls are listed on /api/admin/stalls.
+
+`sample_profile` samples the stacks of the live process for a few seconds and
+returns them in the folded format of flamegraph.pl and speedscope
+(`frame;frame;frame count` per line), see /api/admin/profile.
+
+The admin endpoints are only mounted when the monitor is enabled: they have
+no authentication and show the code paths of every thread.
+"""
+
+import asyncio
+import datetime
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import Counter, deque
+from typing import Deque, List, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+
+MAX_STALLS = 100  # stalls kept for /api/admin/stalls
+MAX_STACK_FRAMES = 40
+
+
+def _route(scope: Optional[Scope]) -> Optional[str]:
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope.get('method')} {getattr(route, 'path', None) or scope.get('path')}"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+# ---- Stall detection ----
+
+
+class LoopMonitor:
+    """Records the event loop callbacks running longer than a threshold."""
+
+    def __init__(self, threshold: float, max_stalls: int = MAX_STALLS):
+        self.threshold = threshold  # seconds
+        self.interval = threshold / 4  # heartbeat and watchdog period
+        self.stalls: Deque[dict] = deque(maxlen=max_stalls)
+        self.requests = weakref.WeakKeyDictionary()  # task -> ASGI scope of the request it serves
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._stall: Optional[dict] = None  # stall in progress, detected by the watchdog
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        """Starts the heartbeat on the running loop and the watchdog thread."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        self._task = None
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            stall = self._stall
+            if stall is not None:
+                # the loop was blocked from the last beat until now, minus the sleep
+                stall["duration_ms"] = round((now - self._last_beat - self.interval) * 1000, 1)
+                self._stall = None
+                print(f"Event loop blocked for {stall['duration_ms']} ms ({stall['route'] or 'no request'})")
+            self._last_beat = now
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            last_beat = self._last_beat
+            blocked = time.monotonic() - last_beat - self.interval
+            if self._stall is None and blocked > self.threshold:
+                self._stall = self._capture(blocked)
+                self.stalls.append(self._stall)
+
+    def _capture(self, blocked: float) -> dict:
+        """Captures the stack of the blocked loop thread and the route of its current request."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = []
+        if frame is not None:
+            stack = [
+                f"{entry.filename}:{entry.lineno} in {entry.name}"
+                for entry in traceback.extract_stack(frame)[-MAX_STACK_FRAMES:]
+            ]
+        task = asyncio.current_task(self._loop)
+        return {
+            "started_at": datetime.datetime.now(datetime.timezone.utc)
+            - datetime.timedelta(seconds=blocked),
+            "duration_ms": None,  # set when the loop runs again
+            "route": _route(self.requests.get(task)) if task is not None else None,
+            "stack": stack,
+        }
+
+
+loop_monitor = LoopMonitor(settings.LOOP_STALL_THRESHOLD)
+
+
+class LoopMonitorMiddleware:
+    """Tracks the request served by every task, to name the route of a stall."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        task = asyncio.current_task()
+        if scope["type"] == "http" and task is not None:
+            loop_monitor.requests[task] = scope
+        await self.app(scope, receive, send)
+
+
+# ---- Sampling profiler ----
+
+
+profile_lock = threading.Lock()  # one profile at a time
+
+
+def sample_profile(
+    duration: float,
+    interval: float,
+    thread_ids: Optional[List[int]] = None,
+    stop: Optional[threading.Event] = None,
+) -> str:
+    """
+    Samples the stacks of the process threads (blocking, run it in a thread).
+
+    Args:
+        duration: Seconds to sample for.
+        interval: Seconds between two samples.
+        thread_ids: Threads to sample, all threads but the sampling one when None.
+        stop: Ends the sampling early when set.
+
+    Returns:
+        The folded stacks, one `thread;outer;...;inner count` line per distinct stack.
+    """
+    own_id = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    folded = Counter()
+    stop = stop or threading.Event()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline and not stop.is_set():
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or (thread_ids is not None and thread_id not in thread_ids):
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_frame_name(frame))
+                frame = frame.f_back
+            frames.append(names.get(thread_id, str(thread_id)))
+            folded[";".join(reversed(frames))] += 1
+        stop.wait(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in folded.most_common())
@@ -1,16 +1,28 @@
+import asyncio
 from fastapi import FastAPI, APIRouter
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.database import db
 from app.config import settings
-from app.routers import cultures, notes, tags, search, stats, labelprint
+from app.cache import read_cache
+from app.metrics import MetricsMiddleware
+from app.loop_monitor import LoopMonitorMiddleware, loop_monitor
+from app.pagination import NEXT_CURSOR_HEADER
+from app.static import MediaStaticFiles
+from app.routers import cultures, notes, tags, search, stats, labelprint, metrics, admin
 from app.db_example.empty_db_init import init_db
+from app.indexes import ensure_indexes
+from app.service.statistics import run_stats_reconciliation
+from app.service import images
+from app.service.print_queue import start_print_queue, stop_print_queue
 
 # --- MongoDB lifespan context manager ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # run on start
+    if settings.LOOP_MONITOR:
+        loop_monitor.start()  # also catches blocking work of the startup below
+
     try:
         await init_db()
     except Exception as e:
@@ -18,20 +30,27 @@ async def lifespan(app: FastAPI):
     
     try:
         print("Creating indexes...")
-        # Create indexes (using await)
-        await db.cultures_collection.create_index("slug", unique=True)
-        await db.cultures_collection.create_index("id", unique=True)
-        await db.notes_collection.create_index("id", unique=True)
-        
-        await db.cultures_collection.create_index([("tags", "text"), ("name", "text")])
-        await db.notes_collection.create_index([("tags", "text"), ("text", "text")])
-        
+        # create the indexes declared in app.indexes, report undeclared ones
+        await ensure_indexes()
         print("Indexes created successfully!")
+
+        # keep incrementally maintained stats from drifting
+        stats_task = asyncio.create_task(
+            run_stats_reconciliation(settings.STATS_RECONCILE_INTERVAL)
+        )
+        images.start_pool()
+        await start_print_queue()
+        await read_cache.start()
         yield
+        await read_cache.stop()
+        stats_task.cancel()
+        images.shutdown_pool()
+        await stop_print_queue()
         # run on shutdown
     except Exception as e:
         print(f"Error creating indexes: {e}")
     finally:
+        await loop_monitor.stop()  # started before the try, also stopped when the startup fails
         print("Closing MongoDB connection...")
         db.client.close()
         print("MongoDB connection closed.")
@@ -54,10 +73,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=[NEXT_CURSOR_HEADER, "Server-Timing"],  # Keyset pagination cursor of list endpoints, database time
 )
 
-# Mount the uploads directory as a static files directory
-app.mount("/api/static", StaticFiles(directory=settings.MEDIA_DIR), name="static")
+# MongoDB commands, database time and duration per route (Server-Timing header, /api/metrics)
+app.add_middleware(MetricsMiddleware)
+
+# route of the request blocking the event loop, for the loop monitor
+if settings.LOOP_MONITOR:
+    app.add_middleware(LoopMonitorMiddleware)
+
+# Mount the uploads directory as a static files directory (content-addressed files are cached immutably)
+app.mount("/api/static", MediaStaticFiles(directory=settings.MEDIA_DIR), name="static")
 
 # Routers
 api_router = APIRouter(prefix="/api")  # Main API router
@@ -67,4 +94,7 @@ api_router.include_router(tags.router)
 api_router.include_router(search.router)
 api_router.include_router(stats.router)
 api_router.include_router(labelprint.router)
+api_router.include_router(metrics.router)
+if settings.LOOP_MONITOR:  # stalls and profiles expose the stacks of the process, opt-in only
+    api_router.include_router(admin.router)
 app.include_router(api_router)  # Include the main router
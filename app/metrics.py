@@ -0,0 +1,239 @@
+"""
+Per-endpoint MongoDB instrumentation and Prometheus metrics.
+
+`command_listener` is registered on the Motor client (see app.database) and
+sees every command sent to MongoDB. Motor runs pymongo in threads with a copy
+of the caller's context, so the listener attributes each command to the
+request that issued it through the `request_stats` context variable set by
+`MetricsMiddleware`. At the end of a request, its number of commands,
+database time and returned documents are recorded in histograms labelled
+with the route template. The histograms are exported in the Prometheus text
+format on /api/metrics, and every response carries the database time of its
+request in a Server-Timing header (shown by the browser devtools).
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+DOCUMENT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+# cursor batches of the replies, by command name
+BATCH_FIELDS = {"find": "firstBatch", "aggregate": "firstBatch", "getMore": "nextBatch"}
+
+
+# ---- Histograms ----
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    """Prometheus histogram with labels (cumulative buckets, sum and count)."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], buckets: Iterable[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = (*sorted(buckets), float("inf"))
+        self._series: Dict[tuple, list] = {}  # label values -> [count per bucket..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        """Returns the lines of the histogram in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            separator = "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text}{separator}le="{_format_value(bound)}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {values[-1]!r}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+REQUEST_LABELS = ("method", "route")
+
+request_duration = Histogram(
+    "cultivare_request_duration_seconds", "Duration of the API requests.", REQUEST_LABELS, DURATION_BUCKETS
+)
+request_db_commands = Histogram(
+    "cultivare_request_db_commands", "MongoDB commands (round trips) per request.", REQUEST_LABELS, COUNT_BUCKETS
+)
+request_db_duration = Histogram(
+    "cultivare_request_db_duration_seconds", "Time spent in MongoDB commands per request.", REQUEST_LABELS, DURATION_BUCKETS
+)
+request_db_documents = Histogram(
+    "cultivare_request_db_documents", "Documents returned by MongoDB per request.", REQUEST_LABELS, DOCUMENT_BUCKETS
+)
+command_duration = Histogram(
+    "cultivare_db_command_duration_seconds",
+    "Duration of the MongoDB commands, including the ones of background tasks.",
+    ("command",),
+    DURATION_BUCKETS,
+)
+
+HISTOGRAMS = [request_duration, request_db_commands, request_db_duration, request_db_documents, command_duration]
+
+
+def render_metrics() -> str:
+    """Returns all metrics in the Prometheus text format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    return "\n".join(lines) + "\n"
+
+
+# ---- Per-request database usage ----
+
+
+class RequestStats:
+    """MongoDB usage of one request, updated from the threads running its commands."""
+
+    def __init__(self):
+        self.commands = 0
+        self.duration = 0.0  # seconds
+        self.documents = 0
+        self._lock = threading.Lock()
+
+    def add(self, duration: float, documents: int):
+        with self._lock:
+            self.commands += 1
+            self.duration += duration
+            self.documents += documents
+
+
+request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+def returned_documents(command_name: str, reply) -> int:
+    """Counts the documents returned in the reply of a command."""
+    if not isinstance(reply, dict):
+        return 0
+    batch_field = BATCH_FIELDS.get(command_name)
+    if batch_field:
+        return len((reply.get("cursor") or {}).get(batch_field) or [])
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    if command_name == "count":
+        return 1
+    if command_name == "distinct":
+        return len(reply.get("values") or [])
+    return 0
+
+
+class QueryCommandListener(monitoring.CommandListener):
+    """Records the MongoDB commands in the histograms and the stats of the current request."""
+
+    def __init__(self):
+        self.recorded: Optional[List[dict]] = None  # sent commands, see record_commands
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        recorded = self.recorded
+        if recorded is not None:
+            recorded.append(dict(event.command))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._record(event, returned_documents(event.command_name, event.reply))
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._record(event, 0)
+
+    def _record(self, event, documents: int):
+        duration = event.duration_micros / 1_000_000
+        command_duration.observe(duration, event.command_name)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.add(duration, documents)
+
+
+command_listener = QueryCommandListener()
+
+
+@contextlib.contextmanager
+def record_commands() -> Iterator[List[dict]]:
+    """Collects every command sent to MongoDB in the block (e.g. to explain the queries of the routers)."""
+    recorded = []
+    command_listener.recorded = recorded
+    try:
+        yield recorded
+    finally:
+        command_listener.recorded = None
+
+
+# ---- Middleware ----
+
+
+def route_label(scope: Scope) -> str:
+    """Returns the path template of the route serving a request (ids are not labels)."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Attributes the MongoDB commands to the requests and adds the Server-Timing header."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                # commands of a streamed body run after the headers are sent
+                total = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.duration * 1000:.2f};desc="{stats.commands} commands", total;dur={total:.2f}',
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_stats.reset(token)
+            labels = (scope["method"], route_label(scope))
+            request_duration.observe(time.perf_counter() - start, *labels)
+            request_db_commands.observe(stats.commands, *labels)
+            request_db_duration.observe(stats.duration, *labels)
+            request_db_documents.observe(stats.documents, *labels)
@@ -0,0 +1,18 @@
+import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class Stall(BaseModel):
+    """An event loop callback that ran longer than the stall threshold."""
+    started_at: datetime.datetime = Field(..., description="When the loop stopped responding")
+    duration_ms: Optional[float] = Field(None, description="How long the loop was blocked, None while it still is")
+    route: Optional[str] = Field(None, description="Method and route of the request running on the loop")
+    stack: List[str] = Field(default_factory=list, description="Stack of the loop thread while it was blocked, innermost last")
+
+
+class LoopMonitorStatus(BaseModel):
+    """State of the event loop monitor and the last stalls."""
+    enabled: bool = Field(..., description="Whether the monitor runs (CULTIVARE_LOOP_MONITOR)")
+    threshold_ms: float = Field(..., description="Callbacks running longer than this are recorded")
+    stalls: List[Stall] = Field(default_factory=list, description="Last stalls, most recent first")
@@ -0,0 +1,99 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+from app.models.culture import CultureCreate, CultureOut, CultureUpdate
+from app.models.note import NoteOut
+
+MAX_BULK_ITEMS = 1000
+
+SlugConflict = Literal["error", "suffix"]
+
+
+class BulkRequest(BaseModel):
+    """Shared properties of bulk requests."""
+    ordered: bool = Field(True, description="Stop at the first failing item (the remaining items are skipped) instead of processing every item")
+
+
+class BulkDelete(BulkRequest):
+    """Model for deleting many cultures or notes."""
+    ids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS, description="IDs to delete")
+
+
+class CultureBulkCreate(BulkRequest):
+    """Model for creating many cultures."""
+    items: List[CultureCreate] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+    on_slug_conflict: SlugConflict = Field("error", description="Fail items whose slug is taken, or number them (name-2, name-3, ...)")
+
+
+class CultureBulkUpdateItem(CultureUpdate):
+    """Model for updating one culture of a bulk update."""
+    id: str = Field(..., description="ID of the culture to update")
+
+
+class CultureBulkUpdate(BulkRequest):
+    """Model for updating many cultures."""
+    items: List[CultureBulkUpdateItem] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+    on_slug_conflict: SlugConflict = Field("error", description="Fail renamed items whose slug is taken, or number them (name-2, name-3, ...)")
+
+
+class NoteBulkCreateItem(BaseModel):
+    """Model for creating one note of a bulk create (attachments are uploaded with the single note endpoints)."""
+    culture_id: str = Field(..., description="Culture id of the culture this note is attached to")
+    text: Optional[str] = None
+    color: Optional[str] = None
+    tags: Optional[List[str]] = Field(default_factory=list)
+    favorite: Optional[bool] = False
+
+
+class NoteBulkCreate(BulkRequest):
+    """Model for creating many notes."""
+    items: List[NoteBulkCreateItem] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
+
+class NoteBulkUpdateItem(BaseModel):
+    """Model for updating one note of a bulk update."""
+    id: str = Field(..., description="ID of the note to update")
+    text: Optional[str] = None
+    favorite: Optional[bool] = None
+    color: Optional[str] = None
+    tags: Optional[List[str]] = None
+
+
+class NoteBulkUpdate(BulkRequest):
+    """Model for updating many notes."""
+    items: List[NoteBulkUpdateItem] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
+
+class BulkItemResult(BaseModel):
+    """Outcome of one item of a bulk request."""
+    index: int = Field(..., description="Position of the item in the request")
+    id: Optional[str] = Field(None, description="ID of the culture or note")
+    status: Literal["created", "updated", "deleted", "failed", "skipped"]
+    status_code: int = Field(..., description="Status code the single item endpoint would have returned")
+    detail: Optional[str] = Field(None, description="Why the item failed or was skipped")
+
+
+class CultureBulkItemResult(BulkItemResult):
+    """Outcome of one culture of a bulk request (response model)."""
+    culture: Optional[CultureOut] = Field(None, description="The created or updated culture")
+
+
+class NoteBulkItemResult(BulkItemResult):
+    """Outcome of one note of a bulk request (response model)."""
+    note: Optional[NoteOut] = Field(None, description="The created or updated note")
+
+
+class BulkResultBase(BaseModel):
+    """Counts of a bulk request."""
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+
+
+class CultureBulkResult(BulkResultBase):
+    """Result of a bulk culture request (response model)."""
+    items: List[CultureBulkItemResult]
+
+
+class NoteBulkResult(BulkResultBase):
+    """Result of a bulk note request (response model)."""
+    items: List[NoteBulkItemResult]
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field, field_validator, model_validator
 import datetime
 
@@ -11,6 +11,8 @@ class CultureBase(BaseModel):
     favorite: Optional[bool] = Field(default=False, description="Add culture to favorites")
     slug: Optional[str] = Field(None, description="Unique slug for the culture")
     parent_ids: Optional[List[str]] = Field(default_factory=list, description="IDs of the parent cultures")
+    ancestor_ids: Optional[List[str]] = Field(default_factory=list, description="IDs of all ancestor cultures (maintained by the server)")
+    generation: Optional[int] = Field(default=0, description="Generation of the culture, 0 for cultures without parents (maintained by the server)")
     tags: Optional[List[str]] = Field(default_factory=list, description="List of tags for the culture")
     source_id: Optional[str] = Field(None, description="ID of the source culture (for clones)")
     origin_date: Optional[datetime.datetime] = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc), description="Date the culture was started") 
@@ -55,6 +57,8 @@ class CultureCreate(CultureBase):
     """Model for creating a new culture."""
     id: str = Field(None, description="Unique id for the culture", exclude=True)  # Use custom string ID
     slug: Optional[str] = Field(default=None, exclude=True) 
+    ancestor_ids: Optional[List[str]] = Field(default_factory=list, exclude=True)
+    generation: Optional[int] = Field(default=0, exclude=True)
 
 
 class CultureOut(CultureBase):
@@ -66,4 +70,16 @@ class CultureSearch(BaseModel):
     """Model for returning a culture for search (response model)."""
     id: Optional[str] = Field(None, description="Unique id for the culture")
     name: str = Field(None, description="Unique name for the culture")
-    slug: Optional[str] = Field(default=None)
\ No newline at end of file
+    slug: Optional[str] = Field(default=None)
+
+
+class GenealogyNode(CultureOut):
+    """Model for returning a culture as a member of a genealogy (response model)."""
+    depth: int = Field(0, description="Number of generations between this culture and the requested one")
+    relation: Literal["self", "ancestor", "descendant"] = Field("self", description="Relation to the requested culture")
+
+
+class GenealogyTree(GenealogyNode):
+    """Model for returning a genealogy as a nested tree (response model)."""
+    parents: List["GenealogyTree"] = Field(default_factory=list, description="Ancestor branches of this culture")
+    children: List["GenealogyTree"] = Field(default_factory=list, description="Descendant branches of this culture")
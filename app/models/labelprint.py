@@ -0,0 +1,45 @@
+import datetime
+import uuid
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class PrintData(BaseModel):
+    """Content of a culture label."""
+    barcodeText: str
+    labelText: str
+    dateText: str
+    noteText: str | None = None  # Optional noteText
+    RestrictiveLabel: bool
+
+
+PrintJobStatus = Literal["queued", "printing", "done", "failed"]
+CutMode = Literal["each", "end"]
+MAX_BATCH_LABELS = 255  # the printer counts at most 255 labels between two cuts
+
+
+class PrintBatch(BaseModel):
+    """Labels printed together in a single printer transaction."""
+    labels: List[PrintData] = Field(..., min_length=1, max_length=MAX_BATCH_LABELS, description="Labels to print, in order")
+    cut: CutMode = Field("each", description="Cut after each label or once at the end of the batch")
+
+
+class PrintJob(BaseModel):
+    """Model for a print job processed by the background print queue."""
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex, description="Unique id for the print job")
+    status: PrintJobStatus = Field("queued", description="queued, printing, done or failed")
+    printer: Optional[str] = Field(None, description="Address of the printer the job is sent to")
+    labels: List[PrintData] = Field(..., description="Labels printed by the job")
+    cut: CutMode = Field("each", description="Cut after each label or once at the end of the job")
+    attempts: int = Field(0, description="Number of print attempts so far")
+    error: Optional[str] = Field(None, description="Error of the last failed attempt")
+    created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+    updated_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+    finished_at: Optional[datetime.datetime] = Field(None, description="When the job was printed or finally failed")
+    worker: Optional[str] = Field(None, description="Process printing the job")
+    lease_expires_at: Optional[datetime.datetime] = Field(None, description="When another process may take over the printing job")
+
+
+class PrintJobOut(PrintJob):
+    """Model for returning a print job (response model)."""
+    pass
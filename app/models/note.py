@@ -1,5 +1,5 @@
 import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -12,6 +12,9 @@ class NoteBase(BaseModel):
     text: Optional[str] = Field(None, description="Text content of the note")
     color: Optional[str] = Field(None, description="Filename of the attachment")
     image_filename: Optional[str] = Field(None, description="Filename of the attachment")
+    image_sha256: Optional[str] = Field(None, description="SHA-256 hex digest of the attachment")
+    image_size: Optional[int] = Field(None, description="Size of the attachment in bytes")
+    image_derivatives: Optional[Dict[str, str]] = Field(None, description="Filenames of the webp derivatives of the attachment (thumb, medium, original)")
     updated_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
     created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
 
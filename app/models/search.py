@@ -0,0 +1,35 @@
+from typing import Annotated, List, Literal, Optional, Union
+from pydantic import BaseModel, Field
+from app.models.culture import CultureOut, CultureSearch
+from app.models.note import NoteOut
+
+
+class CultureHit(BaseModel):
+    """Culture matching a global search (response model)."""
+    type: Literal["culture"] = "culture"
+    score: float = Field(..., description="Text search relevance score")
+    culture: CultureOut
+
+
+class NoteHit(BaseModel):
+    """Note matching a global search, with the culture it is attached to (response model)."""
+    type: Literal["note"] = "note"
+    score: float = Field(..., description="Text search relevance score")
+    note: NoteOut
+    culture: Optional[CultureSearch] = Field(None, description="Culture the note is attached to")
+
+
+SearchHit = Annotated[Union[CultureHit, NoteHit], Field(discriminator="type")]
+
+
+class SearchFacets(BaseModel):
+    """Number of matches per collection."""
+    cultures: int = 0
+    notes: int = 0
+
+
+class SearchResults(BaseModel):
+    """Page of global search results, best matches first (response model)."""
+    items: List[SearchHit] = Field(default_factory=list)
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page, None on the last page")
+    facets: SearchFacets = Field(default_factory=SearchFacets)
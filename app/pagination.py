@@ -0,0 +1,210 @@
+"""
+Keyset pagination and NDJSON streaming for list endpoints.
+
+Pages are ordered by `(created_at, id)` and continued with an opaque cursor
+token returned in the `X-Next-Cursor` response header, so fetching page N
+never has to skip over the documents of pages 1..N-1.
+
+Streamed (NDJSON) pages start before the end of the page is known, so their
+cursor comes last instead: when a streamed page stops at its limit with more
+documents left, its last line is `{"next_cursor": "<token>"}` rather than a
+document. A stream without that line is complete.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+from typing import Hashable, Iterable, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.cache import read_cache
+from app.conditional import collection_validators, is_not_modified
+from app.serialization import dump_documents, encode_json, fast_response, output_projection
+
+PAGE_SORT = [("created_at", 1), ("id", 1)]
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_FIELD = "next_cursor"  # last line of a streamed page followed by more documents
+
+
+# ---- Cursor tokens ----
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def _decode_value(value: dict):
+    if set(value) == {"$date"}:
+        return datetime.datetime.fromisoformat(value["$date"])
+    return value
+
+
+def encode_cursor(values: list) -> str:
+    """Encodes a list of sort key values into an opaque url-safe token."""
+    payload = json.dumps(values, default=_encode_value, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> list:
+    """Decodes a token created by encode_cursor."""
+    try:
+        payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(payload, object_hook=_decode_value)
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: {e}"
+        )
+    if not isinstance(values, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    return values
+
+
+# ---- Keyset queries ----
+
+
+def page_cursor(document: dict) -> str:
+    """Returns the cursor pointing right after the given document."""
+    return encode_cursor([document.get("created_at"), document["id"]])
+
+
+def keyset_filter(query: dict, cursor: Optional[str]) -> dict:
+    """Restricts a query to the documents following the cursor in (created_at, id) order."""
+    if not cursor:
+        return query
+
+    values = decode_cursor(cursor)
+    # the values go into the query, anything but (created_at, id) could inject operators
+    if (
+        len(values) != 2
+        or not (values[0] is None or isinstance(values[0], datetime.datetime))
+        or not isinstance(values[1], str)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    created_at, id = values
+    after = {
+        "$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "id": {"$gt": id}},
+        ]
+    }
+    return {"$and": [query, after]} if query else after
+
+
+def find_page(collection, query: dict, cursor: Optional[str], limit: Optional[int], projection=None):
+    """
+    Returns a Motor cursor over one page of a collection.
+
+    Without `cursor` and `limit` the whole result is returned in natural order,
+    as the list endpoints always did. Otherwise documents are sorted by
+    (created_at, id) and one extra document is requested to detect a next page.
+    """
+    documents = collection.find(keyset_filter(query, cursor), projection)
+    if cursor or limit:
+        documents = documents.sort(PAGE_SORT)
+    if limit:
+        documents = documents.limit(limit + 1)
+    return documents
+
+
+async def read_page(documents, limit: Optional[int]) -> Tuple[List[dict], Optional[str]]:
+    """Reads a page opened with find_page and returns its documents and the next cursor."""
+    items = await documents.to_list(length=None)
+    if limit and len(items) > limit:
+        del items[limit:]
+        return items, page_cursor(items[-1])
+    return items, None
+
+
+# ---- Responses ----
+
+
+def ndjson_response(
+    documents,
+    model: Type[BaseModel],
+    limit: Optional[int] = None,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> StreamingResponse:
+    """
+    Streams documents from a Motor cursor as newline-delimited JSON while they arrive.
+
+    When the cursor holds more than `limit` documents (find_page reads one extra),
+    the stream ends with a `{"next_cursor": ...}` line continuing after the last document.
+    """
+
+    async def lines():
+        count = 0
+        last = None
+        async for document in documents:
+            if limit and count >= limit:
+                yield encode_json({NEXT_CURSOR_FIELD: page_cursor(last)}) + b"\n"
+                break
+            count += 1
+            last = document
+            yield encode_json(dump_documents((document,), model, fields)[0]) + b"\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def list_response(
+    collection,
+    query: dict,
+    model: Type[BaseModel],
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    stream: bool = False,
+    fields: Optional[Tuple[str, ...]] = None,
+    cache_key: Optional[Hashable] = None,
+    cache_tags: Iterable[str] = (),
+    request: Optional[Request] = None,
+):
+    """
+    Runs a list query for an endpoint.
+
+    Returns a streaming NDJSON response when `stream` is set (the next page cursor is
+    its last line, see ndjson_response), otherwise the JSON array of the documents of
+    the page; the next page cursor is set in the X-Next-Cursor header.
+    Only the fields of the response model (or the requested `fields`) are read from
+    MongoDB, and documents are encoded directly (see app.serialization).
+    With a `cache_key`, pages of all fields are served from the read cache, tagged
+    with `cache_tags`. With the `request`, the page gets an aggregate ETag and
+    304 Not Modified is answered when the client's copy is current.
+    """
+    projection = output_projection(model, fields)
+    projection.update(id=1, created_at=1, updated_at=1)  # page cursor, version
+
+    if stream:
+        return ndjson_response(
+            find_page(collection, query, cursor, limit, projection), model, limit, fields
+        )
+
+    if cache_key is not None and not fields:
+        items, next_cursor = await read_cache.get_or_load(
+            (cache_key, cursor, limit),
+            lambda: read_page(find_page(collection, query, cursor, limit, projection), limit),
+            lambda page: cache_tags,
+        )
+    else:
+        items, next_cursor = await read_page(
+            find_page(collection, query, cursor, limit, projection), limit
+        )
+
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    if request is not None:
+        validators = collection_validators(items)
+        headers.update(validators)
+        if is_not_modified(request, validators, use_last_modified=False):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return fast_response(items, model, fields, headers or None)
@@ -0,0 +1,89 @@
+"""
+Field projection (`fields=`) for read endpoints.
+
+The requested fields become a MongoDB projection and a lightweight response
+model containing only these fields, so unused fields are neither transferred
+from the database nor validated and serialized.
+"""
+
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel, Field, TypeAdapter, create_model
+
+ALWAYS_INCLUDED_FIELDS = ("id",)
+FIELDS_DESCRIPTION = "Comma separated list of fields to return (e.g. name,tags,created_at)"
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """
+    Parses the `fields` query parameter.
+
+    Returns:
+        The requested field names (always including the id), or None when all fields are requested.
+    """
+    if not fields:
+        return None
+
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in model.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed fields: {', '.join(model.model_fields)}",
+        )
+    return tuple(dict.fromkeys([*ALWAYS_INCLUDED_FIELDS, *names]))
+
+
+def mongo_projection(fields: Iterable[str], prefix: str = "") -> dict:
+    """Builds a MongoDB projection including the given fields (optionally of an embedded array)."""
+    projection = {} if prefix else {"_id": 0}
+    for name in fields:
+        projection[f"{prefix}{name}"] = 1
+    return projection
+
+
+@lru_cache(maxsize=256)
+def partial_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """Builds a response model with only the given fields of `model` (all optional)."""
+    definitions = {
+        name: (
+            Optional[model.model_fields[name].annotation],
+            Field(None, description=model.model_fields[name].description),
+        )
+        for name in fields
+    }
+    return create_model(f"{model.__name__}Fields", **definitions)
+
+
+@lru_cache(maxsize=256)
+def partial_tree_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """Builds a nested genealogy response model with only the given fields of `model`."""
+    name = f"{model.__name__}FieldsTree"
+    return create_model(
+        name,
+        __base__=partial_model(model, fields),
+        parents=(List[name], Field(default_factory=list)),
+        children=(List[name], Field(default_factory=list)),
+    )
+
+
+@lru_cache(maxsize=256)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def projected_response(content, model: Type[BaseModel], headers: Optional[dict] = None) -> Response:
+    """
+    Serializes a document (or a list of documents) with a partial model.
+
+    The response is returned directly, bypassing the endpoint's full response model.
+    """
+    if isinstance(content, list):
+        adapter = _list_adapter(model)
+        body = adapter.dump_json(adapter.validate_python(content))
+    else:
+        body = model.model_validate(content).model_dump_json()
+    return Response(content=body, media_type="application/json", headers=headers)
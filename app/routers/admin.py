@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+import asyncio
+import threading
+from app.loop_monitor import loop_monitor, profile_lock, sample_profile
+from app.models.admin import LoopMonitorStatus
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+)
+
+
+# ---- API Endpoints ----
+
+
+@router.get("/stalls", response_model=LoopMonitorStatus)
+async def list_stalls():
+    """Lists the last event loop stalls recorded by the loop monitor."""
+    return LoopMonitorStatus(
+        enabled=loop_monitor.running,
+        threshold_ms=loop_monitor.threshold * 1000,
+        stalls=list(reversed(loop_monitor.stalls)),
+    )
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(5, gt=0, le=60, description="Duration of the profile"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Time between two stack samples"),
+    loop_only: bool = Query(False, description="Only sample the event loop thread"),
+):
+    """
+    Samples the stacks of the live process and returns them as folded stacks.
+
+    The output can be rendered with flamegraph.pl or loaded into speedscope.
+    Only one profile runs at a time, sampling stops when the client disconnects.
+    """
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running")
+    thread_ids = [threading.get_ident()] if loop_only else None  # handlers run on the loop thread
+    stop = threading.Event()
+    result = {}
+
+    def run():
+        # the sampling thread holds the lock until it ends, even if the request is cancelled first
+        try:
+            result["profile"] = sample_profile(seconds, interval_ms / 1000, thread_ids, stop)
+        finally:
+            profile_lock.release()
+
+    thread = threading.Thread(target=run, name="profile", daemon=True)
+    try:
+        thread.start()
+    except RuntimeError:
+        profile_lock.release()
+        raise
+    try:
+        await asyncio.to_thread(thread.join)
+    finally:
+        stop.set()  # cancelled (client gone): end the sampling early
+    return result["profile"]
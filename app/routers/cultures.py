@@ -1,18 +1,52 @@
 from fastapi import (
     APIRouter,
     HTTPException,
+    Request,
+    Response,
     status,
     Query,
 )
 from app.database import db
+from app.cache import culture_change_tags, culture_tags, read_cache
+from app.conditional import collection_validators, conditional_response, document_validators
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, list_response
+from app.projection import (
+    FIELDS_DESCRIPTION,
+    mongo_projection,
+    parse_fields,
+    partial_tree_model,
+    projected_response,
+)
+from app.serialization import fast_response, output_projection
 from app.config import settings
-from typing import List, Optional, Set
+from typing import Dict, List, Literal, Optional, Tuple, Union
 import datetime
-from app.models.culture import CultureCreate, CultureUpdate, CultureOut, CultureSearch
+import re
+from app.models.culture import (
+    CultureCreate,
+    CultureUpdate,
+    CultureOut,
+    CultureSearch,
+    GenealogyNode,
+    GenealogyTree,
+)
+from app.models.bulk import BulkDelete, CultureBulkCreate, CultureBulkResult, CultureBulkUpdate
 import random
 import string
 from slugify import slugify
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
 from pymongo.errors import DuplicateKeyError
+from app.service.lineage import (
+    cascade_lineage,
+    cascade_lineages,
+    compute_lineage,
+    get_lineages,
+    get_subtree_lineages,
+    move_culture,
+)
+from app.service.bulk import BulkReport, run_writes
+from app.service.statistics import record_change, record_changes
+from app.service.name_search import is_valid_cursor, name_tokens, search_cultures_by_name, search_key
 
 router = APIRouter(
     prefix="/cultures",
@@ -33,6 +67,80 @@ def generate_slug_from_name(name):
     return slugify(name)
 
 
+async def get_lineage_for_parents(id: str, parent_ids: List[str]) -> dict:
+    """Checks that the parent cultures exist and computes the lineage of a culture with these parents."""
+    parents = await get_lineages(parent_ids)
+
+    error = check_parents(id, parent_ids, parents)
+    if error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+    return compute_lineage(id, parent_ids, parents)
+
+
+async def resolve_slugs(
+    report: BulkReport, slugs: Dict[int, Tuple[str, str]], on_conflict: str
+) -> Dict[int, str]:
+    """
+    Assigns unique slugs to the items of a bulk request with one query.
+
+    Args:
+        report: The report of the bulk request, conflicting items are failed in "error" mode.
+        slugs: (culture ID, wanted slug) keyed by item index.
+        on_conflict: "error" to fail items whose slug is taken (by a culture or an
+                     earlier item), "suffix" to number them (name-2, name-3, ...).
+
+    Returns:
+        The assigned slug keyed by item index.
+    """
+    if not slugs:
+        return {}
+
+    wanted = {slug for _, slug in slugs.values()}
+    if on_conflict == "suffix":
+        query = {
+            "$or": [{"slug": {"$regex": f"^{re.escape(slug)}(-[0-9]+)?$"}} for slug in wanted]
+        }
+    else:
+        query = {"slug": {"$in": list(wanted)}}
+    owners = {
+        culture["slug"]: culture["id"]
+        async for culture in db.cultures_collection.find(query, {"_id": 0, "id": 1, "slug": 1})
+    }
+
+    resolved = {}
+    for index, (id, slug) in sorted(slugs.items()):
+        owner = owners.get(slug)
+        if owner is not None and owner != id:
+            if on_conflict != "suffix":
+                report.fail(
+                    index,
+                    status.HTTP_409_CONFLICT,
+                    f"Duplicate slug {slug}: Enter different name.",
+                    id=id,
+                )
+                continue
+            number = 2
+            while owners.get(f"{slug}-{number}") not in (None, id):
+                number += 1
+            slug = f"{slug}-{number}"
+        owners[slug] = id
+        resolved[index] = slug
+    return resolved
+
+
+def check_parents(id: str, parent_ids: List[str], lineages: Dict[str, dict]) -> Optional[str]:
+    """Returns why a culture cannot have these parents, None if it can."""
+    missing_ids = [parent_id for parent_id in parent_ids if parent_id not in lineages]
+    if missing_ids:
+        return f"Parent cultures not found: {', '.join(missing_ids)}"
+    if id in parent_ids or any(
+        id in (lineages[parent_id].get("ancestor_ids") or []) for parent_id in parent_ids
+    ):
+        return "A culture cannot be its own ancestor"
+    return None
+
+
 # ---- API Endpoints ----
 
 
@@ -41,12 +149,14 @@ async def create_culture(culture: CultureCreate):
     """Create a new culture record."""
 
     culture_dict = culture.model_dump(
-        by_alias=True, exclude=["id", "slug"]
+        by_alias=True, exclude=["id", "slug", "ancestor_ids", "generation"]
     )  # user cannot set manually these fields
     culture_dict["id"] = generate_hex_id()  # set uniq id
     culture_dict["slug"] = generate_slug_from_name(culture_dict["name"])
-
-    # TODO check if parent exists
+    culture_dict["name_tokens"] = name_tokens(culture_dict["name"])
+    culture_dict.update(
+        await get_lineage_for_parents(culture_dict["id"], culture_dict["parent_ids"] or [])
+    )
 
     # Add updated_at timestamp to the update
     current_utc_time = datetime.datetime.now(datetime.timezone.utc)
@@ -64,41 +174,68 @@ async def create_culture(culture: CultureCreate):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
         )
 
+    await read_cache.invalidate(culture_change_tags(after=culture_dict))
+    await record_change("cultures", after=culture_dict)
     return culture_dict
 
 
 @router.get("/", response_model=List[CultureOut])
-async def list_cultures(favorite: Optional[bool] = None):
+async def list_cultures(
+    request: Request,
+    response: Response,
+    favorite: Optional[bool] = None,
+    generation: Optional[int] = None,
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size, enables keyset pagination"),
+    stream: bool = Query(False, description='Stream cultures as NDJSON, with a limit the last line is {"next_cursor": ...} when more follow'),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
     """Retrieve a list of all cultures.
 
     Args:
         favorite (Optional[bool], optional): Filter by favorite status. Defaults to None.
+        generation (Optional[int], optional): Filter by generation. Defaults to None.
+        cursor (Optional[str], optional): Continue after the previous page. Defaults to None.
+        limit (Optional[int], optional): Maximum number of cultures per page. Defaults to None (all).
+        stream (bool, optional): Stream the cultures as NDJSON (last line {"next_cursor": ...} when the limit cuts it). Defaults to False.
+        fields (Optional[str], optional): Comma separated fields to return. Defaults to None (all).
     """
 
-    cultures = []
+    query = {}
     if favorite is not None:
         # Filter by favorite status
-        async for culture in db.cultures_collection.find({"favorite": favorite}):
-            cultures.append(culture)
-    else:
-        # Retrieve all cultures
-        async for culture in db.cultures_collection.find():
-            cultures.append(culture)
-
-    return cultures
+        query["favorite"] = favorite
+    if generation is not None:
+        query["generation"] = generation
+
+    return await list_response(
+        db.cultures_collection,
+        query,
+        CultureOut,
+        response,
+        cursor,
+        limit,
+        stream,
+        parse_fields(fields, CultureOut),
+        request=request,
+    )
 
 
 @router.get("/search", response_model=List[CultureSearch])
 async def get_culture_search(
+    response: Response,
     culture_name: str = Query(
         None, description="Partial string to search for in the name field"
     ),
     parent_ids: List[str] = Query(None, description="List of parent IDs to retrieve"),
-    skip: int = Query(0, description="Number of items to skip", ge=0),
-    limit: int = Query(20, description="Maximum number of items to return", le=100),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    limit: int = Query(20, description="Maximum number of items to return", ge=1, le=100),
 ):
     """
     Search for cultures by partial matching of the name field or retrieve cultures by a list of IDs.
+
+    Name matches are ranked: exact name first, then names starting with the query,
+    then names containing words starting with the query words.
     """
 
     if parent_ids:
@@ -121,21 +258,24 @@ async def get_culture_search(
         return results
 
     elif culture_name:
-        # Search by culture name
-        query = {"name": {"$regex": culture_name, "$options": "i"}}
-        results = []
-        async for culture in db.cultures_collection.find(query).skip(skip).limit(limit):
-            results.append(
-                CultureSearch(
-                    id=str(culture["id"]), name=culture["name"], slug=culture["slug"]
-                )
+        # Search by normalized culture name
+        key = search_key(culture_name)
+        cursor_values = decode_cursor(cursor) if cursor else None
+        if cursor_values is not None and not is_valid_cursor(cursor_values):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
             )
+        cultures, next_cursor = [], None
+        if key:
+            cultures, next_cursor = await search_cultures_by_name(key, cursor_values, limit)
 
-        if not results:
+        if not cultures:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="No results found"
             )
-        return results
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(next_cursor)
+        return cultures
 
     else:
         raise HTTPException(
@@ -144,17 +284,208 @@ async def get_culture_search(
         )
 
 
+@router.post("/bulk", response_model=CultureBulkResult)
+async def create_cultures(bulk: CultureBulkCreate):
+    """Create many cultures with a single insert_many.
+
+    Every item gets its own result. In ordered mode the first failing item stops
+    the batch, otherwise all valid items are created.
+    """
+
+    report = BulkReport(len(bulk.items), bulk.ordered)
+    parents = await get_lineages(
+        {parent_id for culture in bulk.items for parent_id in culture.parent_ids or []}
+    )
+    current_utc_time = datetime.datetime.now(datetime.timezone.utc)
+
+    documents = {}
+    for index, culture in enumerate(bulk.items):
+        culture_dict = culture.model_dump(
+            by_alias=True, exclude=["id", "slug", "ancestor_ids", "generation"]
+        )
+        culture_dict["id"] = generate_hex_id()
+        error = check_parents(culture_dict["id"], culture_dict["parent_ids"] or [], parents)
+        if error:
+            report.fail(index, status.HTTP_400_BAD_REQUEST, error)
+            continue
+
+        culture_dict["slug"] = generate_slug_from_name(culture_dict["name"])
+        culture_dict["name_tokens"] = name_tokens(culture_dict["name"])
+        culture_dict.update(
+            compute_lineage(culture_dict["id"], culture_dict["parent_ids"], parents)
+        )
+        culture_dict["updated_at"] = current_utc_time
+        culture_dict["created_at"] = current_utc_time
+        documents[index] = culture_dict
+
+    slugs = await resolve_slugs(
+        report,
+        {index: (culture["id"], culture["slug"]) for index, culture in documents.items()},
+        bulk.on_slug_conflict,
+    )
+    pending = report.pending()
+    for index in pending:
+        documents[index]["slug"] = slugs[index]
+
+    written = await run_writes(
+        report,
+        pending,
+        lambda: db.cultures_collection.insert_many(
+            [documents[index] for index in pending], ordered=bulk.ordered
+        ),
+    )
+    for index in written:
+        culture = documents[index]
+        report.succeed(index, "created", status.HTTP_201_CREATED, culture["id"], culture=culture)
+
+    changes = [(None, documents[index]) for index in written]
+    await read_cache.invalidate(set().union(*(culture_change_tags(*change) for change in changes)))
+    await record_changes("cultures", changes)
+    return report.response()
+
+
+@router.put("/bulk", response_model=CultureBulkResult)
+async def update_cultures(bulk: CultureBulkUpdate):
+    """Update many cultures with a single bulk_write.
+
+    Every item carries the ID of the culture and the fields to change. In ordered
+    mode the first failing item stops the batch, otherwise all valid items are updated.
+    """
+
+    report = BulkReport(len(bulk.items), bulk.ordered)
+    ids = [item.id for item in bulk.items]
+    existing = {
+        culture["id"]: culture
+        async for culture in db.cultures_collection.find({"id": {"$in": ids}})
+    }
+    current_utc_time = datetime.datetime.now(datetime.timezone.utc)
+
+    updates = {}
+    seen_ids = set()
+    for index, item in enumerate(bulk.items):
+        if item.id not in existing:
+            report.fail(index, status.HTTP_404_NOT_FOUND, f"Culture with id {item.id} not found", id=item.id)
+            continue
+        if item.id in seen_ids:
+            report.fail(index, status.HTTP_400_BAD_REQUEST, f"Culture with id {item.id} is updated twice", id=item.id)
+            continue
+        seen_ids.add(item.id)
+
+        update = item.model_dump(exclude_unset=True, exclude={"id"})
+        if update.get("name"):
+            update["slug"] = generate_slug_from_name(update["name"])
+            update["name_tokens"] = name_tokens(update["name"])
+        update["updated_at"] = current_utc_time
+        updates[index] = update
+
+    slugs = await resolve_slugs(
+        report,
+        {index: (ids[index], update["slug"]) for index, update in updates.items() if "slug" in update},
+        bulk.on_slug_conflict,
+    )
+    for index in report.pending():
+        if index in slugs:
+            updates[index]["slug"] = slugs[index]
+
+    # parents are checked and lineages computed in item order against the moves
+    # of the earlier items, so a batch cannot create a cycle (A under B, B under A)
+    moved = [index for index in report.pending() if updates[index].get("parent_ids") is not None]
+    lineages = {}
+    if moved:
+        lineages = await get_subtree_lineages(
+            [ids[index] for index in moved],
+            {parent_id for index in moved for parent_id in updates[index]["parent_ids"]},
+        )
+    for index in moved:
+        if report.stopped_at is not None and index > report.stopped_at:
+            break
+        error = check_parents(ids[index], updates[index]["parent_ids"], lineages)
+        if error:
+            report.fail(index, status.HTTP_400_BAD_REQUEST, error, id=ids[index])
+            continue
+        updates[index].update(move_culture(ids[index], updates[index]["parent_ids"], lineages))
+
+    pending = report.pending()
+
+    written = await run_writes(
+        report,
+        pending,
+        lambda: db.cultures_collection.bulk_write(
+            [UpdateOne({"id": ids[index]}, {"$set": updates[index]}) for index in pending],
+            ordered=bulk.ordered,
+        ),
+    )
+    changes = {index: (existing[ids[index]], {**existing[ids[index]], **updates[index]}) for index in written}
+
+    # re-parenting moves whole subtrees, all at once; a culture moved before one
+    # of its ancestors in the batch gets its final lineage from the later move
+    reparented = [after for index, (_, after) in changes.items() if "parent_ids" in updates[index]]
+    for culture in reparented:
+        lineage = lineages[culture["id"]]
+        culture.update(ancestor_ids=lineage["ancestor_ids"], generation=lineage["generation"])
+    await cascade_lineages(
+        {
+            culture["id"]: {"ancestor_ids": culture["ancestor_ids"], "generation": culture["generation"]}
+            for culture in reparented
+        }
+    )
+
+    for index, (_, culture) in changes.items():
+        report.succeed(index, "updated", status.HTTP_200_OK, culture["id"], culture=culture)
+
+    await read_cache.invalidate(set().union(*(culture_change_tags(*change) for change in changes.values())))
+    await record_changes("cultures", changes.values())
+    return report.response()
+
+
+@router.post("/bulk/delete", response_model=CultureBulkResult)
+async def delete_cultures(bulk: BulkDelete):
+    """Delete many cultures with a single bulk_write."""
+
+    report = BulkReport(len(bulk.ids), bulk.ordered)
+    existing = {
+        culture["id"]: culture
+        async for culture in db.cultures_collection.find({"id": {"$in": bulk.ids}})
+    }
+
+    seen_ids = set()
+    for index, id in enumerate(bulk.ids):
+        if id not in existing or id in seen_ids:
+            report.fail(index, status.HTTP_404_NOT_FOUND, f"Culture with id {id} not found", id=id)
+        seen_ids.add(id)
+
+    pending = report.pending()
+    written = await run_writes(
+        report,
+        pending,
+        lambda: db.cultures_collection.bulk_write(
+            [DeleteOne({"id": bulk.ids[index]}) for index in pending], ordered=bulk.ordered
+        ),
+    )
+    # the deleted cultures leave the lineage of their subtrees
+    await cascade_lineages({bulk.ids[index]: None for index in written})
+    for index in written:
+        report.succeed(index, "deleted", status.HTTP_204_NO_CONTENT, bulk.ids[index])
+
+    changes = [(existing[bulk.ids[index]], None) for index in written]
+    await read_cache.invalidate(set().union(*(culture_change_tags(*change) for change in changes)))
+    await record_changes("cultures", changes)
+    return report.response()
+
+
 @router.get("/{id}", response_model=CultureOut)
-async def get_culture(id: str):
+async def get_culture(id: str, request: Request, response: Response):
     """Retrieve a culture by its ID."""
 
-    culture = await db.cultures_collection.find_one({"id": id})
+    culture = await read_cache.get_or_load(
+        ("culture", id), lambda: db.cultures_collection.find_one({"id": id}), culture_tags
+    )
     if culture is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Culture with id {id} not found",
         )
-    return culture
+    return conditional_response(request, response, document_validators(culture)) or culture
 
 
 @router.put("/{id}", response_model=CultureOut)
@@ -170,20 +501,36 @@ async def update_culture(id: str, culture_update: CultureUpdate):
         culture_update_dict["slug"] = generate_slug_from_name(
             culture_update_dict["name"]
         )
+        culture_update_dict["name_tokens"] = name_tokens(culture_update_dict["name"])
 
-    # TODO check if parent exists
+    # if user changed parents - recompute ancestors and generation
+    lineage = None
+    if culture_update_dict.get("parent_ids") is not None:
+        lineage = await get_lineage_for_parents(id, culture_update_dict["parent_ids"])
+        culture_update_dict.update(lineage)
 
     # Add updated_at timestamp to the update
     culture_update_dict["updated_at"] = datetime.datetime.now(datetime.timezone.utc)
 
-    result = await db.cultures_collection.update_one({"id": id}, {"$set": culture_update_dict})
-    if result.modified_count == 0:
+    # previous version is needed for the stats deltas, the new one is derived from it
+    culture = await db.cultures_collection.find_one_and_update(
+        {"id": id},
+        {"$set": culture_update_dict},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if culture is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Culture with id {id} not found",
         )
+    updated_culture = {**culture, **culture_update_dict}
 
-    updated_culture = await db.cultures_collection.find_one({"id": id})
+    # re-parenting moves the whole subtree
+    if lineage is not None:
+        await cascade_lineage(id, lineage)
+
+    await read_cache.invalidate(culture_change_tags(culture, updated_culture))
+    await record_change("cultures", before=culture, after=updated_culture)
     return updated_culture
 
 
@@ -191,90 +538,219 @@ async def update_culture(id: str, culture_update: CultureUpdate):
 async def delete_culture(id: str):
     """Delete a culture by its ID."""
 
-    delete_result = await db.cultures_collection.delete_one({"id": id})
-    if delete_result.deleted_count == 0:
+    culture = await db.cultures_collection.find_one_and_delete({"id": id})
+    if culture is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Culture with id {id} not found",
+        )
+
+    # the deleted culture leaves the lineage of its subtree
+    await cascade_lineage(id, None)
+
+    await read_cache.invalidate(culture_change_tags(before=culture))
+    await record_change("cultures", before=culture)
+
+
+@router.get("/{id}/descendants", response_model=List[CultureOut])
+async def list_descendants(
+    id: str,
+    request: Request,
+    response: Response,
+    generation: Optional[int] = Query(None, ge=0, description="Only return descendants of this generation"),
+):
+    """Retrieve the whole subtree of a culture with a single indexed query."""
+
+    query = {"ancestor_ids": id}
+    if generation is not None:
+        query["generation"] = generation
+
+    cursor = db.cultures_collection.find(query, output_projection(CultureOut)).sort("generation", 1)
+    cultures = await cursor.to_list(length=None)
+    validators = collection_validators(cultures)
+    return conditional_response(
+        request, response, validators, use_last_modified=False
+    ) or fast_response(cultures, CultureOut, headers=validators)
+
+
+@router.get("/{id}/lineage", response_model=List[CultureOut])
+async def list_lineage(id: str, request: Request, response: Response):
+    """Retrieve all ancestors of a culture, oldest generation first."""
+
+    culture = await db.cultures_collection.find_one({"id": id}, {"ancestor_ids": 1})
+    if culture is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Culture with id {id} not found",
         )
 
+    query = {"id": {"$in": culture.get("ancestor_ids") or []}}
+    cursor = db.cultures_collection.find(query, output_projection(CultureOut)).sort("generation", 1)
+    cultures = await cursor.to_list(length=None)
+    validators = collection_validators(cultures)
+    return conditional_response(
+        request, response, validators, use_last_modified=False
+    ) or fast_response(cultures, CultureOut, headers=validators)
+
 
 ## Genealogy ###########################
+GENEALOGY_MAX_DEPTH = 32
+
+
+GENEALOGY_FIELDS = ("id", "name", "parent_ids", "ancestor_ids", "updated_at")  # needed to order, nest, cache and version the genealogy
+
+
+def genealogy_pipeline(id: str, depth_limit: int, fields: Optional[Tuple[str, ...]] = None) -> List[dict]:
+    """
+    Builds an aggregation pipeline collecting the ancestors and descendants of a culture.
+
+    Both directions are resolved server-side with $graphLookup, so the whole genealogy
+    is fetched in a single round trip regardless of the number of related cultures.
+    When `fields` is given, every culture is projected down to these fields.
+    """
+    max_depth = depth_limit - 1  # $graphLookup counts direct parents/children as depth 0
+    pipeline = [
+        {"$match": {"id": id}},
+        {
+            "$graphLookup": {
+                "from": settings.CULTURES_COLLECTION_NAME,
+                "startWith": "$parent_ids",
+                "connectFromField": "parent_ids",
+                "connectToField": "id",
+                "as": "ancestors",
+                "maxDepth": max_depth,
+                "depthField": "depth",
+            }
+        },
+        {
+            "$graphLookup": {
+                "from": settings.CULTURES_COLLECTION_NAME,
+                "startWith": "$id",
+                "connectFromField": "id",
+                "connectToField": "parent_ids",
+                "as": "descendants",
+                "maxDepth": max_depth,
+                "depthField": "depth",
+            }
+        },
+    ]
+    if fields:
+        fields = tuple(dict.fromkeys([*fields, *GENEALOGY_FIELDS]))
+        related_fields = (*fields, "depth")
+        pipeline.append(
+            {
+                "$project": {
+                    **mongo_projection(fields),
+                    **mongo_projection(related_fields, prefix="ancestors."),
+                    **mongo_projection(related_fields, prefix="descendants."),
+                }
+            }
+        )
+    return pipeline
+
+
 async def get_related_cultures(
-    id: str,
-    processed_ids: Set[str] = None,
-    depth_limit: int = 1,
-    current_depth: int = 0,
+    id: str, depth_limit: int = 1, fields: Optional[Tuple[str, ...]] = None
 ) -> List[dict]:
     """
-    Recursively retrieves related cultures (ancestors and descendants) for a given culture_id.
+    Retrieves related cultures (ancestors and descendants) for a given culture id.
 
     Args:
         id: The ID of the culture to start the search from.
-        processed_ids: A set of culture IDs that have already been processed to avoid infinite loops.
-        depth_limit: The maximum depth of recursion.
-        depth: The current depth of recursion.
+        depth_limit: The maximum number of generations to follow in each direction.
+        fields: Culture fields to read, all fields when None.
 
     Returns:
-        A list of culture dictionaries.
+        A deduplicated list of culture dictionaries, starting with the requested culture.
+        Every culture carries its `depth` (generations away from the requested culture)
+        and `relation` ("self", "ancestor" or "descendant").
     """
-    if processed_ids is None:
-        processed_ids = set()
-
-    if current_depth > depth_limit:
+    result = await db.cultures_collection.aggregate(
+        genealogy_pipeline(id, depth_limit, fields)
+    ).to_list(length=1)
+    if not result:
         return []
 
-    culture = await db.cultures_collection.find_one({"id": id})
-    if not culture:
-        return []
+    culture = result[0]
+    ancestors = culture.pop("ancestors")
+    descendants = culture.pop("descendants")
+    culture.update(depth=0, relation="self")
 
-    if id in processed_ids:
-        return []
-
-    processed_ids.add(id)
     tree = [culture]
+    seen_ids = {culture["id"]}
+    for relation, related in (("ancestor", ancestors), ("descendant", descendants)):
+        for related_culture in sorted(related, key=lambda c: (c["depth"], c["name"] or "")):
+            if related_culture["id"] in seen_ids:  # cycles in parent_ids
+                continue
+            seen_ids.add(related_culture["id"])
+            related_culture.update(depth=related_culture["depth"] + 1, relation=relation)
+            tree.append(related_culture)
 
-    next_depth = current_depth + 1
+    return tree
 
-    if next_depth > depth_limit:
-        return tree
 
-    # Find parent cultures
-    if "parent_ids" in culture and culture["parent_ids"]:
-        for parent_id in culture["parent_ids"]:
-            parent_culture = await db.cultures_collection.find_one({"id": parent_id})
-            if parent_culture:
-                related_cultures = await get_related_cultures(
-                    parent_culture["id"],
-                    processed_ids.copy(),
-                    depth_limit,
-                    next_depth,
-                )
-                if related_cultures:
-                    tree.extend(related_cultures)  # Use extend to flatten the list
+async def get_cached_related_cultures(
+    id: str, depth_limit: int = 1, fields: Optional[Tuple[str, ...]] = None
+) -> List[dict]:
+    """get_related_cultures through the read cache, dropped when any member or its lineage changes."""
 
-    # Find children cultures
-    async for child_culture in db.cultures_collection.find(
-        {"parent_ids": {"$in": [culture["id"]]}}
-    ):
-        related_cultures = await get_related_cultures(
-            child_culture["id"],
-            processed_ids.copy(),
-            depth_limit,
-            next_depth,
-        )
-        if related_cultures:
-            tree.extend(related_cultures)  # Use extend to flatten the list
+    async def load():
+        return await get_related_cultures(id, depth_limit, fields) or None
 
-    return tree
+    def tags(cultures: List[dict]):
+        return set().union(*(culture_tags(culture) for culture in cultures))
+
+    return await read_cache.get_or_load(("genealogy", id, depth_limit, fields), load, tags) or []
 
 
-@router.get("/{id}/genealogy", response_model=List[CultureOut])
+def build_genealogy_tree(cultures: List[dict]) -> dict:
+    """
+    Nests a flat genealogy (as returned by get_related_cultures) into a tree.
+
+    The requested culture is the root, ancestors are nested under `parents` and
+    descendants under `children`. A culture reachable through several branches
+    (e.g. a cross of two related parents) is expanded only at its first occurrence.
+    """
+    by_id = {culture["id"]: culture for culture in cultures}
+    children_by_parent = {}
+    for culture in cultures:
+        if culture["relation"] == "descendant":
+            for parent_id in culture.get("parent_ids") or []:
+                children_by_parent.setdefault(parent_id, []).append(culture)
+
+    expanded = set()
+
+    def expand(culture: dict) -> dict:
+        node = {**culture, "parents": [], "children": []}
+        if culture["id"] in expanded:
+            return node
+        expanded.add(culture["id"])
+
+        if culture["relation"] != "descendant":
+            for parent_id in culture.get("parent_ids") or []:
+                parent = by_id.get(parent_id)
+                if parent is not None and parent["relation"] == "ancestor":
+                    node["parents"].append(expand(parent))
+        if culture["relation"] != "ancestor":
+            for child in children_by_parent.get(culture["id"], []):
+                node["children"].append(expand(child))
+        return node
+
+    return expand(cultures[0])
+
+
+@router.get("/{id}/genealogy", response_model=Union[List[GenealogyNode], GenealogyTree])
 async def read_related_cultures(
     id: str,
+    request: Request,
+    response: Response,
     depth_limit: Optional[int] = Query(
-        1, ge=1, le=6, description="Maximum depth of the genealogy tree"
+        1, ge=1, le=GENEALOGY_MAX_DEPTH, description="Maximum depth of the genealogy tree"
     ),
+    shape: Literal["flat", "tree"] = Query(
+        "flat", description="Return a flat list or a nested tree"
+    ),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ):
     """
     Retrieve all related cultures (ancestors and descendants) for a given culture_id.
@@ -282,7 +758,28 @@ async def read_related_cultures(
     Args:
         culture_id: The ID of the culture to start the search from.
         depth_limit: The maximum depth of the genealogy tree to search.
-                     Defaults to 1. Minimum value is 1, maximum is 5.
+                     Defaults to 1. Minimum value is 1, maximum is 32.
+        shape: "flat" returns a list of cultures, "tree" nests them under the requested culture.
+        fields: Comma separated culture fields to return, all fields when omitted.
     """
-    related_cultures = await get_related_cultures(id, depth_limit=depth_limit)
-    return related_cultures
+    fields = parse_fields(fields, GenealogyNode)
+    culture_fields = fields and tuple(name for name in fields if name in CultureOut.model_fields)
+    related_cultures = await get_cached_related_cultures(id, depth_limit, culture_fields)
+    if shape == "tree" and not related_cultures:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Culture with id {id} not found",
+        )
+
+    validators = collection_validators(related_cultures)
+    not_modified = conditional_response(request, response, validators, use_last_modified=False)
+    if not_modified:
+        return not_modified
+
+    if shape == "tree":
+        tree = build_genealogy_tree(related_cultures)
+        if fields:
+            return projected_response(tree, partial_tree_model(GenealogyNode, fields), validators)
+        return tree
+
+    return fast_response(related_cultures, GenealogyNode, fields, validators)
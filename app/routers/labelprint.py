@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Request
-from app.database import db
-from pydantic import BaseModel
+from typing import Annotated
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from app.models.labelprint import PrintBatch, PrintData, PrintJobOut
+from app.service.labelprinter import label_content, label_png
+from app.service.print_queue import get_job, retry_job, submit_job
 
 
 router = APIRouter(
@@ -11,24 +14,54 @@ router = APIRouter(
 
 # ---- API Endpoints ----
 
-class PrintData(BaseModel):
-    barcodeText: str
-    labelText: str
-    dateText: str
-    noteText: str | None = None  # Optional noteText
-    RestrictiveLabel: bool
+@router.post("/", response_model=PrintJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def cloud_print_label(print_data: PrintData):
+    """
+    Queues a label for printing and returns the print job (poll it with GET /labelprint/jobs/{job_id})
+    """
+    return await submit_job([print_data])
+
+
+@router.post("/batch", response_model=PrintJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def cloud_print_labels(batch: PrintBatch):
+    """
+    Queues several labels (e.g. a whole tray) to be printed in a single printer transaction
+    """
+    return await submit_job(batch.labels, batch.cut)
 
-    
-from app.service.labelprinter import print_label
-@router.post("/")
-async def cloud_print_label(print_data: PrintData, request: Request):
+
+@router.get("/jobs/{job_id}", response_model=PrintJobOut)
+async def get_print_job(job_id: str):
     """
-    Endpoint to process print data
+    Get the status of a print job
     """
-    try:
-        print_label(print_data)
-        # print(print_data.model_dump())
-        return {"message": "Print request received successfully"}
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Print job not found")
+    return job
+
 
-    except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+@router.post("/jobs/{job_id}/retry", response_model=PrintJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def retry_print_job(job_id: str):
+    """
+    Queue a failed print job again
+    """
+    job = await retry_job(job_id)
+    if job is None:
+        if await get_job(job_id) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Print job not found")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Only failed print jobs can be retried")
+    return job
+
+
+@router.get(
+    "/preview",
+    response_class=Response,
+    responses={200: {"content": {"image/png": {}}}},
+)
+async def preview_label(print_data: Annotated[PrintData, Query()]):
+    """
+    Render the label of the print data as PNG (cached, reprints and previews of the same label are not rendered again)
+    """
+    png = await run_in_threadpool(label_png, label_content(print_data))
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": "public, max-age=3600"})
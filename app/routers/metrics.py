@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.metrics import PROMETHEUS_CONTENT_TYPE, render_metrics
+
+router = APIRouter(
+    tags=["metrics"],
+)
+
+
+# ---- API Endpoints ----
+
+
+@router.get("/metrics", response_class=Response)
+async def metrics():
+    """Returns the request and MongoDB histograms in the Prometheus text format."""
+    return Response(content=render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
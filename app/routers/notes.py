@@ -1,4 +1,4 @@
-from fastapi import APIRouter, UploadFile, status, HTTPException, Form, File
+from fastapi import APIRouter, UploadFile, status, HTTPException, Form, File, Query, Request, Response
 from typing import List, Optional
 
 import os
@@ -7,9 +7,19 @@ import random
 import string
 import json
 
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
 from app.database import db
+from app.cache import note_change_tags, read_cache
+from app.conditional import conditional_response, document_validators
 from app.config import settings
+from app.pagination import list_response
+from app.projection import FIELDS_DESCRIPTION, parse_fields
+from app.service.bulk import BulkReport, run_writes
+from app.service.statistics import record_change, record_changes
+from app.service.media import FileTooLargeError
+from app.service.attachments import release_attachment, store_attachment
 from app.models.note import NoteCreate, NoteUpdate, NoteOut
+from app.models.bulk import BulkDelete, NoteBulkCreate, NoteBulkResult, NoteBulkUpdate
 
 router = APIRouter(
     prefix="/notes",
@@ -27,8 +37,8 @@ def generate_hex_id(length=12):
     return "".join(random.choice(string.hexdigits) for _ in range(length)).lower()
 
 
-async def save_attachment(image: UploadFile, filename: str) -> str:
-    """Saves the uploaded file to the 'uploads' directory and returns the filename."""
+async def save_attachment(image: UploadFile) -> dict:
+    """Streams the uploaded file into the attachment store and returns the attachment fields of the note."""
 
     # Check if the file has an allowed extension
     if not image.filename.lower().endswith(tuple(settings.ALLOWED_EXTENSIONS)):
@@ -37,15 +47,12 @@ async def save_attachment(image: UploadFile, filename: str) -> str:
             detail=f"Invalid image format, allowed extensions: {list(settings.ALLOWED_EXTENSIONS)}",
         )
 
-    os.makedirs(settings.MEDIA_DIR, exist_ok=True)
+    extension = os.path.splitext(image.filename.lower())[1]
 
-    unique_filename = filename + os.path.splitext(image.filename.lower())[1]
-
-    file_path = os.path.join(settings.MEDIA_DIR, unique_filename)
-    with open(file_path, "wb") as f:
-        f.write(await image.read())
-
-    return unique_filename
+    try:
+        return await store_attachment(image, extension)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
 
 
 # ---- API Endpoints ----
@@ -72,6 +79,9 @@ async def create_note(
         except json.JSONDecodeError:
             raise HTTPException(status_code=422, detail="Invalid format for tags")
 
+    # Save the attachment (if any) so the note is inserted complete
+    attachment = await save_attachment(image=file) if file else {}
+
     # Create the note document
     note_data = NoteCreate(
         id=note_id,
@@ -79,63 +89,199 @@ async def create_note(
         culture_id=culture_id,
         text=text,
         color=color,
-        image_filename=None,  # We'll set this later
+        image_filename=None,
         tags=tags_list,  # Add tags to the note
         updated_at=current_utc_time,
         created_at=current_utc_time,
     )
     note_dict = note_data.model_dump(by_alias=True)
+    note_dict.update(attachment)
 
     # Insert the note into the database
-    result = await notes_collection.insert_one(note_dict)
+    try:
+        result = await notes_collection.insert_one(note_dict)
+    except Exception:
+        await release_attachment(attachment)
+        raise
     if not result.inserted_id:
+        await release_attachment(attachment)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create note",
         )
 
-    # Save the attachment (if any)
-    image_filename = None
-    if file:
-        image_filename = await save_attachment(image=file, filename=note_id)
-
-        # Update the note document with the image filename
-        await notes_collection.update_one(
-            {"id": note_id}, {"$set": {"image_filename": image_filename}}
-        )
-        note_dict["image_filename"] = image_filename
-
+    await read_cache.invalidate(note_change_tags(after=note_dict))
+    await record_change("notes", after=note_dict)
     return note_dict
 
 
 @router.get("/", response_model=List[NoteOut])
-async def list_notes(favorite: Optional[bool] = None):
+async def list_notes(
+    request: Request,
+    response: Response,
+    favorite: Optional[bool] = None,
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size, enables keyset pagination"),
+    stream: bool = Query(False, description='Stream notes as NDJSON, with a limit the last line is {"next_cursor": ...} when more follow'),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
     """Retrieves all notes.
     Args:
-        favorite (Optional[bool], optional): Filter by favorite status. Defaults to None."""
-    notes = []
+        favorite (Optional[bool], optional): Filter by favorite status. Defaults to None.
+        cursor (Optional[str], optional): Continue after the previous page. Defaults to None.
+        limit (Optional[int], optional): Maximum number of notes per page. Defaults to None (all).
+        stream (bool, optional): Stream the notes as NDJSON (last line {"next_cursor": ...} when the limit cuts it). Defaults to False.
+        fields (Optional[str], optional): Comma separated fields to return. Defaults to None (all)."""
+    query = {}
     if favorite is not None:
         # Filter by favorite status
-        async for note in notes_collection.find({"favorite": favorite}):
-            notes.append(note)
-    else:
-        # Retrieve all cultures
-        async for note in notes_collection.find():
-            notes.append(note)
-    return notes
+        query["favorite"] = favorite
+    return await list_response(
+        notes_collection,
+        query,
+        NoteOut,
+        response,
+        cursor,
+        limit,
+        stream,
+        parse_fields(fields, NoteOut),
+        request=request,
+    )
 
 
 @router.get("/culture/{culture_id}", response_model=List[NoteOut])
-async def list_notes(culture_id: str):
+async def list_notes(
+    culture_id: str,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size, enables keyset pagination"),
+    stream: bool = Query(False, description='Stream notes as NDJSON, with a limit the last line is {"next_cursor": ...} when more follow'),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
     """Retrieves all notes for the culture with _id"""
-    notes = []
-    async for note in notes_collection.find({"culture_id": culture_id}):
-        notes.append(note)
-    return notes
+    return await list_response(
+        notes_collection,
+        {"culture_id": culture_id},
+        NoteOut,
+        response,
+        cursor,
+        limit,
+        stream,
+        parse_fields(fields, NoteOut),
+        cache_key=("culture-notes", culture_id),
+        cache_tags={f"culture-notes:{culture_id}"},
+        request=request,
+    )
+
+
+@router.post("/bulk", response_model=NoteBulkResult)
+async def create_notes(bulk: NoteBulkCreate):
+    """Creates many notes (without attachments) with a single insert_many."""
+    report = BulkReport(len(bulk.items), bulk.ordered)
+    current_utc_time = datetime.datetime.now(datetime.timezone.utc)
+
+    documents = [
+        NoteCreate(
+            **item.model_dump(),
+            id=generate_hex_id(),
+            updated_at=current_utc_time,
+            created_at=current_utc_time,
+        ).model_dump(by_alias=True)
+        for item in bulk.items
+    ]
+
+    pending = report.pending()
+    written = await run_writes(
+        report,
+        pending,
+        lambda: notes_collection.insert_many(
+            [documents[index] for index in pending], ordered=bulk.ordered
+        ),
+    )
+    for index in written:
+        note = documents[index]
+        report.succeed(index, "created", status.HTTP_201_CREATED, note["id"], note=note)
+
+    changes = [(None, documents[index]) for index in written]
+    await read_cache.invalidate(set().union(*(note_change_tags(*change) for change in changes)))
+    await record_changes("notes", changes)
+    return report.response()
+
+
+@router.put("/bulk", response_model=NoteBulkResult)
+async def update_notes(bulk: NoteBulkUpdate):
+    """Updates text, favorite, color and tags of many notes with a single bulk_write."""
+    report = BulkReport(len(bulk.items), bulk.ordered)
+    ids = [item.id for item in bulk.items]
+    existing = {note["id"]: note async for note in notes_collection.find({"id": {"$in": ids}})}
+    current_utc_time = datetime.datetime.now(datetime.timezone.utc)
+
+    updates = {}
+    seen_ids = set()
+    for index, item in enumerate(bulk.items):
+        if item.id not in existing:
+            report.fail(index, status.HTTP_404_NOT_FOUND, f"Note with id {item.id} not found", id=item.id)
+            continue
+        if item.id in seen_ids:
+            report.fail(index, status.HTTP_400_BAD_REQUEST, f"Note with id {item.id} is updated twice", id=item.id)
+            continue
+        seen_ids.add(item.id)
+
+        update = item.model_dump(exclude_unset=True, exclude={"id"})
+        update["updated_at"] = current_utc_time
+        updates[index] = update
+
+    pending = report.pending()
+    written = await run_writes(
+        report,
+        pending,
+        lambda: notes_collection.bulk_write(
+            [UpdateOne({"id": ids[index]}, {"$set": updates[index]}) for index in pending],
+            ordered=bulk.ordered,
+        ),
+    )
+    changes = {index: (existing[ids[index]], {**existing[ids[index]], **updates[index]}) for index in written}
+    for index, (_, note) in changes.items():
+        report.succeed(index, "updated", status.HTTP_200_OK, note["id"], note=note)
+
+    await read_cache.invalidate(set().union(*(note_change_tags(*change) for change in changes.values())))
+    await record_changes("notes", changes.values())
+    return report.response()
+
+
+@router.post("/bulk/delete", response_model=NoteBulkResult)
+async def delete_notes(bulk: BulkDelete):
+    """Deletes many notes with a single bulk_write and releases their attachments."""
+    report = BulkReport(len(bulk.ids), bulk.ordered)
+    existing = {note["id"]: note async for note in notes_collection.find({"id": {"$in": bulk.ids}})}
+
+    seen_ids = set()
+    for index, note_id in enumerate(bulk.ids):
+        if note_id not in existing or note_id in seen_ids:
+            report.fail(index, status.HTTP_404_NOT_FOUND, f"Note with id {note_id} not found", id=note_id)
+        seen_ids.add(note_id)
+
+    pending = report.pending()
+    written = await run_writes(
+        report,
+        pending,
+        lambda: notes_collection.bulk_write(
+            [DeleteOne({"id": bulk.ids[index]}) for index in pending], ordered=bulk.ordered
+        ),
+    )
+    for index in written:
+        await release_attachment(existing[bulk.ids[index]])
+        report.succeed(index, "deleted", status.HTTP_204_NO_CONTENT, bulk.ids[index])
+
+    changes = [(existing[bulk.ids[index]], None) for index in written]
+    await read_cache.invalidate(set().union(*(note_change_tags(*change) for change in changes)))
+    await record_changes("notes", changes)
+    return report.response()
 
 
 @router.get("/{note_id}", response_model=NoteOut)
-async def get_note(note_id: str):
+async def get_note(note_id: str, request: Request, response: Response):
     """Retrieve a note by its ID."""
 
     note = await notes_collection.find_one({"id": note_id})
@@ -144,7 +290,7 @@ async def get_note(note_id: str):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Note with id {note_id} not found",
         )
-    return note
+    return conditional_response(request, response, document_validators(note)) or note
 
 
 @router.put("/{note_id}", response_model=NoteOut)
@@ -156,23 +302,6 @@ async def update_note(
     tags: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
 ):
-    # Fetch the existing note
-    existing_note = await notes_collection.find_one({"id": note_id})
-    if not existing_note:
-        raise HTTPException(status_code=404, detail=f"Note with id {note_id} not found")
-
-    # Handle file upload if a new file is provided
-    image_filename = existing_note.get("image_filename")
-    if file:
-        # Delete the old attachment if it exists
-        if image_filename:
-            file_path = os.path.join(settings.MEDIA_DIR, image_filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-
-        # save new file
-        image_filename = await save_attachment(image=file, filename=str(note_id))
-
     # Create update data
     update_data = NoteUpdate(
         culture_id=None, updated_at=datetime.datetime.now(datetime.timezone.utc)
@@ -183,8 +312,6 @@ async def update_note(
         update_data.favorite = favorite
     if color is not None:
         update_data.color = color
-    if image_filename is not None:
-        update_data.image_filename = image_filename
     if tags is not None:
         try:
             tags_list = json.loads(tags)
@@ -192,38 +319,50 @@ async def update_note(
         except json.JSONDecodeError:
             raise HTTPException(status_code=422, detail="Invalid format for tags")
 
-    update_data = update_data.model_dump(exclude_unset=True, exclude={"id"})
-    update_data["culture_id"] = existing_note.get("culture_id")
-
-    # Update the note in the database
-    result = await notes_collection.update_one({"id": note_id}, {"$set": update_data})
+    update_data = update_data.model_dump(exclude_unset=True, exclude={"id", "culture_id"})
 
-    if result.modified_count == 0:
+    # Handle file upload if a new file is provided
+    attachment = {}
+    if file:
+        attachment = await save_attachment(image=file)
+        update_data.update(attachment)
+
+    # Update the note in the database, the previous version is needed to
+    # release its attachment and for the stats deltas
+    note = await notes_collection.find_one_and_update(
+        {"id": note_id},
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if note is None:
+        await release_attachment(attachment)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Note with id {note_id} not found",
         )
+    updated_note = {**note, **update_data}
+
+    # Release the old attachment if it was replaced
+    if attachment:
+        await release_attachment(note)
 
-    # Fetch and return the updated note
-    updated_note = await notes_collection.find_one({"id": note_id})
+    await read_cache.invalidate(note_change_tags(note, updated_note))
+    await record_change("notes", before=note, after=updated_note)
     return updated_note
 
 
 @router.delete("/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_note(note_id: str):
     """Delete a note by its ID."""
-    existing_note = await get_note(note_id)
-
-    # delete image file
-    image_filename = existing_note.get("image_filename")
-    if image_filename:
-        file_path = os.path.join(settings.MEDIA_DIR, image_filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-
-    delete_result = await notes_collection.delete_one({"id": note_id})
-    if delete_result.deleted_count == 0:
+    note = await notes_collection.find_one_and_delete({"id": note_id})
+    if note is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Note with id {note_id} not found",
         )
+
+    # delete image file
+    await release_attachment(note)
+
+    await read_cache.invalidate(note_change_tags(before=note))
+    await record_change("notes", before=note)
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional, Dict
+from fastapi import APIRouter, HTTPException, Query, status
+from typing import List, Literal, Optional
+import asyncio
 from app.database import db
-from app.models.culture import CultureOut
+from app.pagination import decode_cursor, encode_cursor
+from app.models.search import CultureHit, NoteHit, SearchFacets, SearchResults
 
 router = APIRouter(
     prefix="/search",
@@ -11,17 +13,128 @@ router = APIRouter(
 notes_collection = db.notes_collection
 cultures_collection = db.cultures_collection
 
+# hit types, in the order used to break score ties
+SEARCH_COLLECTIONS = {
+    "culture": cultures_collection,
+    "note": notes_collection,
+}
+
+# ---- Helper Functions ----
+
+
+def parse_cursor(cursor: str) -> list:
+    """Decodes a search cursor and checks that it holds a (score, type, id) position."""
+    values = decode_cursor(cursor)
+    if (
+        len(values) != 3
+        or isinstance(values[0], bool)
+        or not isinstance(values[0], (int, float))
+        or values[1] not in SEARCH_COLLECTIONS
+        or not isinstance(values[2], str)
+    ):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def after_cursor(kind: str, cursor: list) -> dict:
+    """Matches the hits of `kind` that come after the cursor in (score desc, type, id) order."""
+    score, cursor_kind, cursor_id = cursor
+
+    conditions = [{"score": {"$lt": score}}]
+    if kind > cursor_kind:
+        conditions.append({"score": score})
+    elif kind == cursor_kind:
+        conditions.append({"score": score, "id": {"$gt": cursor_id}})
+    return {"$or": conditions}
+
+
+async def search_collection(kind: str, q: str, cursor: Optional[list], limit: int) -> List[dict]:
+    """Runs a $text search on one collection, best matches first."""
+    pipeline = [
+        {"$match": {"$text": {"$search": q}}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        pipeline.append({"$match": after_cursor(kind, cursor)})
+    pipeline += [
+        {"$sort": {"score": -1, "id": 1}},
+        {"$limit": limit},
+        {"$project": {"_id": 0}},
+    ]
+    return await SEARCH_COLLECTIONS[kind].aggregate(pipeline).to_list(length=None)
+
+
+async def count_matches(kind: str, q: str) -> int:
+    return await SEARCH_COLLECTIONS[kind].count_documents({"$text": {"$search": q}})
+
+
 # ---- API Endpoints ----
 
 
-@router.get("/", response_model=List[CultureOut])
-async def search(q: Optional[str] = Query(None, description="Search query")):
+@router.get("/", response_model=SearchResults)
+async def search(
+    q: Optional[str] = Query(None, description="Search query"),
+    type: Optional[Literal["culture", "note"]] = Query(None, description="Only search cultures or notes"),
+    cursor: Optional[str] = Query(None, description="Cursor of the next page from the previous response"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results to return"),
+):
+    """
+    Search cultures (name, tags) and notes (text, tags) with the text indexes.
+
+    Both collections are queried concurrently and merged by relevance score.
+    Facets contain the total number of matches per collection.
+    """
     if not q:
             raise HTTPException(status_code=400, detail="Missing search query")
 
-    cultures = []
-    # TODO Global search
-    
-    return cultures
+    cursor_values = parse_cursor(cursor) if cursor else None
+    kinds = [type] if type else list(SEARCH_COLLECTIONS)
+
+    # one extra hit per collection tells whether there is a next page
+    results = await asyncio.gather(
+        *(search_collection(kind, q, cursor_values, limit + 1) for kind in kinds),
+        *(count_matches(kind, q) for kind in SEARCH_COLLECTIONS),
+    )
+    hits = sorted(
+        (
+            (document["score"], kind, document)
+            for kind, documents in zip(kinds, results)
+            for document in documents
+        ),
+        key=lambda hit: (-hit[0], hit[1], hit[2]["id"]),
+    )
+    culture_count, note_count = results[len(kinds):]
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        score, kind, document = hits[-1]
+        next_cursor = encode_cursor([score, kind, document["id"]])
+
+    # parent cultures of the note hits, in a single query
+    culture_ids = list({document["culture_id"] for _, kind, document in hits if kind == "note"})
+    parent_cultures = {}
+    if culture_ids:
+        async for culture in cultures_collection.find(
+            {"id": {"$in": culture_ids}}, {"_id": 0, "id": 1, "name": 1, "slug": 1}
+        ):
+            parent_cultures[culture["id"]] = culture
 
+    items = []
+    for score, kind, document in hits:
+        if kind == "culture":
+            items.append(CultureHit(score=score, culture=document))
+        else:
+            items.append(
+                NoteHit(
+                    score=score,
+                    note=document,
+                    culture=parent_cultures.get(document["culture_id"]),
+                )
+            )
 
+    return SearchResults(
+        items=items,
+        next_cursor=next_cursor,
+        facets=SearchFacets(cultures=culture_count, notes=note_count),
+    )
@@ -0,0 +1,82 @@
+"""
+Fast JSON serialization of list responses.
+
+Returning raw documents through `response_model=List[...]` makes FastAPI
+validate and rebuild every field of every document, and run the
+`default_factory` of every field. List endpoints instead read exactly the
+output fields of the model from MongoDB (`output_projection`), fill in the
+defaults of missing fields and encode the documents directly with orjson.
+The response model is still declared on the endpoints for the API schema.
+"""
+
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple, Type
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+from app.projection import mongo_projection
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+@lru_cache(maxsize=256)
+def output_fields(model: Type[BaseModel], fields: Optional[Tuple[str, ...]] = None) -> Tuple[tuple, ...]:
+    """Returns (name, default, default_factory) of the serialized fields of a model."""
+    definitions = []
+    for name, field in model.model_fields.items():
+        if fields is not None and name not in fields:
+            continue
+        if fields is not None:  # partial responses fill missing fields with None
+            definitions.append((name, None, None))
+        else:
+            default = None if field.default is PydanticUndefined else field.default
+            definitions.append((name, default, field.default_factory))
+    return tuple(definitions)
+
+
+def output_projection(model: Type[BaseModel], fields: Optional[Tuple[str, ...]] = None) -> dict:
+    """Builds the MongoDB projection of the serialized fields of a model."""
+    return mongo_projection(name for name, _, _ in output_fields(model, fields))
+
+
+def _encode_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dump_documents(
+    documents: Iterable[dict], model: Type[BaseModel], fields: Optional[Tuple[str, ...]] = None
+) -> List[dict]:
+    """Shapes documents like the model would serialize them (only its fields, defaults filled in)."""
+    definitions = output_fields(model, fields)
+    output = []
+    for document in documents:
+        item = {}
+        for name, default, default_factory in definitions:
+            value = document.get(name, default)
+            if value is None and name not in document and default_factory is not None:
+                value = default_factory()
+            item[name] = value
+        output.append(item)
+    return output
+
+
+def encode_json(content) -> bytes:
+    """Encodes JSON with orjson (datetimes as ISO 8601, ObjectIds as strings)."""
+    return orjson.dumps(content, default=_encode_default, option=ORJSON_OPTIONS)
+
+
+def fast_response(
+    documents: Iterable[dict],
+    model: Type[BaseModel],
+    fields: Optional[Tuple[str, ...]] = None,
+    headers: Optional[dict] = None,
+) -> Response:
+    """Serializes a list of documents without validating them with the response model."""
+    body = encode_json(dump_documents(documents, model, fields))
+    return Response(content=body, media_type="application/json", headers=headers)
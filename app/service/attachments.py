@@ -0,0 +1,229 @@
+"""
+Content-addressed attachment storage.
+
+Attachment files are stored once per content, named by their SHA-256 digest
+and sharded into subdirectories (`ab/cd/abcd....jpg` inside the media
+directory). A record per file in the `media` collection counts the notes
+referencing it: uploading bytes that are already stored only increments the
+count, and the file and its derivatives are deleted when the last referencing
+note goes away.
+
+A record whose count dropped to zero is marked `deleting` while its files are
+removed. An upload of the same content in that window takes the record back
+and stores its own copy; the release then finds the record referenced again
+and puts the file back instead of deleting the record.
+
+Move attachments saved by older versions (`<note_id>.<ext>`) into the store with:
+
+    python -m app.service.attachments
+"""
+
+import asyncio
+import hashlib
+import os
+import uuid
+
+from fastapi import UploadFile
+from pymongo import ReturnDocument
+
+from app.config import settings
+from app.database import db
+from app.service import images
+from app.service.media import CHUNK_SIZE, move_file, remove_file, stream_to_temp_file
+
+
+# ---- Helper Functions ----
+
+
+def blob_filename(sha256: str, extension: str) -> str:
+    """Returns the path of a stored file relative to the media directory (also its URL path)."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def is_stored(note: dict) -> bool:
+    """Returns whether the attachment of a note lives in the content-addressed store."""
+    sha256 = note.get("image_sha256")
+    return bool(sha256) and (note.get("image_filename") or "").startswith(blob_filename(sha256, ""))
+
+
+def attachment_fields(media: dict) -> dict:
+    """Returns the attachment fields of a note referencing a stored file."""
+    return {
+        "image_filename": media["filename"],
+        "image_sha256": media["_id"],
+        "image_size": media["size"],
+        "image_derivatives": media.get("derivatives"),
+    }
+
+
+def _hash_file(path: str):
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+async def acquire(sha256: str, extension: str, size: int, source_path: str) -> dict:
+    """
+    Adds a reference to the stored file with the given content.
+
+    The file at `source_path` is moved into the store if the content is new,
+    otherwise it is deleted. If storing it fails, the reference is removed again.
+
+    Returns:
+        The attachment fields for the referencing note.
+    """
+    media = await db.media_collection.find_one_and_update(
+        {"_id": sha256},
+        {
+            "$inc": {"refcount": 1},
+            "$setOnInsert": {
+                "filename": blob_filename(sha256, extension),
+                "size": size,
+                "derivatives": None,
+            },
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    path = os.path.join(settings.MEDIA_DIR, media["filename"])
+    try:
+        # a release in progress may remove the stored file at any moment, keep this copy
+        if (
+            media["refcount"] == 1
+            or media.get("deleting")
+            or not await asyncio.to_thread(os.path.exists, path)
+        ):
+            await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+            await move_file(source_path, path)
+            images.schedule_derivatives(sha256, media["filename"])
+        else:
+            await remove_file(source_path)  # duplicate of a stored file
+    except BaseException:
+        await release(sha256)  # no note will reference it
+        raise
+
+    return attachment_fields(media)
+
+
+# ---- Storage ----
+
+
+async def store_attachment(upload: UploadFile, extension: str) -> dict:
+    """
+    Streams an upload into the store.
+
+    Returns:
+        The attachment fields for the referencing note.
+
+    Raises:
+        FileTooLargeError: The upload exceeds settings.MAX_UPLOAD_SIZE.
+    """
+    temp_path, sha256, size = await stream_to_temp_file(
+        upload, settings.MEDIA_DIR, settings.MAX_UPLOAD_SIZE
+    )
+    try:
+        return await acquire(sha256, extension, size, temp_path)
+    except BaseException:
+        await remove_file(temp_path)
+        raise
+
+
+async def release_attachment(note: dict):
+    """Removes the reference of a note to its attachment, deleting the file with the last reference."""
+    if not note.get("image_filename"):
+        return
+
+    if not is_stored(note):  # saved before the content-addressed store
+        await remove_file(os.path.join(settings.MEDIA_DIR, note["image_filename"]))
+        await images.remove_derivatives(note.get("image_derivatives"))
+        return
+
+    await release(note["image_sha256"])
+
+
+async def release(sha256: str):
+    """Removes a reference to a stored file, deleting the file and its record with the last one."""
+    media = await db.media_collection.find_one_and_update(
+        {"_id": sha256},
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if media is None or media["refcount"] > 0:
+        return
+
+    # from here on, an acquire of the same content stores its own copy
+    unreferenced = {"_id": sha256, "refcount": {"$lte": 0}}
+    result = await db.media_collection.update_one(unreferenced, {"$set": {"deleting": True}})
+    if result.matched_count == 0:
+        return  # referenced again
+
+    # the file is moved aside first, it is put back if the content is referenced again meanwhile
+    path = os.path.join(settings.MEDIA_DIR, media["filename"])
+    removed_path = f"{path}.{uuid.uuid4().hex}.deleting"
+    try:
+        await move_file(path, removed_path)
+    except FileNotFoundError:
+        removed_path = None
+    await images.remove_derivatives(media.get("derivatives"))
+
+    result = await db.media_collection.delete_one({**unreferenced, "deleting": True})
+    if result.deleted_count:
+        if removed_path:
+            await remove_file(removed_path)
+        return
+
+    # referenced again while the files were removed
+    if removed_path:
+        await move_file(removed_path, path)
+    await db.media_collection.update_one(
+        {"_id": sha256, "refcount": {"$gt": 0}}, {"$unset": {"deleting": ""}}
+    )
+    images.schedule_derivatives(sha256, media["filename"])
+
+
+# ---- Migration ----
+
+
+async def migrate_attachments() -> int:
+    """Moves attachments saved as `<note_id>.<ext>` into the content-addressed store."""
+    notes = await db.notes_collection.find(
+        {"image_filename": {"$nin": [None, ""]}},
+        {"_id": 0, "id": 1, "image_filename": 1, "image_sha256": 1, "image_derivatives": 1},
+    ).to_list(length=None)
+
+    migrated = 0
+    for note in notes:
+        if is_stored(note):
+            continue
+
+        path = os.path.join(settings.MEDIA_DIR, note["image_filename"])
+        if not await asyncio.to_thread(os.path.exists, path):
+            print(f"Missing attachment {note['image_filename']} of note {note['id']}")
+            continue
+
+        sha256, size = await asyncio.to_thread(_hash_file, path)
+        extension = os.path.splitext(note["image_filename"])[1].lower()
+        attachment = await acquire(sha256, extension, size, path)
+        await images.remove_derivatives(note.get("image_derivatives"))
+        await db.notes_collection.update_one({"id": note["id"]}, {"$set": attachment})
+        migrated += 1
+
+    print(f"Attachments migrated: {migrated} of {len(notes)} notes")
+    return migrated
+
+
+async def main():
+    try:
+        await migrate_attachments()
+        await images.wait_for_derivatives()
+    finally:
+        images.shutdown_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Per-item bookkeeping of the bulk endpoints.
+
+Every item of a bulk request gets its own result. Items failing validation are
+reported without touching the database, the valid ones are written with a
+single insert_many or bulk_write, and the errors of individual writes are
+mapped back to their items. In ordered mode the batch stops at the first
+failing item and the following items are reported as skipped, like MongoDB
+ordered writes.
+"""
+
+from typing import Awaitable, Callable, List, Optional
+
+from fastapi import status
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class BulkReport:
+    """Collects the results of the items of a bulk request."""
+
+    def __init__(self, size: int, ordered: bool):
+        self.ordered = ordered
+        self.results: List[Optional[dict]] = [None] * size
+        self.stopped_at: Optional[int] = None  # first failed item in ordered mode
+
+    def fail(self, index: int, status_code: int, detail: str, id: Optional[str] = None):
+        """Reports a failed item."""
+        self.results[index] = {
+            "index": index,
+            "id": id,
+            "status": "failed",
+            "status_code": status_code,
+            "detail": detail,
+        }
+        if self.ordered and (self.stopped_at is None or index < self.stopped_at):
+            self.stopped_at = index
+
+    def succeed(self, index: int, status: str, status_code: int, id: str, **data):
+        """Reports a written item, `data` holds the resulting document (e.g. culture=...)."""
+        self.results[index] = {
+            "index": index,
+            "id": id,
+            "status": status,
+            "status_code": status_code,
+            **data,
+        }
+
+    def pending(self) -> List[int]:
+        """Returns the items still to be written (up to the first failure in ordered mode)."""
+        end = len(self.results) if self.stopped_at is None else self.stopped_at
+        return [index for index in range(end) if self.results[index] is None]
+
+    def response(self) -> dict:
+        """Returns the bulk result with the counts and the result of every item."""
+        items = []
+        for index, result in enumerate(self.results):
+            if result is None or (self.stopped_at is not None and index > self.stopped_at):
+                result = {
+                    "index": index,
+                    "id": (result or {}).get("id"),
+                    "status": "skipped",
+                    "status_code": status.HTTP_424_FAILED_DEPENDENCY,
+                    "detail": f"Not processed, item {self.stopped_at} failed",
+                }
+            items.append(result)
+
+        counts = {"succeeded": 0, "failed": 0, "skipped": 0}
+        for item in items:
+            key = item["status"] if item["status"] in ("failed", "skipped") else "succeeded"
+            counts[key] += 1
+        return {**counts, "items": items}
+
+
+async def run_writes(
+    report: BulkReport, indexes: List[int], write: Callable[[], Awaitable]
+) -> List[int]:
+    """
+    Runs the bulk write of the pending items and reports its write errors.
+
+    Args:
+        report: The report of the bulk request.
+        indexes: Item index of every operation of the write, in order.
+        write: Runs the insert_many or bulk_write (with the ordered mode of the report).
+
+    Returns:
+        The indexes of the items that were written.
+    """
+    if not indexes:
+        return []
+
+    errors = {}
+    try:
+        await write()
+    except BulkWriteError as e:
+        errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+
+    first_error = min(errors, default=None)
+    written = []
+    for position, index in enumerate(indexes):
+        error = errors.get(position)
+        if error is not None:
+            if error.get("code") == DUPLICATE_KEY_ERROR:
+                report.fail(index, status.HTTP_409_CONFLICT, f"Duplicate key error: {error.get('errmsg')}")
+            else:
+                report.fail(index, status.HTTP_500_INTERNAL_SERVER_ERROR, error.get("errmsg", "Write failed"))
+        elif not (report.ordered and first_error is not None and position > first_error):
+            written.append(index)
+    return written
@@ -0,0 +1,169 @@
+"""
+Image derivatives of note attachments.
+
+Uploaded images are re-encoded off the request path, in a process pool, into
+webp derivatives of bounded size with the EXIF metadata stripped. Derivatives
+are rendered once per stored file; their filenames are recorded on the media
+record and on every note referencing the file (`image_derivatives`).
+
+Render the derivatives of existing attachments with:
+
+    python -m app.service.images
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+from app.cache import read_cache
+from app.config import settings
+from app.database import db
+from app.service.media import remove_file
+
+# derivative name -> maximum width/height in pixels
+DERIVATIVES = {
+    "thumb": 320,
+    "medium": 1024,
+    "original": 2560,
+}
+WEBP_QUALITY = 80
+
+_pool: Optional[ProcessPoolExecutor] = None
+_tasks = set()  # running derivative jobs, referenced until done
+
+
+# ---- Rendering (runs in worker processes) ----
+
+
+def derivative_filename(image_filename: str, name: str) -> str:
+    """Returns the filename of a derivative of an attachment."""
+    return f"{os.path.splitext(image_filename)[0]}_{name}.webp"
+
+
+def render_derivatives(media_dir: str, image_filename: str) -> Dict[str, str]:
+    """
+    Renders the webp derivatives of an image.
+
+    Images are rotated according to their EXIF orientation and saved without
+    EXIF metadata; images smaller than a derivative size are never upscaled.
+
+    Returns:
+        Derivative filenames keyed by derivative name.
+    """
+    with Image.open(os.path.join(media_dir, image_filename)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "PA", "P") else "RGB")
+
+        derivatives = {}
+        for name, max_size in DERIVATIVES.items():
+            derivative = image.copy()
+            derivative.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+            filename = derivative_filename(image_filename, name)
+            path = os.path.join(media_dir, filename)
+            derivative.save(path + ".tmp", "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(path + ".tmp", path)
+            derivatives[name] = filename
+
+    return derivatives
+
+
+# ---- Process pool ----
+
+
+def start_pool(workers: int = settings.IMAGE_WORKERS):
+    """Starts the process pool rendering the derivatives."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers)
+    return _pool
+
+
+def shutdown_pool():
+    """Stops the process pool, pending renders are cancelled."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def render_in_pool(image_filename: str) -> Dict[str, str]:
+    """Renders the derivatives of an attachment in the process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        start_pool(), render_derivatives, settings.MEDIA_DIR, image_filename
+    )
+
+
+async def remove_derivatives(derivatives: Optional[Dict[str, str]]):
+    """Removes derivative files from the media directory."""
+    for filename in (derivatives or {}).values():
+        await remove_file(os.path.join(settings.MEDIA_DIR, filename))
+
+
+async def generate_derivatives(sha256: str, image_filename: str):
+    """Renders the derivatives of a stored attachment and records them on the notes using it."""
+    try:
+        derivatives = await render_in_pool(image_filename)
+    except Exception as e:
+        print(f"Error rendering derivatives of {image_filename}: {e}")
+        return
+
+    result = await db.media_collection.update_one(
+        {"_id": sha256}, {"$set": {"derivatives": derivatives}}
+    )
+    if result.matched_count == 0:  # file released in the meantime
+        await remove_derivatives(derivatives)
+        return
+    await db.notes_collection.update_many(
+        {"image_sha256": sha256}, {"$set": {"image_derivatives": derivatives}}
+    )
+    culture_ids = await db.notes_collection.distinct("culture_id", {"image_sha256": sha256})
+    await read_cache.invalidate(f"culture-notes:{culture_id}" for culture_id in culture_ids)
+
+
+def schedule_derivatives(sha256: str, image_filename: str):
+    """Renders the derivatives of a stored attachment in the background."""
+    task = asyncio.create_task(generate_derivatives(sha256, image_filename))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def wait_for_derivatives():
+    """Waits until the derivatives scheduled in the background are rendered."""
+    while _tasks:
+        await asyncio.gather(*_tasks)
+
+
+# ---- Backfill ----
+
+
+async def backfill_derivatives() -> int:
+    """Renders the derivatives of every stored attachment that has none yet."""
+    media = await db.media_collection.find(
+        {"derivatives": None}, {"filename": 1}
+    ).to_list(length=None)
+
+    start_pool()
+    semaphore = asyncio.Semaphore(settings.IMAGE_WORKERS * 2)
+
+    async def backfill(file):
+        async with semaphore:
+            if not os.path.exists(os.path.join(settings.MEDIA_DIR, file["filename"])):
+                print(f"Missing attachment {file['filename']}")
+                return
+            await generate_derivatives(file["_id"], file["filename"])
+
+    try:
+        await asyncio.gather(*(backfill(file) for file in media))
+    finally:
+        shutdown_pool()
+    print(f"Derivatives rendered for {len(media)} attachments")
+    return len(media)
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_derivatives())
@@ -1,26 +1,62 @@
 # git+https://github.com/cultivare/brother_ql.git
 
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import io
+import threading
+
 from brother_ql.conversion import convert
 from brother_ql.backends.helpers import send
 from brother_ql.raster import BrotherQLRaster
 
 from app.config import settings
+from app.models.labelprint import MAX_BATCH_LABELS
 
 from PIL import Image, ImageDraw, ImageFont
 import qrcode
 
 
-def print_image(im):
-    backend = settings.PRINTER_BACKEND  # 'pyusb', 'linux_kernal', 'network'
-    model = settings.PRINTER_MODEL # your printer model.
-    printer = settings.PRINTER_ADDRESS  # Get these values from the Windows usb driver filter.  Linux/Raspberry Pi uses '/dev/usb/lp0'.
+FAKE_BACKEND = "fake"  # records the instructions instead of printing, for tests and development
+RENDER_THREADS = 8
+
+# instructions "sent" to the fake backend, most recent last
+fake_printer_output = deque(maxlen=100)
+
+# hashable content of a PrintData, the key of the rendered label caches
+LabelContent = namedtuple(
+    "LabelContent", ["barcodeText", "labelText", "dateText", "noteText", "RestrictiveLabel"]
+)
+
+
+class BatchRaster(BrotherQLRaster):
+    """Raster instructions cutting after every `cut_every` labels instead of after each label."""
 
-    qlr = BrotherQLRaster(model)
+    cut_every = 1
+
+    def add_cut_every(self, n=1):
+        super().add_cut_every(self.cut_every)
+
+
+def convert_images(images, cut="each"):
+    """
+    Converts label images into the raster instructions of a single print job.
+
+    Args:
+        images: PIL images of the labels, printed in order.
+        cut: "each" to cut after every label, "end" to cut once after the last label
+             (at most MAX_BATCH_LABELS labels).
+    """
+    qlr = BatchRaster(settings.PRINTER_MODEL)
     qlr.exception_on_warning = True
+    if cut == "end":
+        if len(images) > MAX_BATCH_LABELS:
+            raise ValueError(f"At most {MAX_BATCH_LABELS} labels can be cut at the end of a job")
+        qlr.cut_every = len(images)
 
-    instructions = convert(
+    return convert(
         qlr=qlr,
-        images=[im],  #  Takes a list of file names or PIL objects.
+        images=images,  #  Takes a list of file names or PIL objects.
         label=str(settings.PRINTER_LABEL_SIZE),
         rotate="0",  # 'Auto', '0', '90', '270'
         threshold=70.0,  # Black and white threshold in percent.
@@ -32,6 +68,15 @@ def print_image(im):
         cut=True,
     )
 
+
+def send_instructions(instructions):
+    backend = settings.PRINTER_BACKEND  # 'pyusb', 'linux_kernal', 'network' or 'fake'
+    printer = settings.PRINTER_ADDRESS  # Get these values from the Windows usb driver filter.  Linux/Raspberry Pi uses '/dev/usb/lp0'.
+
+    if backend == FAKE_BACKEND:
+        fake_printer_output.append(instructions)
+        return
+
     send(
         instructions=instructions,
         printer_identifier=printer,
@@ -40,6 +85,26 @@ def print_image(im):
     )
 
 
+def print_images(images, cut="each"):
+    """Prints label images with one conversion and one transmission to the printer."""
+    send_instructions(convert_images(images, cut))
+
+
+@lru_cache(maxsize=None)
+def label_font(size):
+    """Returns the default font in the given size (loaded once per size)."""
+    return ImageFont.load_default().font_variant(size=size)
+
+
+@lru_cache(maxsize=1024)
+def qr_image(text, size, color="black"):
+    """Returns the QR code of a text as an image of size x size pixels (shared, do not modify)."""
+    qr = qrcode.QRCode(version=1, box_size=10, border=0)
+    qr.add_data(text)
+    qr.make(fit=True)
+    return qr.make_image(fill_color=color, back_color="white").resize((size, size))
+
+
 def create_label_image(
     print_data,
     qr_size=284,
@@ -66,19 +131,12 @@ def create_label_image(
     ]
 
     # Create QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=0)
-    qr.add_data(print_data.barcodeText)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color=qr_color, back_color="white").resize(
-        (qr_size, qr_size)
-    )
+    qr_img = qr_image(print_data.barcodeText, qr_size, qr_color)
 
     # Calculate text width
     total_text_width = 0
-    font = ImageFont.load_default()
     for i, line in enumerate(text_lines):
-        font = font.font_variant(size=font_sizes[i])
-        bbox = font.getbbox(line)
+        bbox = label_font(font_sizes[i]).getbbox(line)
         total_text_width = max(total_text_width, bbox[2])
 
     # Calculate image width
@@ -94,8 +152,7 @@ def create_label_image(
     # Add text
     y = text_position[1]
     for i, line in enumerate(text_lines):
-        font = ImageFont.load_default()
-        font = font.font_variant(size=font_sizes[i])
+        font = label_font(font_sizes[i])
         if i == 0:  # Make the first line bold
             try:
                 bold_font = font.getmask(line, "1")
@@ -112,9 +169,81 @@ def create_label_image(
     return img  # img.save(output_filename)
 
 
-def print_label(print_data):
-    print(print_data)
-    img = create_label_image(print_data)
-    img = img.rotate(90, expand=True)
-    print_image(img)
+def label_content(print_data):
+    """Returns the cache key of a PrintData."""
+    return LabelContent(
+        print_data.barcodeText,
+        print_data.labelText,
+        print_data.dateText,
+        print_data.noteText or "",
+        bool(print_data.RestrictiveLabel),
+    )
+
+
+class LabelCache:
+    """LRU of rendered label PNGs bounded by their total size (shared by the render threads)."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # label content -> PNG bytes
+        self._lock = threading.Lock()
+
+    def get(self, content):
+        with self._lock:
+            png = self._entries.get(content)
+            if png is not None:
+                self._entries.move_to_end(content)
+            return png
+
+    def set(self, content, png):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(content, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[content] = png
+            self.size += len(png)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+# a label PNG takes about 25 KB, its decoded image about 0.75 MB
+label_cache = LabelCache(settings.LABEL_CACHE_BYTES)
+
+
+def label_png(content):
+    """Returns the PNG of a label, rendered once per content."""
+    png = label_cache.get(content)
+    if png is None:
+        buffer = io.BytesIO()
+        create_label_image(content).save(buffer, "PNG")
+        png = buffer.getvalue()
+        label_cache.set(content, png)
+    return png
+
+
+def render_label(print_data):
+    """Renders a label image in printing orientation (cached by label content)."""
+    with Image.open(io.BytesIO(label_png(label_content(print_data)))) as im:
+        return im.rotate(90, expand=True)
+
+
+def print_labels(labels, cut="each"):
+    """
+    Prints several labels in a single printer transaction.
+
+    The label images are rendered in parallel threads, then converted and sent
+    to the printer at once.
+    """
+    with ThreadPoolExecutor(max_workers=min(len(labels), RENDER_THREADS)) as executor:
+        images = list(executor.map(render_label, labels))
+    print_images(images, cut)
     return True
@@ -0,0 +1,229 @@
+"""
+Materialized lineage of cultures.
+
+Every culture stores the ids of all its ancestors (`ancestor_ids`) and its
+`generation` (0 for cultures without parents, otherwise one more than the
+highest generation among its parents, so a culture is always below all of its
+parents). A multikey index on `ancestor_ids` turns subtree,
+lineage and generation questions into single indexed queries.
+
+Backfill existing data with:
+
+    python -m app.service.lineage
+"""
+
+import asyncio
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from app.database import db
+
+LINEAGE_PROJECTION = {"_id": 0, "id": 1, "parent_ids": 1, "ancestor_ids": 1, "generation": 1}
+BULK_CHUNK_SIZE = 1000
+
+
+def compute_lineage(
+    id: Optional[str], parent_ids: Optional[List[str]], lineages: Dict[str, dict]
+) -> dict:
+    """
+    Computes the lineage of a culture from the lineage of its parents.
+
+    The ancestors are the parents and their ancestors, the generation is one
+    more than the highest generation among the parents.
+
+    Args:
+        id: The ID of the culture (excluded from its own ancestors).
+        parent_ids: IDs of the parent cultures.
+        lineages: Lineage dictionaries (`ancestor_ids`, `generation`) keyed by culture ID.
+                  Parents missing from this mapping are ignored.
+    """
+    ancestor_ids = []
+    seen_ids = {id}
+    generation = 0
+    for parent_id in parent_ids or []:
+        parent = lineages.get(parent_id)
+        if parent is None:
+            continue
+        for ancestor_id in [parent_id, *(parent.get("ancestor_ids") or [])]:
+            if ancestor_id not in seen_ids:
+                seen_ids.add(ancestor_id)
+                ancestor_ids.append(ancestor_id)
+        generation = max(generation, (parent.get("generation") or 0) + 1)
+
+    return {"ancestor_ids": ancestor_ids, "generation": generation}
+
+
+def resolve_lineage(cultures: List[dict], known: Dict[str, dict]) -> Dict[str, dict]:
+    """
+    Computes the lineage of a set of cultures in topological order.
+
+    Args:
+        cultures: Cultures (with `id` and `parent_ids`) whose lineage must be computed.
+        known: Final lineage of cultures outside the set, keyed by culture ID.
+
+    Returns:
+        Lineage dictionaries keyed by culture ID.
+    """
+    pending = {culture["id"]: culture for culture in cultures}
+    children = {}
+    indegree = {}
+    for culture in cultures:
+        in_set_parents = {
+            parent_id
+            for parent_id in culture.get("parent_ids") or []
+            if parent_id in pending and parent_id != culture["id"]
+        }
+        indegree[culture["id"]] = len(in_set_parents)
+        for parent_id in in_set_parents:
+            children.setdefault(parent_id, []).append(culture["id"])
+
+    queue = deque(id for id, count in indegree.items() if count == 0)
+    lineages = dict(known)
+    resolved = {}
+    while pending:
+        if not queue:  # parent_ids contain a cycle, break it at an arbitrary culture
+            queue.append(next(iter(pending)))
+        id = queue.popleft()
+        culture = pending.pop(id, None)
+        if culture is None:
+            continue
+
+        lineage = compute_lineage(id, culture.get("parent_ids"), lineages)
+        lineages[id] = resolved[id] = lineage
+        for child_id in children.get(id, []):
+            indegree[child_id] -= 1
+            if indegree[child_id] == 0:
+                queue.append(child_id)
+
+    return resolved
+
+
+async def get_lineages(ids: Iterable[str]) -> Dict[str, dict]:
+    """Fetches the stored lineage of the given cultures, keyed by culture ID."""
+    ids = list(ids)
+    if not ids:
+        return {}
+    cursor = db.cultures_collection.find({"id": {"$in": ids}}, LINEAGE_PROJECTION)
+    return {culture["id"]: culture async for culture in cursor}
+
+
+async def get_subtree_lineages(ids: Iterable[str], parent_ids: Iterable[str]) -> Dict[str, dict]:
+    """
+    Fetches the lineages needed to re-parent cultures in memory (see move_culture).
+
+    Returns the stored lineage (with `parent_ids`) of the cultures, of all their
+    descendants, of the other parents of these descendants and of the new parents,
+    keyed by culture ID.
+    """
+    ids = list(ids)
+    descendants = await db.cultures_collection.find(
+        {"ancestor_ids": {"$in": ids}}, LINEAGE_PROJECTION
+    ).to_list(length=None)
+    lineages = {culture["id"]: culture for culture in descendants}
+    other_ids = {*ids, *parent_ids} | {
+        parent_id for culture in descendants for parent_id in culture.get("parent_ids") or []
+    }
+    lineages.update(await get_lineages(other_ids - lineages.keys()))
+    return lineages
+
+
+def move_culture(id: str, parent_ids: List[str], lineages: Dict[str, dict]) -> dict:
+    """
+    Re-parents a culture within lineages fetched by get_subtree_lineages (in place).
+
+    The descendants of the culture are recomputed as well, so that the checks and
+    lineages of cultures moved later in the same batch see the move.
+
+    Returns:
+        The new lineage of the culture.
+    """
+    lineage = compute_lineage(id, parent_ids, lineages)
+    descendants = [
+        culture for culture in lineages.values() if id in (culture.get("ancestor_ids") or [])
+    ]
+    lineages[id] = {"id": id, "parent_ids": parent_ids, **lineage}
+    for descendant_id, descendant_lineage in resolve_lineage(descendants, lineages).items():
+        lineages[descendant_id] = {**lineages[descendant_id], **descendant_lineage}
+    return lineage
+
+
+async def write_lineage(cultures: List[dict], lineages: Dict[str, dict]) -> int:
+    """Stores changed lineages with bulk writes and returns the number of updated cultures."""
+    operations = []
+    for culture in cultures:
+        lineage = lineages.get(culture["id"])
+        if lineage is None:
+            continue
+        if (
+            culture.get("ancestor_ids") == lineage["ancestor_ids"]
+            and culture.get("generation") == lineage["generation"]
+        ):
+            continue
+        operations.append(UpdateOne({"id": culture["id"]}, {"$set": lineage}))
+
+    for start in range(0, len(operations), BULK_CHUNK_SIZE):
+        await db.cultures_collection.bulk_write(
+            operations[start : start + BULK_CHUNK_SIZE], ordered=False
+        )
+    return len(operations)
+
+
+async def cascade_lineage(id: str, lineage: Optional[dict]) -> int:
+    """
+    Propagates a changed lineage of a culture to its whole subtree.
+
+    With `lineage` None the culture was deleted: it is dropped from the
+    ancestors of its descendants (as a missing parent, see compute_lineage).
+
+    Returns:
+        The number of descendants whose lineage changed.
+    """
+    return await cascade_lineages({id: lineage})
+
+
+async def cascade_lineages(lineages: Dict[str, Optional[dict]]) -> int:
+    """
+    Propagates the changed lineages of cultures to their subtrees, in a fixed number of queries.
+
+    The subtrees are read with one indexed query on `ancestor_ids`, recomputed in
+    memory and written back with bulk writes, whatever the number of cultures.
+
+    Args:
+        lineages: New lineage keyed by culture ID, None for a deleted culture.
+
+    Returns:
+        The number of descendants whose lineage changed.
+    """
+    if not lineages:
+        return 0
+    descendants = await db.cultures_collection.find(
+        {"ancestor_ids": {"$in": list(lineages)}}, LINEAGE_PROJECTION
+    ).to_list(length=None)
+    if not descendants:
+        return 0
+
+    subtree_ids = {culture["id"] for culture in descendants} | lineages.keys()
+    outside_parent_ids = {
+        parent_id
+        for culture in descendants
+        for parent_id in culture.get("parent_ids") or []
+        if parent_id not in subtree_ids
+    }
+    known = await get_lineages(outside_parent_ids)
+    known.update({id: lineage for id, lineage in lineages.items() if lineage is not None})
+
+    return await write_lineage(descendants, resolve_lineage(descendants, known))
+
+
+async def backfill_lineage() -> int:
+    """Computes and stores the lineage of every culture."""
+    cultures = await db.cultures_collection.find({}, LINEAGE_PROJECTION).to_list(length=None)
+    updated = await write_lineage(cultures, resolve_lineage(cultures, {}))
+    print(f"Lineage backfilled: {updated} of {len(cultures)} cultures updated")
+    return updated
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_lineage())
@@ -0,0 +1,88 @@
+"""
+Attachment files in the media directory.
+
+Uploads are streamed in chunks to a temporary file next to their destination
+and moved into place with an atomic rename. All file system calls run in
+worker threads so they never block the event loop.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Tuple
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds the maximum allowed size."""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File exceeds the maximum size of {max_size} bytes")
+        self.max_size = max_size
+
+
+def _write_chunk(file, digest, chunk: bytes):
+    file.write(chunk)
+    digest.update(chunk)
+
+
+def _discard(file, path: str):
+    file.close()
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def stream_to_temp_file(upload: UploadFile, directory: str, max_size: int) -> Tuple[str, str, int]:
+    """
+    Streams an upload to a temporary file in `directory`.
+
+    Returns:
+        The temporary file path, the SHA-256 hex digest and the size of the content.
+
+    Raises:
+        FileTooLargeError: The upload is larger than `max_size` bytes (nothing is kept).
+    """
+    if upload.size is not None and upload.size > max_size:
+        raise FileTooLargeError(max_size)
+
+    await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+    fd, temp_path = await asyncio.to_thread(tempfile.mkstemp, dir=directory, prefix=".upload-")
+    file = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while chunk := await upload.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise FileTooLargeError(max_size)
+            await asyncio.to_thread(_write_chunk, file, digest, chunk)
+        await asyncio.to_thread(file.close)
+    except BaseException:
+        await asyncio.to_thread(_discard, file, temp_path)
+        raise
+
+    return temp_path, digest.hexdigest(), size
+
+
+async def move_file(source: str, destination: str):
+    """Atomically moves a file into place (replacing an existing file)."""
+    await asyncio.to_thread(os.replace, source, destination)
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+async def remove_file(path: str) -> bool:
+    """Removes a file if it exists, returns whether it existed."""
+    return await asyncio.to_thread(_remove, path)
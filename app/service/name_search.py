@@ -0,0 +1,125 @@
+"""
+Indexed culture name search.
+
+Names are normalized with the same slugify rules as culture slugs, and every
+culture stores the tokens of its normalized name (`name_tokens`). Anchored
+prefix regexes on `slug` and `name_tokens` can then be answered from indexes,
+and user input is always escaped before it reaches a regex.
+
+Backfill existing data with:
+
+    python -m app.service.name_search
+"""
+
+import asyncio
+import re
+from typing import List, Optional, Tuple
+
+from pymongo import UpdateOne
+from slugify import slugify
+
+from app.database import db
+
+NAME_SEARCH_PROJECTION = {"_id": 0, "id": 1, "name": 1, "slug": 1}
+BULK_CHUNK_SIZE = 1000
+TIER_COUNT = 3  # exact, prefix and infix matches, see name_search_tiers
+
+
+def search_key(text: str) -> str:
+    """Normalizes a name or a query: lowercased, transliterated, words joined with '-'."""
+    return slugify(text or "")
+
+
+def name_tokens(name: str) -> List[str]:
+    """Returns the tokens of a normalized name."""
+    return [token for token in search_key(name).split("-") if token]
+
+
+def _prefix(text: str):
+    return re.compile("^" + re.escape(text))
+
+
+def name_search_tiers(key: str) -> List[dict]:
+    """
+    Builds the queries of the ranking tiers for a normalized query.
+
+    0: exact match, 1: names starting with the query, 2: names with words
+    starting with every word of the query (infix matches).
+    """
+    return [
+        {"slug": key},
+        {"slug": {"$regex": _prefix(key), "$ne": key}},
+        {
+            "$and": [{"name_tokens": _prefix(token)} for token in key.split("-")],
+            "slug": {"$not": _prefix(key)},
+        },
+    ]
+
+
+def is_valid_cursor(cursor: list) -> bool:
+    """Returns whether a decoded cursor is a [tier, slug] position of search_cultures_by_name."""
+    return (
+        len(cursor) == 2
+        and type(cursor[0]) is int
+        and 0 <= cursor[0] < TIER_COUNT
+        and isinstance(cursor[1], str)
+    )
+
+
+async def search_cultures_by_name(
+    key: str, cursor: Optional[list], limit: int
+) -> Tuple[List[dict], Optional[list]]:
+    """
+    Searches cultures by normalized name, ranked exact, prefix then infix.
+
+    Args:
+        key: Normalized query (see search_key).
+        cursor: [tier, slug] of the last culture of the previous page.
+        limit: Maximum number of cultures to return.
+
+    Returns:
+        The cultures and the cursor of the next page (None on the last page).
+    """
+    cursor_tier, cursor_slug = cursor or (0, None)
+
+    results = []
+    for tier, query in enumerate(name_search_tiers(key)):
+        if tier < cursor_tier:
+            continue
+        if tier == cursor_tier and cursor_slug is not None:
+            query = {"$and": [query, {"slug": {"$gt": cursor_slug}}]}
+
+        documents = (
+            db.cultures_collection.find(query, NAME_SEARCH_PROJECTION)
+            .sort("slug", 1)
+            .limit(limit + 1 - len(results))
+        )
+        results += [(tier, culture) async for culture in documents]
+        if len(results) > limit:
+            break
+
+    if len(results) > limit:
+        del results[limit:]
+        tier, culture = results[-1]
+        return [culture for _, culture in results], [tier, culture["slug"]]
+    return [culture for _, culture in results], None
+
+
+async def backfill_name_tokens() -> int:
+    """Computes and stores the name tokens of every culture."""
+    operations = []
+    async for culture in db.cultures_collection.find({}, {"_id": 0, "id": 1, "name": 1, "name_tokens": 1}):
+        tokens = name_tokens(culture.get("name"))
+        if culture.get("name_tokens") != tokens:
+            operations.append(UpdateOne({"id": culture["id"]}, {"$set": {"name_tokens": tokens}}))
+
+    for start in range(0, len(operations), BULK_CHUNK_SIZE):
+        await db.cultures_collection.bulk_write(
+            operations[start : start + BULK_CHUNK_SIZE], ordered=False
+        )
+    print(f"Name tokens backfilled: {len(operations)} cultures updated")
+    return len(operations)
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_name_tokens())
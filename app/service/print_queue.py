@@ -0,0 +1,225 @@
+"""
+Background label print queue.
+
+Print requests are stored as jobs in the `print_jobs` collection and processed
+by one worker task per printer, in the order they were submitted. Rendering a
+label and sending it to the printer block (PIL, brother_ql and the printer
+connection), so the workers run them in a thread and the API keeps serving
+requests while labels print. A failing job is retried up to
+settings.PRINT_MAX_ATTEMPTS times before it is marked as failed; jobs still
+queued when the API stopped are resumed at startup. Finished jobs are removed
+after a week by a TTL index.
+
+Several API processes may share the collection (uvicorn workers, rolling
+restarts). A worker claims a job with its process id (`worker`) and a lease
+(`lease_expires_at`, settings.PRINT_LEASE) that it renews while printing. Only
+jobs whose lease expired, i.e. whose process died, are queued again: at startup
+and then periodically. A job is never printed twice by live processes.
+"""
+
+import asyncio
+import datetime
+import os
+import socket
+import uuid
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.database import db
+from app.models.labelprint import CutMode, PrintData, PrintJob
+from app.service.labelprinter import print_labels
+
+print_jobs_collection = db.db["print_jobs"]
+
+JOB_PROJECTION = {"_id": 0}
+JOB_RETENTION = 7 * 24 * 3600  # seconds finished jobs are kept (TTL index)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"  # this process
+
+_queues: Dict[Optional[str], asyncio.Queue] = {}  # printer address -> queued job ids
+_workers: Dict[Optional[str], asyncio.Task] = {}
+_recovery: Optional[asyncio.Task] = None
+
+
+# ---- Helper Functions ----
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _lease_expiry() -> datetime.datetime:
+    return _now() + datetime.timedelta(seconds=settings.PRINT_LEASE)
+
+
+def enqueue(printer: Optional[str], job_id: str):
+    """Hands a queued job to the worker of its printer, starting the worker if needed."""
+    queue = _queues.get(printer)
+    if queue is None:
+        queue = _queues[printer] = asyncio.Queue()
+    if printer not in _workers or _workers[printer].done():
+        _workers[printer] = asyncio.create_task(_worker(queue))
+    queue.put_nowait(job_id)
+
+
+async def _set_job(job_id: str, **fields):
+    # a job taken over after an expired lease belongs to the other process
+    await print_jobs_collection.update_one(
+        {"id": job_id, "worker": WORKER_ID}, {"$set": {**fields, "updated_at": _now()}}
+    )
+
+
+async def _hold_lease(job_id: str):
+    """Renews the lease of a job while this process prints it."""
+    while True:
+        await asyncio.sleep(settings.PRINT_LEASE / 3)
+        try:
+            await print_jobs_collection.update_one(
+                {"id": job_id, "worker": WORKER_ID, "status": "printing"},
+                {"$set": {"lease_expires_at": _lease_expiry()}},
+            )
+        except Exception as e:
+            print(f"Error renewing the lease of print job {job_id}: {e}")
+
+
+# ---- Worker ----
+
+
+async def process_job(job_id: str):
+    """Prints a queued job, retrying failed attempts up to settings.PRINT_MAX_ATTEMPTS times."""
+    job = await print_jobs_collection.find_one_and_update(
+        {"id": job_id, "status": "queued"},
+        {
+            "$set": {
+                "status": "printing",
+                "worker": WORKER_ID,
+                "lease_expires_at": _lease_expiry(),
+                "updated_at": _now(),
+            }
+        },
+        projection=JOB_PROJECTION,
+    )
+    if job is None:  # already taken or no longer queued
+        return
+
+    lease = asyncio.create_task(_hold_lease(job_id))
+    try:
+        labels = [PrintData.model_validate(label) for label in job["labels"]]
+        for attempt in range(job["attempts"] + 1, settings.PRINT_MAX_ATTEMPTS + 1):
+            try:
+                await asyncio.to_thread(print_labels, labels, job.get("cut") or "each")
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                print(f"Error printing job {job_id} (attempt {attempt}): {error}")
+                await _set_job(job_id, attempts=attempt, error=error)
+                if attempt < settings.PRINT_MAX_ATTEMPTS:
+                    await asyncio.sleep(settings.PRINT_RETRY_DELAY * attempt)
+                continue
+
+            await _set_job(
+                job_id, status="done", attempts=attempt, error=None, finished_at=_now(), lease_expires_at=None
+            )
+            return
+
+        await _set_job(job_id, status="failed", finished_at=_now(), lease_expires_at=None)
+    finally:
+        lease.cancel()
+
+
+async def _worker(queue: asyncio.Queue):
+    while True:
+        job_id = await queue.get()
+        try:
+            await process_job(job_id)
+        except Exception as e:
+            print(f"Error processing print job {job_id}: {e}")
+        finally:
+            queue.task_done()
+
+
+# ---- Jobs ----
+
+
+async def submit_job(
+    labels: List[PrintData], cut: CutMode = "each", printer: Optional[str] = None
+) -> dict:
+    """Stores a print job (printed in a single printer transaction) and queues it on its printer."""
+    job = PrintJob(labels=labels, cut=cut, printer=printer or settings.PRINTER_ADDRESS).model_dump()
+    await print_jobs_collection.insert_one(job)
+    job.pop("_id", None)
+    enqueue(job["printer"], job["id"])
+    return job
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """Returns a print job, None if it does not exist."""
+    return await print_jobs_collection.find_one({"id": job_id}, JOB_PROJECTION)
+
+
+async def retry_job(job_id: str) -> Optional[dict]:
+    """Queues a failed job again with a fresh number of attempts, None if it is not a failed job."""
+    update = {"status": "queued", "attempts": 0, "error": None, "finished_at": None, "updated_at": _now()}
+    job = await print_jobs_collection.find_one_and_update(
+        {"id": job_id, "status": "failed"}, {"$set": update}, projection=JOB_PROJECTION
+    )
+    if job is None:
+        return None
+    enqueue(job["printer"], job["id"])
+    return {**job, **update}
+
+
+# ---- Lifecycle ----
+
+
+def _expired_lease() -> dict:
+    # jobs claimed before leases existed have none
+    return {"status": "printing", "$or": [{"lease_expires_at": {"$lt": _now()}}, {"lease_expires_at": None}]}
+
+
+async def requeue_expired_jobs() -> List[dict]:
+    """Sets the jobs whose printing process died (expired lease) back to queued and returns them."""
+    expired = await print_jobs_collection.find(
+        _expired_lease(), {"_id": 0, "id": 1, "printer": 1}
+    ).sort("created_at", 1).to_list(length=None)
+    if expired:
+        await print_jobs_collection.update_many(
+            {**_expired_lease(), "id": {"$in": [job["id"] for job in expired]}},
+            {"$set": {"status": "queued", "worker": None, "lease_expires_at": None, "updated_at": _now()}},
+        )
+    return expired
+
+
+async def _recover_periodically():
+    while True:
+        await asyncio.sleep(settings.PRINT_LEASE)
+        try:
+            for job in await requeue_expired_jobs():
+                enqueue(job["printer"], job["id"])  # claiming is atomic, another process may print it first
+        except Exception as e:
+            print(f"Error requeuing expired print jobs: {e}")
+
+
+async def start_print_queue():
+    """Resumes the jobs left over from the last run (the job indexes are declared in app.indexes)."""
+    global _recovery
+    # jobs interrupted while printing are printed again, once their lease expired
+    await requeue_expired_jobs()
+    cursor = print_jobs_collection.find(
+        {"status": "queued"}, {"_id": 0, "id": 1, "printer": 1}
+    ).sort("created_at", 1)
+    async for job in cursor:
+        enqueue(job["printer"], job["id"])
+    _recovery = asyncio.create_task(_recover_periodically())
+
+
+async def stop_print_queue():
+    """Stops the workers, unfinished jobs stay queued for the next start."""
+    global _recovery
+    if _recovery is not None:
+        _recovery.cancel()
+        _recovery = None
+    workers = list(_workers.values())
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    _workers.clear()
+    _queues.clear()
@@ -0,0 +1,242 @@
+"""
+Incrementally maintained statistics.
+
+A single document in the `stats` collection is kept current by the write paths
+of the cultures and notes routers with `$inc` deltas. The "last month" numbers
+are summed from daily buckets embedded in the same document, so reading the
+statistics is a single document read. `reconcile_stats` recomputes everything
+(including the tag dictionary) from the collections and runs periodically
+to correct any drift.
+"""
+
+import asyncio
+import datetime
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+from app.database import db
+from app.service.tag_dictionary import apply_tags_delta, rebuild_tags, tags_delta
+
+stats_collection = db.db["stats"]
+
+STATS_ID = "global"
+WINDOW_DAYS = 30
+KINDS = ("cultures", "notes")
+COUNTERS = (
+    "cultures_count",
+    "favorite_cultures_count",
+    "notes_count",
+    "favorite_notes_count",
+    "images_count",
+    "culture_parent_ids_count",
+    "tag_count",
+    "tag_uses",
+)
+
+
+# ---- Helper Functions ----
+
+
+def _day(value) -> Optional[str]:
+    """Returns the UTC day bucket key of a date (naive dates are UTC as stored by MongoDB)."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc)
+    return value.strftime("%Y-%m-%d")
+
+
+def _color_key(color) -> str:
+    """Returns a field name safe key for a note color."""
+    return "null" if color is None else str(color).replace(".", "_").replace("$", "_")
+
+
+def _has_image(note: dict) -> bool:
+    return note.get("image_filename") not in (None, "")
+
+
+def document_delta(kind: str, before: Optional[dict] = None, after: Optional[dict] = None) -> dict:
+    """
+    Computes the $inc deltas of a document change.
+
+    Args:
+        kind: "cultures" or "notes".
+        before: The document before the change, None if it was created.
+        after: The document after the change, None if it was deleted.
+    """
+    delta = Counter()
+    for document, sign in ((before, -1), (after, 1)):
+        if document is None:
+            continue
+
+        delta[f"{kind}_count"] += sign
+        if document.get("favorite"):
+            delta[f"favorite_{kind}_count"] += sign
+        delta["tag_uses"] += sign * len(document.get("tags") or [])
+
+        for event, field in (("created", "created_at"), ("updated", "updated_at")):
+            day = _day(document.get(field))
+            if day:
+                delta[f"daily.{day}.{kind}_{event}"] += sign
+
+        if kind == "notes":
+            if _has_image(document):
+                delta["images_count"] += sign
+            delta[f"note_colors.{_color_key(document.get('color'))}"] += sign
+        else:
+            delta["culture_parent_ids_count"] += sign * len(document.get("parent_ids") or [])
+
+    return {key: value for key, value in delta.items() if value}
+
+
+async def increment_stats(delta: dict):
+    """Applies $inc deltas to the statistics document."""
+    if not delta:
+        return
+    try:
+        await stats_collection.update_one({"_id": STATS_ID}, {"$inc": delta}, upsert=True)
+    except PyMongoError as e:
+        # the change itself succeeded, the next reconciliation fixes the counters
+        print(f"Error updating stats: {e}")
+
+
+async def record_change(kind: str, before: Optional[dict] = None, after: Optional[dict] = None):
+    """Updates the statistics and the tag dictionary after a culture or note was created, updated or deleted."""
+    await record_changes(kind, [(before, after)])
+
+
+async def record_changes(kind: str, changes: Iterable[Tuple[Optional[dict], Optional[dict]]]):
+    """
+    Updates the statistics and the tag dictionary after a batch of changes.
+
+    The deltas of all changes are summed up and applied with one write per collection.
+
+    Args:
+        kind: "cultures" or "notes".
+        changes: (before, after) pairs as for record_change.
+    """
+    delta = Counter()
+    tag_uses = Counter()
+    for before, after in changes:
+        delta.update(document_delta(kind, before, after))
+        tag_uses.update(tags_delta(before, after))
+    delta = {key: value for key, value in delta.items() if value}
+    tag_uses = Counter({tag: count for tag, count in tag_uses.items() if count})
+
+    try:
+        tag_count_delta = await apply_tags_delta(kind, tag_uses)
+    except PyMongoError as e:
+        print(f"Error updating tags: {e}")
+        tag_count_delta = 0
+    if tag_count_delta:
+        delta["tag_count"] = tag_count_delta
+    await increment_stats(delta)
+
+
+def summarize_stats(stats: dict, today: Optional[datetime.date] = None) -> dict:
+    """Turns the stored statistics document into the API representation."""
+    today = today or datetime.datetime.now(datetime.timezone.utc).date()
+    window = {
+        (today - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+        for days in range(WINDOW_DAYS)
+    }
+
+    stats = {**dict.fromkeys(COUNTERS, 0), **stats}
+    daily = stats.pop("daily", None) or {}
+    note_colors = stats.pop("note_colors", None) or {}
+
+    for kind in KINDS:
+        for event in ("created", "updated"):
+            stats[f"{kind}_{event}_last_month"] = sum(
+                bucket.get(f"{kind}_{event}", 0)
+                for day, bucket in daily.items()
+                if day in window
+            )
+    stats["note_colors_count"] = sum(1 for count in note_colors.values() if count > 0)
+    stats["_id"] = str(stats["_id"])
+    return stats
+
+
+async def get_stats() -> dict:
+    """Returns the current statistics."""
+    stats = await stats_collection.find_one({"_id": STATS_ID})
+    if stats is None:
+        await reconcile_stats()
+        stats = await stats_collection.find_one({"_id": STATS_ID})
+    return summarize_stats(stats) if stats else {}
+
+
+# ---- Reconciliation ----
+
+
+async def _daily_counts(collection, field: str, since: datetime.datetime) -> dict:
+    pipeline = [
+        {"$match": {field: {"$gte": since}}},
+        {
+            "$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${field}"}},
+                "count": {"$sum": 1},
+            }
+        },
+    ]
+    return {doc["_id"]: doc["count"] async for doc in collection.aggregate(pipeline)}
+
+
+async def reconcile_stats():
+    """Recomputes the statistics document from the cultures and notes collections."""
+    collections = {"cultures": db.cultures_collection, "notes": db.notes_collection}
+    since = datetime.datetime.combine(
+        datetime.datetime.now(datetime.timezone.utc).date()
+        - datetime.timedelta(days=WINDOW_DAYS - 1),
+        datetime.time(),
+    )
+
+    stats = {"_id": STATS_ID}
+    daily = {}
+    for kind, collection in collections.items():
+        stats[f"{kind}_count"] = await collection.count_documents({})
+        stats[f"favorite_{kind}_count"] = await collection.count_documents({"favorite": True})
+        for event, field in (("created", "created_at"), ("updated", "updated_at")):
+            for day, count in (await _daily_counts(collection, field, since)).items():
+                daily.setdefault(day, {})[f"{kind}_{event}"] = count
+    stats["daily"] = daily
+
+    stats["images_count"] = await db.notes_collection.count_documents(
+        {"image_filename": {"$nin": [None, ""]}}
+    )
+    stats["note_colors"] = {
+        _color_key(doc["_id"]): doc["count"]
+        async for doc in db.notes_collection.aggregate(
+            [{"$group": {"_id": "$color", "count": {"$sum": 1}}}]
+        )
+    }
+
+    parents_result = await db.cultures_collection.aggregate(
+        [
+            {"$unwind": "$parent_ids"},
+            {"$group": {"_id": None, "total_parent_ids": {"$sum": 1}}},
+        ]
+    ).to_list(length=None)
+    stats["culture_parent_ids_count"] = (
+        parents_result[0]["total_parent_ids"] if parents_result else 0
+    )
+
+    # uniq tags number and total uses for all tags
+    stats["tag_count"], stats["tag_uses"] = await rebuild_tags()
+
+    await stats_collection.replace_one({"_id": STATS_ID}, stats, upsert=True)
+    await stats_collection.delete_many({"_id": {"$ne": STATS_ID}})  # legacy stats records
+
+
+async def run_stats_reconciliation(interval: float):
+    """Reconciles the statistics at startup and then every `interval` seconds."""
+    while True:
+        try:
+            await reconcile_stats()
+        except Exception as e:
+            print(f"Error reconciling stats: {e}")
+        await asyncio.sleep(interval)
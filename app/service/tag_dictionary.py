@@ -0,0 +1,139 @@
+"""
+Materialized tag dictionary.
+
+The `tags` collection holds one document per tag with the number of cultures
+and notes using it. It is kept current by the write paths (through
+`app.service.statistics.record_change`) and rebuilt by the periodic stats
+reconciliation, so the tag endpoints never have to unwind the cultures and
+notes collections.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import DeleteMany, UpdateOne
+from pymongo.collation import Collation
+
+from app.database import db
+
+tags_collection = db.db["tags"]
+
+# case-insensitive comparisons, used by the autocomplete index on `name`
+TAG_COLLATION = Collation(locale="en", strength=2)
+KIND_FIELDS = {"cultures": "culture_count", "notes": "note_count"}
+BULK_CHUNK_SIZE = 1000
+
+
+def tags_delta(before: Optional[dict] = None, after: Optional[dict] = None) -> Counter:
+    """Computes the change of tag uses between two versions of a document."""
+    delta = Counter((after or {}).get("tags") or [])
+    delta.subtract(Counter((before or {}).get("tags") or []))
+    return Counter({tag: count for tag, count in delta.items() if count})
+
+
+async def apply_tags_delta(kind: str, delta: Counter) -> int:
+    """
+    Applies tag use deltas of cultures or notes to the tag dictionary.
+
+    Returns:
+        The change of the number of unique tags.
+    """
+    if not delta:
+        return 0
+
+    field = KIND_FIELDS[kind]
+    operations = [
+        UpdateOne(
+            {"_id": tag},
+            {"$inc": {field: count, "total": count}, "$setOnInsert": {"name": tag}},
+            upsert=True,
+        )
+        for tag, count in delta.items()
+    ]
+    decremented = [tag for tag, count in delta.items() if count < 0]
+    if decremented:
+        operations.append(DeleteMany({"_id": {"$in": decremented}, "total": {"$lte": 0}}))
+
+    result = await tags_collection.bulk_write(operations, ordered=True)
+    return result.upserted_count - result.deleted_count
+
+
+async def _tag_uses(collection) -> Counter:
+    pipeline = [
+        {"$unwind": "$tags"},
+        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+    ]
+    return Counter({doc["_id"]: doc["count"] async for doc in collection.aggregate(pipeline)})
+
+
+async def rebuild_tags() -> Tuple[int, int]:
+    """
+    Recomputes the tag dictionary from the cultures and notes collections.
+
+    Returns:
+        The number of unique tags and the total number of tag uses.
+    """
+    counts: Dict[str, Counter] = {
+        "cultures": await _tag_uses(db.cultures_collection),
+        "notes": await _tag_uses(db.notes_collection),
+    }
+    all_tags = set(counts["cultures"]) | set(counts["notes"])
+
+    operations = []
+    for tag in all_tags:
+        culture_count = counts["cultures"][tag]
+        note_count = counts["notes"][tag]
+        document = {
+            "name": tag,
+            "culture_count": culture_count,
+            "note_count": note_count,
+            "total": culture_count + note_count,
+        }
+        operations.append(UpdateOne({"_id": tag}, {"$set": document}, upsert=True))
+
+    for start in range(0, len(operations), BULK_CHUNK_SIZE):
+        await tags_collection.bulk_write(operations[start : start + BULK_CHUNK_SIZE], ordered=False)
+    await tags_collection.delete_many({"_id": {"$nin": list(all_tags)}})
+
+    total_uses = sum(counts["cultures"].values()) + sum(counts["notes"].values())
+    return len(all_tags), total_uses
+
+
+# ---- Queries ----
+
+
+async def list_tags() -> List[dict]:
+    """Returns all tags, most used first."""
+    cursor = tags_collection.find({}, {"_id": 0}).sort([("total", -1), ("name", 1)])
+    return await cursor.to_list(length=None)
+
+
+async def autocomplete(q: str, limit: int = 10) -> List[str]:
+    """
+    Suggests tags for a partial tag, most used first.
+
+    Tags starting with `q` are found with a range scan on the case-insensitive
+    `name` index. If they do not fill the limit, tags containing `q` elsewhere
+    are added (the tag dictionary is small, one document per tag).
+    """
+    prefix_query = {"name": {"$gte": q, "$lt": q + "\uffff"}}  # U+FFFF sorts last
+    cursor = (
+        tags_collection.find(prefix_query, {"_id": 0, "name": 1}, collation=TAG_COLLATION)
+        .sort([("total", -1), ("name", 1)])
+        .limit(limit)
+    )
+    suggestions = [tag["name"] async for tag in cursor]
+
+    if len(suggestions) < limit:
+        infix_query = {
+            "name": {"$regex": re.escape(q), "$options": "i", "$nin": suggestions}
+        }
+        cursor = (
+            tags_collection.find(infix_query, {"_id": 0, "name": 1})
+            .sort([("total", -1), ("name", 1)])
+            .limit(limit - len(suggestions))
+        )
+        suggestions += [tag["name"] async for tag in cursor]
+
+    return suggestions
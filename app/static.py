@@ -0,0 +1,69 @@
+"""
+Static serving of the media directory.
+
+Attachments and their derivatives are stored under their content hash
+(`ab/cd/<sha256>[_<derivative>].<ext>`), so a URL never changes content:
+these files are served with a year long `immutable` Cache-Control and their
+hash as strong ETag, and browsers do not even revalidate them. Any other file
+(attachments not migrated to the content-addressed store yet) must be
+revalidated, which is answered with 304 Not Modified while it is unchanged.
+
+Range requests are handled by Starlette's FileResponse. Media are served as
+stored: the image formats are already compressed, so no precompressed variants
+are kept.
+"""
+
+import mimetypes
+import os
+import re
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# sharded content-addressed path, the stem (hash and derivative name) identifies the content
+HASHED_PATH = re.compile(
+    r"(?:^|/)(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/(?P<stem>(?P=a)(?P=b)[0-9a-f]{60}(?:_[a-z]+)?)\.[a-z0-9]+$"
+)
+
+
+def content_stem(path: str) -> Optional[str]:
+    """Returns the content hash (with derivative name) of a content-addressed media path."""
+    match = HASHED_PATH.search(path.replace(os.sep, "/"))
+    return match.group("stem") if match else None
+
+
+class MediaStaticFiles(StaticFiles):
+    """StaticFiles serving content-addressed media with long-lived caching."""
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        """Serves a media file, for good when it is content-addressed."""
+        headers = {}
+        stem = content_stem(str(full_path))
+        if stem:
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+            headers["etag"] = f'"{stem}"'
+        else:
+            headers["cache-control"] = REVALIDATE_CACHE_CONTROL
+
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=mimetypes.guess_type(str(full_path))[0] or "text/plain",
+            stat_result=stat_result,
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
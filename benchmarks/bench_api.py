@@ -0,0 +1,340 @@
+"""
+Load and latency benchmark of the API.
+
+Runs `app.main:app` in process (lifespan included) behind an httpx ASGI
+transport, against a local mongod or, with --mock, the in-process mongomock
+stand-in (mongomock_motor must be installed; it has no query planner and sends
+no commands, so latencies only compare the Python side). The benchmark
+database is seeded at the chosen scale with app.db_example.generate, then a weighted mix of requests is
+driven by concurrent clients: list pages, notes of a culture, genealogies at
+each depth, tag autocomplete, stats, note uploads, label print jobs (fake
+printer, waited for after the run: a failed job counts as an error of its
+request) and label previews. Every client sends a fixed share of the
+requests, so a run is reproducible from its seed and concurrency.
+
+Per endpoint it reports p50/p95/p99 latency, throughput and the MongoDB
+commands per request (from the Server-Timing header), and stores the results
+as JSON with the git commit so that runs can be compared across commits:
+
+    python -m benchmarks.bench_api --mock --scale small
+    python -m benchmarks.bench_api --mongodb-url mongodb://localhost:27017 --scale medium \
+        --requests 5000 --concurrency 16 --output results.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# dataset sizes, see app.db_example.generate
+SCALES = {
+    "small": {"cultures": 200, "notes": 1_000, "tags": 100},
+    "medium": {"cultures": 2_000, "notes": 20_000, "tags": 1_000},
+    "large": {"cultures": 20_000, "notes": 100_000, "tags": 5_000},
+}
+GENEALOGY_DEPTHS = (1, 2, 4, 8)
+JOB_TIMEOUT = 60  # seconds to wait for the print jobs after the workload
+SERVER_TIMING = re.compile(r'db;dur=(?P<db>[\d.]+);desc="(?P<commands>\d+) commands"')
+
+
+# ---- Environment ----
+
+
+def configure(args):
+    """Sets the app settings (read at import) and patches Motor before the app is imported."""
+    os.environ["CULTIVARE_DATABASE_NAME"] = args.database
+    if args.mongodb_url:
+        os.environ["CULTIVARE_MONGODB_URL"] = args.mongodb_url
+    os.environ["CULTIVARE_INIT_EXAMPLE_DB"] = ""
+    os.environ["CULTIVARE_PRINTER_BACKEND"] = "fake"
+    os.environ.setdefault("CULTIVARE_PRINTER_MODEL", "QL-810W")
+    os.environ.setdefault("CULTIVARE_PRINTER_LABEL_SIZE", "12")
+    if args.no_cache:
+        os.environ["CULTIVARE_CACHE_MAX_ENTRIES"] = "0"
+
+    if args.mock:
+        import mongomock_motor
+        import motor.motor_asyncio
+
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+    # uploads go to a scratch media directory
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(tempfile.mkdtemp(prefix="cultivare-bench-"))
+    os.makedirs("uploads", exist_ok=True)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def png_bytes(rng: random.Random) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), tuple(rng.randrange(256) for _ in range(3))).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+# ---- Seeding ----
+
+
+async def seed(scale: str, seed: int) -> dict:
+    """Fills the benchmark database and returns the ids and tags used by the workload."""
+    from app.db_example.generate import DatasetConfig, generate_dataset, load_dataset
+
+    dataset = generate_dataset(DatasetConfig(**SCALES[scale]), seed)
+    counts = await load_dataset(dataset, drop=True)
+    print(f"Seeded {counts} ({scale})")
+
+    tags = {tag: None for culture in dataset.cultures for tag in culture["tags"]}
+    return {"culture_ids": [culture["id"] for culture in dataset.cultures], "tags": list(tags)}
+
+
+# ---- Workload ----
+
+
+class Operation(NamedTuple):
+    name: str
+    weight: int
+    request: Callable  # (client, context, rng) -> awaitable response
+
+
+class Sample(NamedTuple):
+    seconds: float
+    status: int  # 0 when the request raised
+    commands: int
+    db_ms: float
+    job_id: Optional[str] = None  # print job accepted by the request
+
+
+def label(rng: random.Random) -> dict:
+    # unique content, every label is rendered
+    return {
+        "barcodeText": f"https://cultivare.local/cultures/{rng.getrandbits(48):012x}",
+        "labelText": "Pleurotus ostreatus",
+        "dateText": "2024-05-14",
+        "noteText": "G2",
+        "RestrictiveLabel": True,
+    }
+
+
+def operations() -> List[Operation]:
+    def culture_id(context, rng):
+        return rng.choice(context["culture_ids"])
+
+    ops = [
+        Operation("GET /cultures/?limit=50", 20, lambda c, ctx, rng: c.get("/api/cultures/", params={"limit": 50})),
+        Operation("GET /cultures/{id}", 15, lambda c, ctx, rng: c.get(f"/api/cultures/{culture_id(ctx, rng)}")),
+        Operation("GET /notes/culture/{id}", 15, lambda c, ctx, rng: c.get(f"/api/notes/culture/{culture_id(ctx, rng)}")),
+        Operation(
+            "GET /tags/autocomplete",
+            10,
+            lambda c, ctx, rng: c.get("/api/tags/autocomplete/", params={"q": rng.choice(ctx["tags"])[:2]}),
+        ),
+        Operation("GET /stats/", 5, lambda c, ctx, rng: c.get("/api/stats/")),
+        Operation(
+            "POST /notes/ (upload)",
+            3,
+            lambda c, ctx, rng: c.post(
+                "/api/notes/",
+                data={"culture_id": culture_id(ctx, rng), "text": "Benchmark note", "tags": '["bench"]'},
+                files={"file": ("bench.png", png_bytes(rng), "image/png")},
+            ),
+        ),
+        Operation("POST /labelprint/", 2, lambda c, ctx, rng: c.post("/api/labelprint/", json=label(rng))),
+        Operation("GET /labelprint/preview", 2, lambda c, ctx, rng: c.get("/api/labelprint/preview", params=label(rng))),
+    ]
+    for depth in GENEALOGY_DEPTHS:
+        ops.append(
+            Operation(
+                f"GET /cultures/{{id}}/genealogy?depth_limit={depth}",
+                4,
+                lambda c, ctx, rng, depth=depth: c.get(
+                    f"/api/cultures/{culture_id(ctx, rng)}/genealogy", params={"depth_limit": depth}
+                ),
+            )
+        )
+    return ops
+
+
+async def run_workload(client, context: dict, ops: List[Operation], requests: int, concurrency: int, seed: int):
+    """
+    Sends `requests` requests picked by weight from `concurrency` clients and records the samples.
+
+    Each client sends a fixed share of the requests from its own seeded random
+    generator, so the mix of a run only depends on the seed and the concurrency.
+    """
+    samples: Dict[str, List[Sample]] = defaultdict(list)
+    weights = [op.weight for op in ops]
+
+    async def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        share = requests // concurrency + (1 if index < requests % concurrency else 0)
+        for _ in range(share):
+            op = rng.choices(ops, weights)[0]
+            start = time.perf_counter()
+            job_id = None
+            try:
+                response = await op.request(client, context, rng)
+                status, timing = response.status_code, SERVER_TIMING.search(response.headers.get("server-timing", ""))
+                if status == 202:
+                    job_id = response.json()["id"]
+            except Exception as e:
+                print(f"{op.name}: {e!r}")
+                status, timing = 0, None
+            elapsed = time.perf_counter() - start
+            commands = int(timing["commands"]) if timing else 0
+            db_ms = float(timing["db"]) if timing else 0.0
+            samples[op.name].append(Sample(elapsed, status, commands, db_ms, job_id))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+async def failed_jobs(client, samples: Dict[str, List[Sample]], timeout: float = JOB_TIMEOUT) -> Set[str]:
+    """Waits for the print jobs accepted during the workload and returns those that failed or did not finish."""
+    pending = {sample.job_id for values in samples.values() for sample in values if sample.job_id}
+    failed = set()
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        for job_id in list(pending):
+            response = await client.get(f"/api/labelprint/jobs/{job_id}")
+            job_status = response.json()["status"] if response.status_code == 200 else "failed"
+            if job_status in ("done", "failed"):
+                pending.discard(job_id)
+                if job_status == "failed":
+                    failed.add(job_id)
+        if pending:
+            await asyncio.sleep(0.1)
+    if pending:
+        print(f"{len(pending)} print jobs not finished after {timeout} s, counted as errors")
+    return failed | pending
+
+
+# ---- Report ----
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(samples: List[Sample], wall_time: float, failed: Set[str] = frozenset()) -> dict:
+    """Latency, throughput and commands of samples; requests whose print job failed are errors."""
+    latencies = sorted(sample.seconds * 1000 for sample in samples)
+    count = len(samples)
+    return {
+        "requests": count,
+        "errors": sum(1 for sample in samples if not 200 <= sample.status < 300 or sample.job_id in failed),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / count, 3) if count else 0.0,
+        "throughput_rps": round(count / wall_time, 2) if wall_time else 0.0,
+        "db_commands_per_request": round(sum(sample.commands for sample in samples) / count, 2) if count else 0.0,
+        "db_ms_per_request": round(sum(sample.db_ms for sample in samples) / count, 3) if count else 0.0,
+    }
+
+
+def print_report(results: dict):
+    header = f"{'endpoint':<44} {'req':>6} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'cmds':>6}"
+    print(header)
+    print("-" * len(header))
+    for name, row in [*results["endpoints"].items(), ("total", results["total"])]:
+        print(
+            f"{name:<44} {row['requests']:>6} {row['errors']:>4} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+            f"{row['p99_ms']:>8.2f} {row['throughput_rps']:>8.1f} {row['db_commands_per_request']:>6.2f}"
+        )
+
+
+# ---- Main ----
+
+
+async def benchmark(args) -> dict:
+    import httpx
+    from app.database import db
+    from app.main import app
+
+    ops = operations()
+    async with app.router.lifespan_context(app):
+        context = await seed(args.scale, args.seed)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            if args.warmup:
+                await run_workload(client, context, ops, args.warmup, args.concurrency, args.seed + 1)
+            samples, wall_time = await run_workload(
+                client, context, ops, args.requests, args.concurrency, args.seed
+            )
+            failed = await failed_jobs(client, samples)
+        if not args.keep:
+            await db.client.drop_database(args.database)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "backend": "mongomock" if args.mock else "mongod",
+            "scale": args.scale,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "read_cache": not args.no_cache,
+            "python": platform.python_version(),
+            "wall_time_s": round(wall_time, 3),
+        },
+        "endpoints": {
+            op.name: summarize(samples[op.name], wall_time, failed) for op in ops if samples.get(op.name)
+        },
+        "total": summarize([sample for values in samples.values() for sample in values], wall_time, failed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mongodb-url", default=os.getenv("CULTIVARE_MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--mock", action="store_true", help="use the in-process mongomock stand-in")
+    parser.add_argument("--database", default="cultivare_bench", help="dropped and reseeded by the run")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="disable the read cache")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark database")
+    parser.add_argument("--output", help="JSON results file (default: bench-api-<commit>-<scale>.json in the current directory)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or f"bench-api-{git_commit()}-{args.scale}.json")
+    configure(args)
+    results = asyncio.run(benchmark(args))
+    print_report(results)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark of label rendering.
+
+Compares rendering a label from scratch (fonts and QR code included), with the
+font variants and QR codes cached, and a hit of the rendered label cache (what
+reprints and previews cost).
+
+    python -m benchmarks.bench_label_render [--iterations 200]
+"""
+
+import argparse
+import time
+
+from app.models.labelprint import PrintData
+from app.service import labelprinter
+
+
+def clear_all():
+    labelprinter.label_font.cache_clear()
+    labelprinter.qr_image.cache_clear()
+    clear_labels()
+
+
+def clear_labels():
+    labelprinter.label_cache.clear()
+
+
+def measure(name: str, iterations: int, setup, run) -> float:
+    total = 0.0
+    for _ in range(iterations):
+        setup()
+        start = time.perf_counter()
+        run()
+        total += time.perf_counter() - start
+    per_call = total / iterations * 1000
+    print(f"{name:<32} {per_call:9.3f} ms/label")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print_data = PrintData(
+        barcodeText="https://cultivare.local/cultures/4f1c2a9b7e3d",
+        labelText="Pleurotus ostreatus",
+        dateText="2024-05-14",
+        noteText="G2 rye",
+        RestrictiveLabel=True,
+    )
+
+    def render():
+        labelprinter.render_label(print_data)
+
+    def preview():
+        labelprinter.label_png(labelprinter.label_content(print_data))
+
+    cold = measure("render, nothing cached", args.iterations, clear_all, render)
+    warm = measure("render, fonts and QR cached", args.iterations, clear_labels, render)
+    hit = measure("render, label cache hit", args.iterations, lambda: None, render)
+    measure("preview PNG, nothing cached", args.iterations, clear_all, preview)
+    measure("preview PNG, label cache hit", args.iterations, lambda: None, preview)
+
+    print(f"speedup fonts and QR cached: {cold / warm:.1f}x, label cache hit: {cold / hit:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
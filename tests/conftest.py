@@ -0,0 +1,89 @@
+"""
+Test configuration.
+
+The app reads its settings when it is imported, so they are set here first:
+a test database, the fake printer backend and a scratch media directory.
+Tests run against the mongod at CULTIVARE_TEST_MONGODB_URL (default
+mongodb://localhost:27017) when it is reachable, otherwise against the
+in-process mongomock stand-in, which sends no commands and has no query
+planner: tests marked with `requires_mongod` are skipped then.
+
+    pip install -r requirements-dev.txt
+    python -m pytest
+"""
+
+import os
+import re
+import tempfile
+
+import httpx
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+MONGODB_URL = os.getenv("CULTIVARE_TEST_MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = "cultivare_test"
+
+
+def _mongod_reachable(url: str) -> bool:
+    client = MongoClient(url, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+MONGOD = _mongod_reachable(MONGODB_URL)
+
+requires_mongod = pytest.mark.skipif(not MONGOD, reason=f"no mongod reachable at {MONGODB_URL}")
+
+SERVER_TIMING_COMMANDS = re.compile(r'db;dur=[\d.]+;desc="(\d+) commands"')
+
+
+def commands(response) -> int:
+    """Returns the number of MongoDB commands of a request, from its Server-Timing header."""
+    match = SERVER_TIMING_COMMANDS.search(response.headers.get("server-timing", ""))
+    assert match, "missing Server-Timing header"
+    return int(match.group(1))
+
+os.environ.update(
+    CULTIVARE_MONGODB_URL=MONGODB_URL,
+    CULTIVARE_DATABASE_NAME=DATABASE_NAME,
+    CULTIVARE_INIT_EXAMPLE_DB="",
+    CULTIVARE_PRINTER_BACKEND="fake",
+    CULTIVARE_PRINTER_MODEL="QL-810W",
+    CULTIVARE_PRINTER_LABEL_SIZE="12",
+    CULTIVARE_PRINT_RETRY_DELAY="0",
+)
+
+if not MONGOD:
+    import mongomock_motor
+    import motor.motor_asyncio
+
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+from app.config import settings  # noqa: E402
+
+settings.MEDIA_DIR = tempfile.mkdtemp(prefix="cultivare-media-")  # before the static files are mounted
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def client(anyio_backend):
+    """HTTP client of the app, running with its lifespan on an empty test database."""
+    from app.database import db
+    from app.main import app
+
+    await db.client.drop_database(DATABASE_NAME)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+        await db.client.drop_database(DATABASE_NAME)
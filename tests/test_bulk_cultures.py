@@ -0,0 +1,82 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_culture(client, name: str, parent_ids=()) -> dict:
+    response = await client.post("/api/cultures/", json={"name": name, "parent_ids": list(parent_ids)})
+    assert response.status_code == 201
+    return response.json()
+
+
+async def get_culture(client, id: str) -> dict:
+    return (await client.get(f"/api/cultures/{id}")).json()
+
+
+async def test_bulk_update_rejects_parent_cycle(client):
+    a = await create_culture(client, "Cycle A")
+    b = await create_culture(client, "Cycle B")
+
+    response = await client.put(
+        "/api/cultures/bulk",
+        json={"items": [{"id": a["id"], "parent_ids": [b["id"]]}, {"id": b["id"], "parent_ids": [a["id"]]}], "ordered": False},
+    )
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert items[0]["status"] == "updated"
+    assert items[1]["status"] == "failed"
+    assert items[1]["status_code"] == 400
+
+    a, b = await get_culture(client, a["id"]), await get_culture(client, b["id"])
+    assert a["parent_ids"] == [b["id"]] and a["ancestor_ids"] == [b["id"]]
+    assert b["parent_ids"] == [] and b["ancestor_ids"] == []
+
+
+async def test_bulk_update_sees_earlier_moves(client):
+    root = await create_culture(client, "Move root")
+    parent = await create_culture(client, "Move parent")
+    child = await create_culture(client, "Move child", [parent["id"]])
+    grandchild = await create_culture(client, "Move grandchild", [child["id"]])
+
+    # the child moves under the root, then its former parent under the grandchild
+    response = await client.put(
+        "/api/cultures/bulk",
+        json={
+            "items": [
+                {"id": child["id"], "parent_ids": [root["id"]]},
+                {"id": parent["id"], "parent_ids": [grandchild["id"]]},
+            ]
+        },
+    )
+    assert response.json()["succeeded"] == 2
+
+    parent = await get_culture(client, parent["id"])
+    assert parent["ancestor_ids"] == [grandchild["id"], child["id"], root["id"]]
+    assert parent["generation"] == 3
+    grandchild = await get_culture(client, grandchild["id"])
+    assert grandchild["ancestor_ids"] == [child["id"], root["id"]]
+    assert grandchild["generation"] == 2
+
+
+async def test_bulk_update_sees_later_moves_of_ancestors(client):
+    root = await create_culture(client, "Later root")
+    parent = await create_culture(client, "Later parent")
+    sibling = await create_culture(client, "Later sibling", [parent["id"]])
+    child = await create_culture(client, "Later child", [parent["id"]])
+
+    # the child moves under its sibling, then their parent under the root
+    response = await client.put(
+        "/api/cultures/bulk",
+        json={
+            "items": [
+                {"id": child["id"], "parent_ids": [sibling["id"]]},
+                {"id": parent["id"], "parent_ids": [root["id"]]},
+            ]
+        },
+    )
+    assert response.json()["succeeded"] == 2
+    assert response.json()["items"][0]["culture"]["ancestor_ids"] == [sibling["id"], parent["id"], root["id"]]
+
+    child = await get_culture(client, child["id"])
+    assert child["ancestor_ids"] == [sibling["id"], parent["id"], root["id"]]
+    assert child["generation"] == 3
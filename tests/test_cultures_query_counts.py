@@ -0,0 +1,120 @@
+"""
+MongoDB commands per request of the cultures endpoints.
+
+Every write endpoint must stay a fixed number of round trips, whatever the
+size of the batch or of the moved subtree. The commands of a request are read
+from its Server-Timing header, filled in by app.metrics from the pymongo
+command listener, so these tests need a real mongod (mongomock sends no commands).
+"""
+
+import random
+
+import pytest
+
+from conftest import commands, requires_mongod
+
+pytestmark = [pytest.mark.anyio, requires_mongod]
+
+
+def unique_name(name: str) -> str:
+    return f"{name} {random.getrandbits(32):08x}"
+
+
+async def create_culture(client, name: str, **fields):
+    response = await client.post("/api/cultures/", json={"name": unique_name(name), **fields})
+    assert response.status_code == 201
+    return response
+
+
+async def test_create_culture(client):
+    # insert, stats
+    assert commands(await create_culture(client, "Create")) == 2
+    # insert, tag dictionary, stats
+    assert commands(await create_culture(client, "Create tags", tags=["qc-culture-a", "qc-culture-b"])) == 3
+
+
+async def test_create_culture_with_parent(client):
+    parent = (await create_culture(client, "Create parent")).json()
+
+    # parent lineages, insert, stats
+    assert commands(await create_culture(client, "Create child", parent_ids=[parent["id"]])) == 3
+
+
+async def test_update_culture(client):
+    culture = (await create_culture(client, "Update")).json()
+
+    # find_one_and_update, stats (favorite count)
+    response = await client.put(f"/api/cultures/{culture['id']}", json={"favorite": True})
+    assert response.status_code == 200
+    assert commands(response) == 2
+
+    response = await client.put("/api/cultures/missing00000", json={"favorite": True})
+    assert response.status_code == 404
+    assert commands(response) == 1
+
+
+async def test_update_culture_moves_subtree(client):
+    root = (await create_culture(client, "Move root")).json()
+    parent_id = root["id"]
+    for depth in range(3):
+        parent_id = (await create_culture(client, f"Move descendant {depth}", parent_ids=[parent_id])).json()["id"]
+    new_parent = (await create_culture(client, "Move new parent")).json()
+
+    # parent lineages, find_one_and_update, subtree, subtree lineages, stats (parent count)
+    response = await client.put(f"/api/cultures/{root['id']}", json={"parent_ids": [new_parent["id"]]})
+    assert response.status_code == 200
+    assert commands(response) == 5
+
+
+async def test_delete_culture(client):
+    culture = (await create_culture(client, "Delete")).json()
+
+    # find_one_and_delete, subtree, stats
+    response = await client.delete(f"/api/cultures/{culture['id']}")
+    assert response.status_code == 204
+    assert commands(response) == 3
+
+    response = await client.delete("/api/cultures/missing00000")
+    assert response.status_code == 404
+    assert commands(response) == 1
+
+
+async def test_delete_culture_with_children(client):
+    parent = (await create_culture(client, "Delete parent")).json()
+    for number in range(3):
+        await create_culture(client, f"Delete child {number}", parent_ids=[parent["id"]])
+
+    # find_one_and_delete, subtree, subtree lineages, stats
+    response = await client.delete(f"/api/cultures/{parent['id']}")
+    assert response.status_code == 204
+    assert commands(response) == 4
+
+
+@pytest.mark.parametrize("size", [1, 20])
+async def test_bulk_cultures(client, size):
+    parent = (await create_culture(client, "Bulk parent")).json()
+    other_parent = (await create_culture(client, "Bulk other parent")).json()
+    items = [{"name": unique_name(f"Bulk {i}"), "parent_ids": [parent["id"]]} for i in range(size)]
+
+    # parent lineages, slugs, insert_many, stats
+    response = await client.post("/api/cultures/bulk", json={"items": items})
+    assert response.json()["succeeded"] == size
+    assert commands(response) == 4
+    ids = [item["id"] for item in response.json()["items"]]
+
+    # find, bulk_write, stats
+    response = await client.put("/api/cultures/bulk", json={"items": [{"id": id, "favorite": True} for id in ids]})
+    assert response.json()["succeeded"] == size
+    assert commands(response) == 3
+
+    # find, subtrees, lineages, bulk_write, subtrees, stats (parent count)
+    moves = [{"id": id, "parent_ids": [parent["id"], other_parent["id"]]} for id in ids]
+    response = await client.put("/api/cultures/bulk", json={"items": moves})
+    assert response.json()["succeeded"] == size
+    assert commands(response) == 6
+
+    # find, bulk_write, subtrees, stats
+    response = await client.post("/api/cultures/bulk/delete", json={"ids": ids})
+    assert response.json()["succeeded"] == size
+    assert commands(response) == 4
+
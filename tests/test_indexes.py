@@ -0,0 +1,56 @@
+"""
+Query plans of the routers.
+
+Every query must be served by an index declared in app.indexes. The static
+`EXPLAINED_QUERIES` are explained, then the commands the routers actually send
+during a workload are recorded and explained, so that a new or changed query
+without an index fails here. Needs a real mongod (mongomock has no planner).
+"""
+
+import pytest
+
+from app.indexes import explain_commands, explain_queries
+from app.metrics import record_commands
+from app.service import images
+from conftest import requires_mongod
+
+pytestmark = [pytest.mark.anyio, requires_mongod]
+
+
+async def test_explained_queries_use_indexes(client):
+    assert await explain_queries() == []
+
+
+async def test_router_queries_use_indexes(client):
+    parent = (await client.post("/api/cultures/", json={"name": "Plans parent", "tags": ["plans"]})).json()
+    child = (await client.post("/api/cultures/", json={"name": "Plans child", "parent_ids": [parent["id"]]})).json()
+    note = (await client.post("/api/notes/", data={"culture_id": child["id"], "text": "Plans", "tags": '["plans"]'})).json()
+    await images.wait_for_derivatives()
+
+    with record_commands() as commands:
+        for params in ({"limit": 10}, {"limit": 10, "favorite": True}, {"limit": 10, "generation": 1}):
+            response = await client.get("/api/cultures/", params=params)
+            assert response.status_code == 200
+            if "x-next-cursor" in response.headers:
+                await client.get("/api/cultures/", params={**params, "cursor": response.headers["x-next-cursor"]})
+        await client.get(f"/api/cultures/{child['id']}")
+        await client.get("/api/cultures/search", params={"culture_name": "plans"})
+        await client.get(f"/api/cultures/{parent['id']}/descendants")
+        await client.get(f"/api/cultures/{child['id']}/lineage")
+        await client.get(f"/api/cultures/{child['id']}/genealogy", params={"depth_limit": 2})
+        await client.put(f"/api/cultures/{child['id']}", json={"favorite": True})
+
+        await client.get("/api/notes/", params={"limit": 10})
+        await client.get(f"/api/notes/culture/{child['id']}")
+        await client.get(f"/api/notes/{note['id']}")
+        await client.put(f"/api/notes/{note['id']}", data={"favorite": "true"})
+
+        await client.get("/api/search/", params={"q": "plans"})
+        await client.get("/api/tags/autocomplete/", params={"q": "pl"})
+        await client.get("/api/stats/")
+
+        await client.delete(f"/api/notes/{note['id']}")
+        await client.delete(f"/api/cultures/{child['id']}")
+
+    assert commands
+    assert await explain_commands(commands) == []
@@ -0,0 +1,77 @@
+import asyncio
+import inspect
+
+import brother_ql.conversion
+import pytest
+from brother_ql.reader import OPCODES, chunker, match_opcode
+from PIL import Image
+
+from app.models.labelprint import MAX_BATCH_LABELS
+from app.service.labelprinter import fake_printer_output
+
+pytestmark = [
+    pytest.mark.anyio,
+    # the PyPI release of brother_ql resizes with Image.ANTIALIAS, removed in Pillow 10
+    # (requirements.txt installs the fork that does not)
+    pytest.mark.skipif(
+        not hasattr(Image, "ANTIALIAS") and "ANTIALIAS" in inspect.getsource(brother_ql.conversion),
+        reason="brother_ql is not compatible with the installed Pillow",
+    ),
+]
+
+
+def label(number: int) -> dict:
+    return {
+        "barcodeText": f"https://cultivare.local/cultures/{number:012x}",
+        "labelText": "Pleurotus ostreatus",
+        "dateText": "2024-05-14",
+        "noteText": f"G{number}",
+        "RestrictiveLabel": True,
+    }
+
+
+def instructions(data: bytes) -> list:
+    """Splits raster data into (instruction name, bytes) pairs."""
+    return [(OPCODES[match_opcode(chunk)][0], chunk) for chunk in chunker(data)]
+
+
+async def print_job(client, url: str, payload: dict) -> bytes:
+    """Submits a print job, waits until it is printed and returns the raster data sent to the printer."""
+    printed = len(fake_printer_output)
+    response = await client.post(url, json=payload)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    for _ in range(200):
+        job = (await client.get(f"/api/labelprint/jobs/{job_id}")).json()
+        if job["status"] in ("done", "failed"):
+            break
+        await asyncio.sleep(0.05)
+    assert job["status"] == "done", job["error"]
+    assert len(fake_printer_output) == printed + 1
+    return fake_printer_output[-1]
+
+
+@pytest.mark.parametrize("cut, cut_every", [("each", 1), ("end", 3)])
+async def test_batch_is_one_raster_job(client, cut, cut_every):
+    data = await print_job(client, "/api/labelprint/batch", {"labels": [label(i) for i in range(3)], "cut": cut})
+
+    names = [name for name, _ in instructions(data)]
+    assert names.count("init") == 1  # one transaction
+    assert names.count("print") == 3
+    assert names.count("raster") > 0
+    cuts = [chunk for name, chunk in instructions(data) if name == "cut-every"]
+    assert cuts == [b"\x1biA" + bytes([cut_every])] * 3
+
+
+async def test_single_label(client):
+    data = await print_job(client, "/api/labelprint/", label(1))
+
+    names = [name for name, _ in instructions(data)]
+    assert names.count("print") == 1
+
+
+async def test_batch_is_limited_to_one_cut_counter(client):
+    labels = [label(i) for i in range(MAX_BATCH_LABELS + 1)]
+    response = await client.post("/api/labelprint/batch", json={"labels": labels, "cut": "end"})
+    assert response.status_code == 422
@@ -0,0 +1,121 @@
+"""
+MongoDB commands per request of the notes endpoints.
+
+Every write endpoint must stay a fixed number of round trips, whatever the
+size of the note or of the batch. The commands of a request are read from its
+Server-Timing header, filled in by app.metrics from the pymongo command
+listener, so these tests need a real mongod (mongomock sends no commands).
+"""
+
+import io
+import json
+import random
+
+import pytest
+from PIL import Image
+
+from app.service import images
+from conftest import commands, requires_mongod
+
+pytestmark = [pytest.mark.anyio, requires_mongod]
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), tuple(random.randrange(256) for _ in range(3))).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+async def culture_id(client):
+    response = await client.post("/api/cultures/", json={"name": f"Query counts {random.getrandbits(32):08x}"})
+    return response.json()["id"]
+
+
+async def create_note(client, culture_id: str, tags=(), file=None):
+    data = {"culture_id": culture_id, "text": "Query counts", "tags": json.dumps(list(tags))}
+    files = {"file": ("note.png", file, "image/png")} if file else None
+    response = await client.post("/api/notes/", data=data, files=files)
+    assert response.status_code == 200
+    await images.wait_for_derivatives()  # background writes, not part of the request
+    return response
+
+
+async def test_create_note(client, culture_id):
+    # insert, stats
+    assert commands(await create_note(client, culture_id)) == 2
+    # insert, tag dictionary, stats
+    assert commands(await create_note(client, culture_id, tags=["qc-create-a", "qc-create-b"])) == 3
+
+
+async def test_create_note_with_attachment(client, culture_id):
+    # media reference, insert, stats
+    assert commands(await create_note(client, culture_id, file=png_bytes())) == 3
+
+
+async def test_read_notes(client, culture_id):
+    note = (await create_note(client, culture_id)).json()
+
+    assert commands(await client.get(f"/api/notes/{note['id']}")) == 1
+    assert commands(await client.get("/api/notes/missing00000")) == 1
+    assert commands(await client.get("/api/notes/", params={"limit": 10})) == 1
+
+    # the notes of a culture are cached after the first read
+    first = await client.get(f"/api/notes/culture/{culture_id}")
+    assert commands(first) == 1
+    assert commands(await client.get(f"/api/notes/culture/{culture_id}")) == 0
+    not_modified = await client.get(f"/api/notes/culture/{culture_id}", headers={"If-None-Match": first.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert commands(not_modified) == 0
+
+
+async def test_update_note(client, culture_id):
+    note = (await create_note(client, culture_id)).json()
+
+    # find_one_and_update, stats (favorite count)
+    response = await client.put(f"/api/notes/{note['id']}", data={"favorite": "true"})
+    assert response.status_code == 200
+    assert commands(response) == 2
+
+    response = await client.put("/api/notes/missing00000", data={"favorite": "true"})
+    assert response.status_code == 404
+    assert commands(response) == 1
+
+
+async def test_delete_note(client, culture_id):
+    note = (await create_note(client, culture_id, tags=["qc-delete"])).json()
+
+    # find_one_and_delete, tag dictionary (decrement, drop unused), stats
+    response = await client.delete(f"/api/notes/{note['id']}")
+    assert response.status_code == 204
+    assert commands(response) == 4
+
+
+async def test_delete_note_with_attachment(client, culture_id):
+    note = (await create_note(client, culture_id, file=png_bytes())).json()
+
+    # find_one_and_delete, media release (decrement, mark, delete), stats
+    response = await client.delete(f"/api/notes/{note['id']}")
+    assert response.status_code == 204
+    assert commands(response) == 5
+
+
+@pytest.mark.parametrize("size", [1, 20])
+async def test_bulk_notes(client, culture_id, size):
+    items = [{"culture_id": culture_id, "text": f"Bulk {i}"} for i in range(size)]
+
+    # insert_many, stats
+    response = await client.post("/api/notes/bulk", json={"items": items})
+    assert response.json()["succeeded"] == size
+    assert commands(response) == 2
+    ids = [item["id"] for item in response.json()["items"]]
+
+    # find, bulk_write, stats
+    response = await client.put("/api/notes/bulk", json={"items": [{"id": id, "favorite": True} for id in ids]})
+    assert response.json()["succeeded"] == size
+    assert commands(response) == 3
+
+    # find, bulk_write, stats
+    response = await client.post("/api/notes/bulk/delete", json={"ids": ids})
+    assert response.json()["succeeded"] == size
+    assert commands(response) == 3
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def stream_pages(client, url: str, limit: int):
+    """Reads a list endpoint as streamed pages, returns the ids and the number of pages."""
+    ids, pages, params = [], 0, {"stream": True, "limit": limit}
+    while True:
+        response = await client.get(url, params=params)
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        pages += 1
+        if lines and "next_cursor" in lines[-1]:
+            *documents, last = lines
+            assert len(documents) == limit
+            ids += [document["id"] for document in documents]
+            params = {**params, "cursor": last["next_cursor"]}
+        else:
+            assert len(lines) <= limit
+            return ids + [document["id"] for document in lines], pages
+
+
+async def test_streamed_pages_continue_with_the_last_line(client):
+    for number in range(5):
+        response = await client.post("/api/cultures/", json={"name": f"Stream page {number}"})
+        assert response.status_code == 201
+
+    pages = (await client.get("/api/cultures/", params={"limit": 1000})).json()
+    ids, page_count = await stream_pages(client, "/api/cultures/", limit=2)
+    assert ids == [culture["id"] for culture in pages]
+    assert page_count == -(-len(pages) // 2)
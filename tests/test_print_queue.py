@@ -0,0 +1,33 @@
+import datetime
+
+import pytest
+
+from app.service.print_queue import print_jobs_collection, requeue_expired_jobs
+
+pytestmark = pytest.mark.anyio
+
+
+def printing_job(id: str, **fields) -> dict:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return {"id": id, "status": "printing", "printer": None, "labels": [], "attempts": 0, "created_at": now, **fields}
+
+
+async def test_only_expired_leases_are_requeued(client):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    jobs = [
+        printing_job("lease-live", worker="other", lease_expires_at=now + datetime.timedelta(minutes=1)),
+        printing_job("lease-expired", worker="gone", lease_expires_at=now - datetime.timedelta(seconds=1)),
+        printing_job("lease-missing"),  # claimed before leases existed
+    ]
+    await print_jobs_collection.insert_many(jobs)
+    try:
+        requeued = await requeue_expired_jobs()
+        assert {job["id"] for job in requeued} == {"lease-expired", "lease-missing"}
+
+        statuses = {
+            job["id"]: job["status"]
+            async for job in print_jobs_collection.find({"id": {"$in": [job["id"] for job in jobs]}})
+        }
+        assert statuses == {"lease-live": "printing", "lease-expired": "queued", "lease-missing": "queued"}
+    finally:
+        await print_jobs_collection.delete_many({"id": {"$in": [job["id"] for job in jobs]}})
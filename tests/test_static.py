@@ -0,0 +1,31 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app.static import IMMUTABLE_CACHE_CONTROL
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_content_addressed_media_are_immutable(client):
+    culture = (await client.post("/api/cultures/", json={"name": "Static media"})).json()
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), (120, 60, 30)).save(buffer, "PNG")
+    note = (
+        await client.post(
+            "/api/notes/",
+            data={"culture_id": culture["id"], "text": "Static media"},
+            files={"file": ("note.png", buffer.getvalue(), "image/png")},
+        )
+    ).json()
+
+    url = f"/api/static/{note['image_filename']}"
+    response = await client.get(url, headers={"Accept-Encoding": "br, gzip"})
+    assert response.status_code == 200
+    assert response.content == buffer.getvalue()
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert "content-encoding" not in response.headers
+
+    not_modified = await client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert not_modified.status_code == 304